@@ -2,13 +2,17 @@ import argparse
 import datetime
 import logging
 import threading
+from time import perf_counter
 
 from flask import Flask
 
 from feed_utils.populate import prepare_pipelines_for_batch
-from init_globals import init_globals
+from init_globals import init_globals, close_globals
 from utils.settings_loader import load_settings
 from utils.flask_customization import customize_flask, customize_logger
+from utils.metrics import REFRESH_SECONDS
+from views.fast_redirects import register_fast_redirects
+from views.metrics import register_metrics_route
 from views.redirects import register_episode_redirect, register_article_redirect
 from views.web_api import register_api_routes
 from views.web_feed import register_feed_routes
@@ -35,10 +39,18 @@ def update_global_if_stale():
 
         if global_dict is None or has_expired():
             logger.info("global_values is stale, creating anew…")
+            start = perf_counter()
             if global_dict:
-                global_dict['requests'].close()
+                close_globals(global_dict)
             new_global_dict = dict()
-            init_globals(new_global_dict, settings, get_global_func)
+            init_globals(
+                new_global_dict,
+                settings,
+                get_global_func,
+                item_cache=global_dict['item_cache'] if global_dict else None,
+                redirect_tables=global_dict['redirector'].tables
+                if global_dict else None,
+            )
             prepare_pipelines_for_batch(new_global_dict['processors']['show'])
             prepare_pipelines_for_batch(new_global_dict['processors']['episode'])
 
@@ -47,6 +59,10 @@ def update_global_if_stale():
             new_expire_time = now + ttl
 
             global_values = (new_global_dict, new_expire_time)
+
+            duration = perf_counter() - start
+            REFRESH_SECONDS.observe(duration)
+            logger.info("Created new global_values in %.2f seconds", duration)
         else:
             logger.debug("keeping global_values")
 
@@ -68,6 +84,8 @@ register_api_routes(app, settings, get_global_func)
 register_episode_redirect(app, settings, get_global_func)
 register_article_redirect(app, settings, get_global_func)
 register_feed_routes(app, settings, get_global_func)
+register_fast_redirects(app, settings, get_global_func)
+register_metrics_route(app, settings, get_global_func)
 
 
 def parse_cli_arguments():
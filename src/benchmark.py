@@ -0,0 +1,84 @@
+import argparse
+import json
+import logging
+import sys
+
+from benchmarks.fixtures import Fixtures, create_synthetic_fixtures
+from benchmarks.suite import BENCHMARKS, compare_reports, record_fixtures, \
+    run_benchmarks
+from utils.settings_loader import load_settings
+
+logger = logging.getLogger("benchmark")
+
+
+def parse_cli_arguments() -> (argparse.ArgumentParser, argparse.Namespace):
+    parser = argparse.ArgumentParser(
+        description="Measure how long it takes to refresh the data sources, "
+                    "render feeds, redirect and process images. Upstream "
+                    "sources are replaced by a local server replaying "
+                    "fixtures, and the slug database by an in-memory "
+                    "stand-in. Results are written as JSON.")
+    parser.add_argument("--fixtures", metavar="DIR",
+                        help="Directory with recorded fixtures. Synthetic "
+                             "fixtures are generated when not given.")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Record fixtures from the upstream sources in "
+                             "the settings into DIR, instead of running the "
+                             "benchmarks.")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100],
+                        help="Multiply the size of the archive by these "
+                             "factors (default: 1 10 100).")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of samples to take of each benchmark.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS,
+                        metavar="BENCHMARK",
+                        help="Run only these benchmarks. Choices: {}"
+                        .format(", ".join(BENCHMARKS)))
+    parser.add_argument("--output", "-o", metavar="FILE",
+                        help="Write results to FILE instead of stdout.")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Compare the results with those in FILE, "
+                             "from an earlier run.")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only print warnings and the results.")
+    return parser, parser.parse_args()
+
+
+def main():
+    parser, args = parse_cli_arguments()
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(message)s",
+        stream=sys.stderr,
+    )
+    settings = load_settings()
+
+    if args.record:
+        fixtures = record_fixtures(settings)
+        fixtures.save(args.record)
+        logger.info("Recorded %d responses into %s", len(fixtures.entries),
+                    args.record)
+        return
+
+    if args.fixtures:
+        fixtures = Fixtures.load(args.fixtures)
+    else:
+        fixtures = create_synthetic_fixtures()
+
+    report = run_benchmarks(settings, fixtures, args.scale, args.repeat,
+                            args.only)
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as output_file:
+            output_file.write(report_json + "\n")
+    else:
+        print(report_json)
+
+    if args.compare:
+        with open(args.compare, encoding="UTF-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print(compare_reports(baseline, report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""
+Tools for measuring the performance of the application, without depending on
+the upstream data sources or the PostgreSQL database.
+
+See benchmark.py for how to run them.
+"""
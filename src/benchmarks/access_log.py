@@ -0,0 +1,171 @@
+"""
+Parsing of the access log written by Nginx, and classification of the requests
+found in it.
+
+The log is expected to use Nginx' predefined "combined" format, or the "main"
+format from the default nginx.conf, which adds the X-Forwarded-For header at
+the end. Lines in other formats are skipped.
+"""
+import datetime
+import logging
+import re
+
+from views.web_feed import ALLOWED_PIPELINES
+
+logger = logging.getLogger(__name__)
+
+LOG_LINE_PATTERN = re.compile(
+    r'(?P<remote_addr>\S+) \S+ (?P<remote_user>\S+) '
+    r'\[(?P<time_local>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+) (?P<protocol>[^"]+)" '
+    r'(?P<status>\d{3}) (?P<body_bytes_sent>\d+|-)'
+    r'(?: "(?P<referer>(?:[^"\\]|\\.)*)" "(?P<user_agent>(?:[^"\\]|\\.)*)")?'
+)
+"""Regular expression matching one line of the access log."""
+
+TIME_LOCAL_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+
+REPLAYABLE_METHODS = {"GET", "HEAD"}
+"""Only requests using these methods are safe to send again."""
+
+ROUTES = (
+    "feed",
+    "special_feed",
+    "archive_feed",
+    "json_feed",
+    "all",
+    "episode",
+    "artikkel",
+    "api",
+    "static",
+    "metrics",
+    "other",
+)
+"""Names of the different kinds of requests, see classify_path."""
+
+
+class LogEntry:
+    """A single request found in the access log."""
+    def __init__(self, time: datetime.datetime, method: str, path: str,
+                 status: int, user_agent: str=None):
+        self.time = time
+        self.method = method
+        self.path = path
+        self.status = status
+        self.user_agent = user_agent
+        self.route = classify_path(path)
+
+    def __repr__(self):
+        return "LogEntry({!r}, {!r}, {!r}, {!r})".format(
+            self.time, self.method, self.path, self.status
+        )
+
+
+def parse_line(line: str):
+    """Parse one line of the access log.
+
+    Returns:
+        LogEntry for the request on this line, or None if the line was not
+        recognized.
+    """
+    match = LOG_LINE_PATTERN.match(line)
+    if not match:
+        return None
+    try:
+        time = datetime.datetime.strptime(match.group("time_local"),
+                                          TIME_LOCAL_FORMAT)
+    except ValueError:
+        return None
+    return LogEntry(
+        time,
+        match.group("method"),
+        match.group("path"),
+        int(match.group("status")),
+        match.group("user_agent"),
+    )
+
+
+def read_log(lines, methods=REPLAYABLE_METHODS, routes=None) -> list:
+    """Find the requests in the access log which can be replayed.
+
+    Args:
+        lines: Iterable of lines from the access log, like an open file.
+        methods: Only include requests using one of these HTTP methods.
+        routes: Only include requests to these routes (see ROUTES). All routes
+            are included when not given.
+
+    Returns:
+        List of LogEntry, sorted by the time they were received.
+    """
+    entries = []
+    num_skipped = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = parse_line(line)
+        if entry is None:
+            num_skipped += 1
+            continue
+        if entry.method not in methods:
+            continue
+        if routes is not None and entry.route not in routes:
+            continue
+        entries.append(entry)
+    if num_skipped:
+        logger.warning("Skipped %d lines which did not match the log format",
+                       num_skipped)
+    # Nginx logs requests when they finish, so lines may be slightly out of
+    # order. The sort is stable, so requests logged the same second keep
+    # their order.
+    entries.sort(key=lambda e: e.time)
+    return entries
+
+
+def classify_path(path: str) -> str:
+    """Find out which kind of request a path belongs to.
+
+    Args:
+        path: Path, possibly with query string, as found in the access log.
+
+    Returns:
+        One of the names in ROUTES.
+    """
+    path = path.split("?", 1)[0]
+    # Skip the empty string in front of the first slash
+    segments = path.split("/")[1:]
+    if not segments or not segments[0]:
+        return "other"
+    first = segments[0]
+    if first == "static":
+        return "static"
+    if first == "api":
+        return "api"
+    if first == "metrics" and len(segments) == 1:
+        return "metrics"
+    if first == "episode" and len(segments) == 4:
+        return "episode"
+    if first == "artikkel" and len(segments) == 3:
+        return "artikkel"
+    if first == "all" and len(segments) == 1:
+        return "all"
+    if _is_archive_page(segments):
+        if len(segments) == 3:
+            return "archive_feed"
+        if len(segments) == 4 and (first == "json" or
+                                   first in ALLOWED_PIPELINES):
+            return "archive_feed"
+        return "other"
+    if first == "json" and len(segments) == 2:
+        return "json_feed"
+    if len(segments) == 1:
+        return "feed"
+    if len(segments) == 2 and first in ALLOWED_PIPELINES:
+        return "special_feed"
+    return "other"
+
+
+def _is_archive_page(segments: list) -> bool:
+    """Check whether the path ends with /archive/<page>, like the paths of
+    archive pages in all feed formats."""
+    return len(segments) >= 3 and segments[-2] == "archive" and \
+        segments[-1].isdigit()
@@ -0,0 +1,449 @@
+"""
+Recording, generation and replaying of responses from the upstream sources.
+
+Fixtures are stored in a directory with an index.json file, which lists one
+entry per response, and a bodies/ folder with the response bodies. Each entry
+is identified by the upstream source it was fetched from and the path (with
+query string) relative to that source's base URL, so that the same fixtures
+can be replayed by a local FixtureServer no matter where the sources are found
+in production.
+"""
+import datetime
+import io
+import json
+import logging
+import os
+import os.path
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SOURCE = "images"
+"""Source used for show images, which have no base URL in the settings."""
+
+REPLICA_ID_OFFSET = 10 ** 7
+"""Added to an episode's ID once for each replica of the episode."""
+
+
+def get_source_urls(settings: dict) -> dict:
+    """Find the base URL of every upstream source in the settings.
+
+    Args:
+        settings: Application settings.
+
+    Returns:
+        Dictionary with source name as key and its base URL as value.
+    """
+    processors = settings['processors']
+    candidates = {
+        "rest_api": settings['rest_api'].get('url'),
+        "chimera": processors.get('Chimera', {}).get('api'),
+        "kapina": processors.get('Kapina', {}).get('api'),
+        "radiorevolt_no": processors.get('RadioRevolt_no', {}).get('API_URL'),
+    }
+    return {name: url for name, url in candidates.items() if url}
+
+
+def set_source_urls(settings: dict, source_urls: dict) -> None:
+    """Change the base URL of the upstream sources in settings, in place."""
+    processors = settings['processors']
+    if "rest_api" in source_urls:
+        settings['rest_api']['url'] = source_urls['rest_api']
+    if "chimera" in source_urls:
+        processors.setdefault('Chimera', {})['api'] = source_urls['chimera']
+    if "kapina" in source_urls:
+        processors.setdefault('Kapina', {})['api'] = source_urls['kapina']
+    if "radiorevolt_no" in source_urls:
+        processors.setdefault('RadioRevolt_no', {})['API_URL'] = \
+            source_urls['radiorevolt_no']
+
+
+class Fixture:
+    """A single recorded response."""
+    def __init__(self, status: int, content_type: str, body: bytes):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+    @property
+    def is_json(self) -> bool:
+        return "json" in (self.content_type or "")
+
+
+class Fixtures:
+    """Collection of responses, identified by source and relative path."""
+
+    def __init__(self, entries: dict=None, description: str="synthetic"):
+        """
+        Args:
+            entries: Dictionary with (source, relative path) as key and Fixture
+                as value.
+            description: Human readable description of where the fixtures came
+                from, included in benchmark results.
+        """
+        self.entries = entries if entries is not None else dict()
+        self.description = description
+        self._lock = threading.Lock()
+
+    def add(self, source: str, path: str, fixture: Fixture) -> None:
+        with self._lock:
+            self.entries[(source, path)] = fixture
+
+    def find(self, source: str, path: str):
+        """Find the fixture for the given request.
+
+        When there is no fixture for the exact path and query string, a fixture
+        for the same path is used if there is only one, so fixtures work even
+        if the query is spelled differently.
+
+        Returns:
+            The matching Fixture, or None if nothing matched.
+        """
+        fixture = self.entries.get((source, path))
+        if fixture is not None:
+            return fixture
+        path_only = path.split("?", 1)[0]
+        candidates = [f for (s, p), f in self.entries.items()
+                      if s == source and p.split("?", 1)[0] == path_only]
+        if len(candidates) == 1:
+            return candidates[0]
+        return None
+
+    def image_paths(self) -> list:
+        """Paths of all images, relative to the images source."""
+        return sorted(path for source, path in self.entries
+                      if source == IMAGE_SOURCE)
+
+    @classmethod
+    def load(cls, directory: str) -> "Fixtures":
+        with open(os.path.join(directory, "index.json"), encoding="UTF-8") \
+                as index_file:
+            index = json.load(index_file)
+        entries = dict()
+        for entry in index:
+            with open(os.path.join(directory, "bodies", entry['file']), "rb") \
+                    as body_file:
+                body = body_file.read()
+            entries[(entry['source'], entry['path'])] = \
+                Fixture(entry['status'], entry['content_type'], body)
+        return cls(entries, os.path.abspath(directory))
+
+    def save(self, directory: str) -> None:
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        index = []
+        for i, ((source, path), fixture) in enumerate(sorted(
+                self.entries.items(), key=lambda item: item[0])):
+            filename = "{:05d}".format(i)
+            with open(os.path.join(directory, "bodies", filename), "wb") \
+                    as body_file:
+                body_file.write(fixture.body)
+            index.append({
+                "source": source,
+                "path": path,
+                "status": fixture.status,
+                "content_type": fixture.content_type,
+                "file": filename,
+            })
+        with open(os.path.join(directory, "index.json"), "w",
+                  encoding="UTF-8") as index_file:
+            json.dump(index, index_file, indent=2)
+
+    def scaled(self, factor: int) -> "Fixtures":
+        """Create copy of these fixtures where every show has factor times as
+        many episodes.
+
+        The additional episodes are replicas of the existing ones, published
+        one week earlier for each replica, with their own IDs and URLs. The
+        metadata from Chimera is replicated the same way, so the replicas are
+        processed just like the originals.
+        """
+        if factor == 1:
+            return self
+        entries = dict()
+        for (source, path), fixture in self.entries.items():
+            if source == "rest_api" and path.startswith("/lyd/podcast/"):
+                fixture = _scale_json(fixture, factor, _replicate_rest_episode)
+            elif source == "chimera" and path.startswith("/episodes/"):
+                fixture = _scale_json(fixture, factor,
+                                      _replicate_chimera_episode)
+            entries[(source, path)] = fixture
+        return Fixtures(entries, "{} (scaled {}x)"
+                        .format(self.description, factor))
+
+
+def _scale_json(fixture: Fixture, factor: int, replicate) -> Fixture:
+    items = json.loads(fixture.body.decode("UTF-8"))
+    scaled_items = list(items)
+    for replica in range(1, factor):
+        scaled_items.extend(replicate(item, replica) for item in items)
+    body = json.dumps(scaled_items).encode("UTF-8")
+    return Fixture(fixture.status, fixture.content_type, body)
+
+
+def _replica_url(url: str, replica: int) -> str:
+    if not url:
+        return url
+    base, extension = os.path.splitext(url)
+    return "{}-replica{}{}".format(base, replica, extension)
+
+
+def _replicate_rest_episode(episode: dict, replica: int) -> dict:
+    episode = dict(episode)
+    episode['id'] += replica * REPLICA_ID_OFFSET
+    episode['url'] = _replica_url(episode['url'], replica)
+    episode['deprecated_url'] = _replica_url(episode['deprecated_url'],
+                                             replica)
+    date = datetime.datetime.strptime(str(episode['dato']), "%Y%m%d") \
+        - datetime.timedelta(weeks=replica)
+    episode['dato'] = int(date.strftime("%Y%m%d"))
+    return episode
+
+
+def _replicate_chimera_episode(episode: dict, replica: int) -> dict:
+    episode = dict(episode)
+    episode['podcast_url'] = _replica_url(episode['podcast_url'], replica)
+    return episode
+
+
+def create_synthetic_fixtures(
+        num_shows: int=60,
+        episodes_per_show: int=40,
+        num_images: int=6,
+        seed: int=2017
+) -> Fixtures:
+    """Generate fixtures resembling the responses from the upstream sources.
+
+    Use this when no recorded fixtures are available. The numbers are chosen to
+    resemble the size of today's archive.
+
+    Args:
+        num_shows: Number of shows to generate.
+        episodes_per_show: Number of episodes each show has.
+        num_images: Number of show logos to generate.
+        seed: Seed for the random generator, so the fixtures are the same
+            every time.
+
+    Returns:
+        The generated fixtures.
+    """
+    rand = random.Random(seed)
+    fixtures = Fixtures(description="synthetic")
+    json_type = "application/json"
+
+    def add_json(source, path, data):
+        fixtures.add(source, path, Fixture(
+            200, json_type, json.dumps(data).encode("UTF-8")
+        ))
+
+    def words(n):
+        return " ".join(rand.choice(_WORDS) for _ in range(n))
+
+    shows = [{"id": 100 + i, "name": "{} {}".format(words(2).title(), i)}
+             for i in range(num_shows)]
+    add_json("rest_api", "/programmer/list", shows)
+
+    start_date = datetime.date(2019, 12, 31)
+    all_episodes = []
+    chimera_shows = []
+    for chimera_id, show in enumerate(shows, 1):
+        show_episodes = []
+        chimera_episodes = []
+        for n in range(episodes_per_show):
+            episode_id = show['id'] * 1000 + n
+            date = start_date - datetime.timedelta(
+                days=7 * n + rand.randint(0, 6)
+            )
+            url = "http://example.com/lyd/{}/{}.mp3".format(show['id'], n)
+            deprecated_url = "http://example.com/podkast/{}/{}.mp3"\
+                .format(show['id'], n)
+            show_episodes.append({
+                "id": episode_id,
+                "program_defnr": show['id'],
+                "dato": int(date.strftime("%Y%m%d")),
+                "time": rand.randint(0, 86399),
+                "url": url,
+                "filesize": rand.randint(10 ** 7, 10 ** 8),
+                "duration": rand.randint(600, 7200),
+                "deprecated_url": deprecated_url,
+                "title": words(5).capitalize(),
+                "comment": words(40) + "\nMer på http://radiorevolt.no",
+                "author": words(2).title() if n % 3 else None,
+            })
+            if n % 2:
+                chimera_episodes.append({
+                    "podcast_url": deprecated_url,
+                    "is_published": n % 10 != 1,
+                    "public_from": date.strftime("%Y-%m-%dT12:00:00Z"),
+                    "headline": words(6).capitalize(),
+                    "lead": words(15).capitalize(),
+                    "body": "\n\n".join(words(60) for _ in range(3)),
+                    "image": None,
+                })
+        all_episodes.extend(show_episodes)
+        add_json("rest_api", "/lyd/podcast/{}".format(show['id']),
+                 show_episodes)
+        add_json("chimera", "/episodes/{}/?format=json".format(chimera_id),
+                 chimera_episodes)
+        chimera_shows.append({
+            "showID": show['id'],
+            "id": chimera_id,
+            "name": show['name'],
+            "is_old": chimera_id % 7 == 0,
+            "lead": words(20).capitalize(),
+            "image": "http://dusken.no/media/thumbs/uploads/images/show{}"
+                     ".png.170x170_q85_crop_upscale.jpg".format(chimera_id),
+        })
+    all_episodes.sort(key=lambda e: (e['dato'], e['time']), reverse=True)
+    add_json("rest_api", "/lyd/podcast/", all_episodes)
+    add_json("chimera", "/shows/?format=json", chimera_shows)
+    add_json("kapina", "/", {"data": {"allShows": []}})
+
+    # Logos of varying size, so all paths through LocalImage are exercised
+    sizes = [(3500, 3500), (2000, 1800), (1400, 1400), (1200, 1200),
+             (3200, 2900), (1800, 1800)]
+    for i in range(num_images):
+        width, height = sizes[i % len(sizes)]
+        fixtures.add(IMAGE_SOURCE, "/logo{}.png".format(i), Fixture(
+            200, "image/png", _create_image(width, height, rand)
+        ))
+    return fixtures
+
+
+def _create_image(width: int, height: int, rand: random.Random) -> bytes:
+    # Imported here, so Pillow is only needed when images are generated
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rand.randrange(width), rand.randrange(height)
+        radius = rand.randint(width // 20, width // 4)
+        color = tuple(rand.randrange(256) for _ in range(3)) + (255,)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=color)
+    result = io.BytesIO()
+    image.save(result, "png")
+    return result.getvalue()
+
+
+_WORDS = ("radio revolt studentradio trondheim musikk kultur samfunn "
+          "podkast episode program nyheter film bok spill sport vitenskap "
+          "humor samtale intervju konsert album politikk debatt").split()
+
+
+class RecordingSession(requests.Session):
+    """Requests session which records every response from the upstream
+    sources into a Fixtures instance."""
+
+    def __init__(self, fixtures: Fixtures, source_urls: dict):
+        """
+        Args:
+            fixtures: The Fixtures instance responses are recorded into.
+            source_urls: Dictionary with source name as key and base URL as
+                value, used to find which source a response came from.
+        """
+        super().__init__()
+        self.fixtures = fixtures
+        self.source_urls = source_urls
+        self._image_names = dict()
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        if method.upper() == "GET":
+            self._record(response)
+        return response
+
+    def _record(self, response: requests.Response) -> None:
+        url = response.request.url
+        for source, base_url in self.source_urls.items():
+            base_url = base_url.rstrip("/")
+            if url.startswith(base_url):
+                path = url[len(base_url):] or "/"
+                break
+        else:
+            # Not one of the known sources, so it must be an image
+            source = IMAGE_SOURCE
+            path = self.image_path_for(url)
+        self.fixtures.add(source, path, Fixture(
+            response.status_code,
+            response.headers.get("Content-Type", ""),
+            response.content
+        ))
+
+    def image_path_for(self, url: str) -> str:
+        """Find the path an image is recorded under."""
+        if url not in self._image_names:
+            name = os.path.basename(urlsplit(url).path) or "image"
+            name = re.sub(r"[^\w.-]", "_", name)
+            self._image_names[url] = "/{}-{}".format(len(self._image_names),
+                                                     name)
+        return self._image_names[url]
+
+
+class FixtureServer:
+    """Local HTTP server which serves the fixtures, standing in for all the
+    upstream sources at once. Each source is found beneath /<source name>."""
+
+    def __init__(self, fixtures: Fixtures):
+        self.fixtures = fixtures
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                           self._create_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def source_url(self, source: str, original_url: str="") -> str:
+        """Get the URL to use instead of original_url for the given source."""
+        trailing_slash = "/" if original_url.endswith("/") else ""
+        return "{}/{}{}".format(self.base_url, source, trailing_slash)
+
+    def image_urls(self) -> list:
+        """URLs of all images served."""
+        return [self.source_url(IMAGE_SOURCE) + path
+                for path in self.fixtures.image_paths()]
+
+    def _create_handler(self):
+        fixtures = self.fixtures
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                source, _, path = self.path.lstrip("/").partition("/")
+                if "?" in source:
+                    source, query = source.split("?", 1)
+                    path = "?" + query
+                fixture = fixtures.find(source, "/" + path)
+                if fixture is None:
+                    logger.warning("No fixture for %s", self.path)
+                    self.send_error(404)
+                    return
+                self.send_response(fixture.status)
+                self.send_header("Content-Type", fixture.content_type)
+                self.send_header("Content-Length", str(len(fixture.body)))
+                self.end_headers()
+                self.wfile.write(fixture.body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
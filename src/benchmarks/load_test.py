@@ -0,0 +1,234 @@
+"""
+Replaying of requests from the access log against a running instance, and
+reporting of how fast they were answered.
+"""
+import collections
+import datetime
+import logging
+import math
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+import requests
+
+from benchmarks.access_log import ROUTES
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+
+class ReplayedRequest:
+    """Outcome of sending one request from the access log again."""
+    def __init__(self, entry, status: int=None, latency: float=None,
+                 lag: float=0.0, error: str=None):
+        """
+        Args:
+            entry: The LogEntry which was replayed.
+            status: HTTP status code of the response, None if no response was
+                received.
+            latency: Seconds from the request was sent until the whole
+                response was received.
+            lag: Seconds the request was sent later than scheduled, because
+                all workers were busy.
+            error: Description of what went wrong, if no response was
+                received.
+        """
+        self.entry = entry
+        self.status = status
+        self.latency = latency
+        self.lag = lag
+        self.error = error
+
+    @property
+    def failed(self) -> bool:
+        return self.status is None or self.status >= 500
+
+
+class Replayer:
+    """Sends the requests from the access log to an instance of the
+    application, with the same spacing in time as in the log, only faster."""
+
+    def __init__(self, base_url: str, speedup: float=1.0,
+                 concurrency: int=32, host: str=None, timeout: float=30.0):
+        """
+        Args:
+            base_url: URL of the instance to send requests to, like
+                http://127.0.0.1:5000.
+            speedup: How many times faster than in the log to send requests.
+                Use 0 to send them as fast as possible.
+            concurrency: Maximum number of requests in flight at a time.
+            host: Value to use for the Host header, so the instance generates
+                the same URLs as in production. Not changed when not given.
+            timeout: Seconds to wait for a response before giving up.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.speedup = speedup
+        self.concurrency = concurrency
+        self.host = host
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def _session(self) -> requests.Session:
+        # Sessions are not guaranteed to be thread safe, so use one per thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            if self.host:
+                session.headers['Host'] = self.host
+            self._local.session = session
+        return session
+
+    def replay(self, entries: list) -> (list, float):
+        """Send the requests found in the access log.
+
+        Args:
+            entries: List of LogEntry, sorted by time.
+
+        Returns:
+            Tuple with list of ReplayedRequest, in the order they were sent,
+            and the number of seconds it took to replay them all.
+        """
+        if not entries:
+            return [], 0.0
+        first_time = entries[0].time
+        semaphore = threading.BoundedSemaphore(self.concurrency)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            start = perf_counter()
+            for entry in entries:
+                scheduled = start + self._offset(entry.time - first_time)
+                delay = scheduled - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+                semaphore.acquire()
+                lag = max(0.0, perf_counter() - scheduled)
+                future = executor.submit(self._send, entry, lag)
+                future.add_done_callback(lambda _: semaphore.release())
+                futures.append(future)
+            results = [future.result() for future in futures]
+            duration = perf_counter() - start
+        return results, duration
+
+    def _offset(self, delta: datetime.timedelta) -> float:
+        if not self.speedup:
+            return 0.0
+        return delta.total_seconds() / self.speedup
+
+    def _send(self, entry, lag: float) -> ReplayedRequest:
+        start = perf_counter()
+        try:
+            r = self._session.request(
+                entry.method,
+                self.base_url + entry.path,
+                allow_redirects=False,
+                timeout=self.timeout,
+            )
+            # Accessing content makes sure the whole body has been received
+            r.content
+        except requests.RequestException as e:
+            return ReplayedRequest(entry, lag=lag, error=str(e))
+        return ReplayedRequest(entry, r.status_code, perf_counter() - start,
+                               lag)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Find the p-th percentile using the nearest-rank method."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(results: list, duration: float) -> dict:
+    """Summarize the outcome of some requests.
+
+    Args:
+        results: List of ReplayedRequest.
+        duration: Seconds spent replaying all requests, used to calculate
+            throughput.
+    """
+    latencies = sorted(r.latency for r in results if r.latency is not None)
+    statuses = collections.Counter(
+        str(r.status) if r.status is not None else "error" for r in results
+    )
+    summary = {
+        "requests": len(results),
+        "failed": sum(1 for r in results if r.failed),
+        "throughput": len(results) / duration if duration else None,
+        "statuses": dict(sorted(statuses.items())),
+        "max_lag": max((r.lag for r in results), default=0.0),
+    }
+    if latencies:
+        summary['latency'] = {
+            "unit": "seconds",
+            "mean": statistics.mean(latencies),
+            **{"p{}".format(p): percentile(latencies, p) for p in PERCENTILES},
+            "max": latencies[-1],
+        }
+    else:
+        summary['latency'] = None
+    return summary
+
+
+def create_report(results: list, duration: float, replayer: Replayer,
+                  log_duration: float) -> dict:
+    """Create report with throughput and latency for each route.
+
+    Args:
+        results: List of ReplayedRequest.
+        duration: Seconds spent replaying all requests.
+        replayer: The Replayer used, whose settings are included.
+        log_duration: Seconds between the first and last request in the log.
+    """
+    by_route = collections.defaultdict(list)
+    for result in results:
+        by_route[result.entry.route].append(result)
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "target": replayer.base_url,
+        "speedup": replayer.speedup,
+        "concurrency": replayer.concurrency,
+        "log_duration": log_duration,
+        "duration": duration,
+        "total": summarize(results, duration),
+        "routes": {
+            route: summarize(by_route[route], duration)
+            for route in ROUTES if route in by_route
+        },
+    }
+
+
+def format_report(report: dict) -> str:
+    """Present the report as a table."""
+    header = ["route", "requests", "failed", "req/s"] + \
+        ["p{} ms".format(p) for p in PERCENTILES] + ["max ms"]
+    rows = [header]
+    for route, summary in list(report['routes'].items()) + \
+            [("total", report['total'])]:
+        latency = summary['latency']
+        row = [
+            route,
+            str(summary['requests']),
+            str(summary['failed']),
+            "{:.1f}".format(summary['throughput'] or 0.0),
+        ]
+        for key in ["p{}".format(p) for p in PERCENTILES] + ["max"]:
+            row.append("{:.1f}".format(latency[key] * 1000) if latency else "-")
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = [
+        "  ".join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                  for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    lines.append("")
+    lines.append(
+        "Replayed {:.0f} seconds of traffic in {:.1f} seconds (speedup {}), "
+        "max lag behind schedule {:.2f} s."
+        .format(report['log_duration'], report['duration'],
+                report['speedup'] or "unlimited", report['total']['max_lag'])
+    )
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+"""
+Stand-ins for the parts of the application which depend on services we cannot
+easily run locally.
+"""
+import datetime
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from web_utils.no_such_slug import NoSuchSlug
+from web_utils.slug_already_in_use import SlugAlreadyInUse
+
+logger = logging.getLogger(__name__)
+
+
+class InMemorySlugList:
+    """Stand-in for SlugList, which keeps its data in an InMemorySlugListFactory
+    instead of PostgreSQL.
+
+    Changes take effect immediately, so commit and abort do nothing.
+    """
+    def __init__(self, factory, digas_id, *slug, last_modified=None):
+        self.factory = factory
+        self.digas_id = digas_id
+        self.slugs = list(slug)
+        self.last_modified = last_modified
+
+    @property
+    def canonical_slug(self):
+        return self.slugs[-1]
+
+    @canonical_slug.setter
+    def canonical_slug(self, new_slug):
+        self.append(new_slug)
+
+    def persist(self):
+        with self.factory.lock:
+            if self.canonical_slug in self.factory.canonical_slug_by_slug:
+                raise SlugAlreadyInUse(self.canonical_slug)
+            self.last_modified = _now()
+            self.factory.id_by_canonical_slug[self.canonical_slug] = \
+                (self.digas_id, self.last_modified)
+            for slug in self.slugs:
+                self.factory.canonical_slug_by_slug[slug] = self.canonical_slug
+
+    def commit(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def append(self, new_slug: str):
+        with self.factory.lock:
+            canonical_slug_by_slug = self.factory.canonical_slug_by_slug
+            if new_slug in canonical_slug_by_slug and \
+                    new_slug not in self.slugs:
+                raise SlugAlreadyInUse(new_slug)
+            old_canonical_slug = self.canonical_slug
+            for slug, canonical_slug in list(canonical_slug_by_slug.items()):
+                if canonical_slug == old_canonical_slug:
+                    canonical_slug_by_slug[slug] = new_slug
+            canonical_slug_by_slug[new_slug] = new_slug
+            del self.factory.id_by_canonical_slug[old_canonical_slug]
+            self.last_modified = _now()
+            self.factory.id_by_canonical_slug[new_slug] = \
+                (self.digas_id, self.last_modified)
+        self.slugs.append(new_slug)
+
+    def prepend(self, new_slug: str):
+        if new_slug in self.slugs:
+            return
+        with self.factory.lock:
+            if new_slug in self.factory.canonical_slug_by_slug:
+                raise SlugAlreadyInUse(new_slug)
+            self.factory.canonical_slug_by_slug[new_slug] = self.canonical_slug
+        self.slugs.insert(-1, new_slug)
+
+
+class InMemorySlugListFactory:
+    """Stand-in for SlugListFactory, which needs no database.
+
+    Use the same instance across generations of data sources, the same way the
+    database outlives them.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.canonical_slug_by_slug = dict()
+        self.id_by_canonical_slug = dict()
+
+    def create_connection(self):
+        return None
+
+    def init_db(self):
+        pass
+
+    def from_slug(self, slug: str, connection=None):
+        with self.lock:
+            try:
+                canonical_slug = self.canonical_slug_by_slug[slug]
+            except KeyError as e:
+                raise NoSuchSlug(slug) from e
+            digas_id, last_modified = self.id_by_canonical_slug[canonical_slug]
+            slugs = [s for s, c in self.canonical_slug_by_slug.items()
+                     if c == canonical_slug and s != canonical_slug]
+        return InMemorySlugList(self, digas_id, *slugs, canonical_slug,
+                                last_modified=last_modified)
+
+    def from_id(self, digas_id: int, connection=None):
+        with self.lock:
+            for canonical_slug, (other_id, _) in \
+                    self.id_by_canonical_slug.items():
+                if other_id == digas_id:
+                    return self.from_slug(canonical_slug)
+        raise NoSuchSlug("with digas_id = %s" % digas_id)
+
+    def get_all_slugs(self) -> dict:
+        with self.lock:
+            return dict(self.canonical_slug_by_slug)
+
+    def create(self, digas_id: int, *slug, last_modified=None,
+               connection=None):
+        return InMemorySlugList(self, digas_id, *slug,
+                                last_modified=last_modified)
+
+
+class StandInHub:
+    """Stand-in for a WebSub hub, which only records which feeds it is told
+    have changed, instead of passing the news on to subscribers."""
+
+    def __init__(self, port: int=0):
+        """
+        Args:
+            port: Port to listen on, or 0 to use any free port.
+        """
+        self.topics = []
+        """URLs of the feeds the hub has been notified about, in order."""
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port),
+                                           self._create_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def hub_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    def _create_handler(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode("UTF-8"))
+                if form.get("hub.mode") != ["publish"] or \
+                        not form.get("hub.url"):
+                    self.send_error(400)
+                    return
+                with hub._lock:
+                    hub.topics.extend(form["hub.url"])
+                for topic in form["hub.url"]:
+                    logger.info("%s has changed", topic)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
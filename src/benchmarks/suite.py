@@ -0,0 +1,430 @@
+"""
+The benchmarks themselves, and the environment they run in.
+"""
+import collections
+import copy
+import datetime
+import logging
+import os
+import os.path
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+from time import perf_counter
+
+from flask import Flask
+
+from benchmarks.fixtures import FixtureServer, Fixtures, RecordingSession, \
+    get_source_urls, set_source_urls
+from benchmarks.stand_ins import InMemorySlugListFactory
+from feed_utils.populate import prepare_pipelines_for_batch, \
+    prepare_processors_for_batch, run_show_pipeline
+from feed_utils.show import Show
+from init_globals import init_globals, close_globals
+from utils.flask_customization import customize_flask
+from utils.project_path import PROJECT_ROOT
+from views.fast_redirects import register_fast_redirects
+from views.metrics import register_metrics_route
+from views.redirects import register_episode_redirect, \
+    register_article_redirect
+from views.web_api import register_api_routes
+from views.web_feed import register_feed_routes
+from web_utils.image_manifest import ImageManifest
+from web_utils.local_image import LocalImage
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = (
+    "init_globals",
+    "render_show_cold",
+    "render_show_warm",
+    "render_all_cold",
+    "render_all_warm",
+    "redirect_episode",
+    "redirect_article",
+    "process_images",
+    "process_images_unchanged",
+)
+"""Names of all the benchmarks, in the order they are run."""
+
+REDIRECTS_PER_SAMPLE = 200
+"""Number of redirect requests timed together, to get measurable durations."""
+
+
+class BenchmarkEnvironment:
+    """The web application, wired up to use the given upstream sources and an
+    in-memory stand-in for the slug database."""
+
+    def __init__(self, settings: dict, work_dir: str, requests_session=None):
+        """
+        Args:
+            settings: Application settings, with the upstream sources already
+                pointing to where they should be fetched from.
+            work_dir: Directory in which files like the Redirector's database
+                are put.
+            requests_session: Requests session to use instead of the one
+                created by init_globals.
+        """
+        self.settings = copy.deepcopy(settings)
+        self.settings['redirector']['db_file'] = \
+            os.path.join(work_dir, "redirects.db")
+        self.settings['caching']['single_flight_dir'] = \
+            os.path.join(work_dir, "single_flight")
+        self.settings['images']['manifest_file'] = \
+            os.path.join(work_dir, "image_manifest.json")
+        self.settings['stats']['db_file'] = \
+            os.path.join(work_dir, "stats.db")
+        self.settings['websub']['db_file'] = \
+            os.path.join(work_dir, "websub.db")
+        # Emptied when the application is created, so never use the folder of
+        # a running instance
+        self.settings['metrics']['directory'] = \
+            os.path.join(work_dir, "metrics")
+        # Where the test client makes its requests, so the feeds are cached
+        self.settings['web']['base_url'] = "http://localhost/"
+        self.requests_session = requests_session
+        self.slug_list_factory = InMemorySlugListFactory()
+        self.global_dict = None
+        self.app = self._create_app()
+        self.client = self.app.test_client()
+
+    def get_global(self, key, *args):
+        return self.global_dict.get(key, *args)
+
+    def refresh(self) -> None:
+        """Create a new generation of data sources, like app.py does when the
+        old ones have gone stale."""
+        if self.global_dict:
+            close_globals(self.global_dict,
+                          close_requests=not self.requests_session)
+        new_global_dict = dict()
+        init_globals(
+            new_global_dict,
+            self.settings,
+            self.get_global,
+            self.requests_session,
+            self.global_dict['item_cache'] if self.global_dict else None,
+            self.global_dict['redirector'].tables
+            if self.global_dict else None,
+        )
+        new_global_dict['url_service'].slug_list_factory = \
+            self.slug_list_factory
+        prepare_pipelines_for_batch(new_global_dict['processors']['show'])
+        prepare_pipelines_for_batch(new_global_dict['processors']['episode'])
+        self.global_dict = new_global_dict
+
+    def get(self, path: str, expected_status: int=200):
+        response = self.client.get(path)
+        if response.status_code != expected_status:
+            raise RuntimeError("GET {} gave status {}, expected {}"
+                               .format(path, response.status_code,
+                                       expected_status))
+        return response
+
+    def all_show_slugs(self) -> list:
+        """Slugs of all shows, sorted with the show with most episodes
+        first."""
+        episode_source = self.get_global('episode_source')
+        episode_source.populate_all_episodes_list()
+        num_episodes = collections.Counter(
+            e['program_defnr'] for e in episode_source.all_episodes
+        )
+        shows = self.get_global('show_source').get_all_shows()
+        shows.sort(key=lambda s: num_episodes[s.id], reverse=True)
+        url_service = self.get_global('url_service')
+        return [url_service.sluggify(show.name) for show in shows]
+
+    def create_article_redirects(self, num_articles: int) -> list:
+        """Make sure there are articles to redirect to, since the episode
+        sources rarely have links.
+
+        Returns:
+            List of paths which redirect to an article.
+        """
+        redirector = self.get_global('redirector')
+        episode_source = self.get_global('episode_source')
+        show = self.get_global('show_source').get_all_shows()[0]
+        episodes = episode_source.episode_list(show)
+        paths = []
+        with self.app.test_request_context():
+            for i in range(num_articles):
+                episode = episodes[i % len(episodes)]
+                url = redirector.get_redirect_article(
+                    "http://example.com/artikkel/{}".format(i), episode
+                )
+                paths.append(url[url.index("/artikkel/"):])
+        return paths
+
+    def episode_redirect_paths(self, num_episodes: int) -> list:
+        """Paths which redirect to episodes' sound files."""
+        redirector = self.get_global('redirector')
+        redirector.flush()
+        proxies = sorted(redirector.get_all_sound())
+        return ["/episode/show/{}/episode.mp3".format(proxy)
+                for proxy in proxies[:num_episodes]]
+
+    def _create_app(self) -> Flask:
+        # This mirrors app.py, without its side effects
+        app = Flask("app", root_path=os.path.join(PROJECT_ROOT, "src"))
+        customize_flask(
+            app,
+            lambda: None,
+            official_website=self.settings['web']['official_website'],
+        )
+        register_api_routes(app, self.settings, self.get_global)
+        register_episode_redirect(app, self.settings, self.get_global)
+        register_article_redirect(app, self.settings, self.get_global)
+        register_metrics_route(app, self.settings, self.get_global)
+        register_feed_routes(app, self.settings, self.get_global)
+        register_fast_redirects(app, self.settings, self.get_global)
+        return app
+
+
+def measure(func, repeat: int, setup=None, divide_by: int=1) -> list:
+    """Call func repeat times, and return the seconds spent in each call.
+
+    Args:
+        func: Function to time, called without arguments.
+        repeat: Number of samples to take.
+        setup: Function called without arguments before each call to func,
+            without being timed.
+        divide_by: Number of operations func performs, which each sample is
+            divided by.
+
+    Returns:
+        List of samples, in seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        func()
+        samples.append((perf_counter() - start) / divide_by)
+    return samples
+
+
+def summarize(benchmark: str, scale: int, samples: list) -> dict:
+    return {
+        "benchmark": benchmark,
+        "scale": scale,
+        "unit": "seconds",
+        "samples": samples,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "max": max(samples),
+    }
+
+
+def run_benchmarks(
+        settings: dict,
+        fixtures: Fixtures,
+        scales=(1, 10, 100),
+        repeat: int=5,
+        only=None
+) -> dict:
+    """Run the benchmarks against the fixtures, at every scale.
+
+    Args:
+        settings: Application settings. The upstream sources, database files
+            and such are replaced, but the pipelines are used as configured.
+        fixtures: Responses from the upstream sources, at today's scale.
+        scales: Factors to multiply the size of the archive by.
+        repeat: Number of samples to take for each benchmark.
+        only: Names of benchmarks to run, or None to run all of them.
+
+    Returns:
+        Machine-readable results, see create_report.
+    """
+    selected = [b for b in BENCHMARKS if only is None or b in only]
+    results = []
+    for scale in scales:
+        logger.info("Running benchmarks at %dx scale", scale)
+        scaled_fixtures = fixtures.scaled(scale)
+        with FixtureServer(scaled_fixtures) as server, \
+                tempfile.TemporaryDirectory() as work_dir:
+            local_settings = copy.deepcopy(settings)
+            set_source_urls(local_settings, {
+                source: server.source_url(source, url)
+                for source, url in get_source_urls(settings).items()
+            })
+            env = BenchmarkEnvironment(local_settings, work_dir)
+            for benchmark in selected:
+                if benchmark.startswith("process_images") and \
+                        scale != scales[0]:
+                    # The number of images does not grow with the archive
+                    continue
+                logger.info("  %s", benchmark)
+                samples = _run_one(benchmark, env, server, work_dir, repeat)
+                results.append(summarize(benchmark, scale, samples))
+    return create_report(results, fixtures.description, repeat)
+
+
+def _run_one(benchmark, env, server, work_dir, repeat) -> list:
+    env.refresh()
+    biggest_show = "/" + env.all_show_slugs()[0]
+
+    if benchmark == "init_globals":
+        return measure(env.refresh, repeat)
+    elif benchmark == "render_show_cold":
+        return measure(lambda: env.get(biggest_show), repeat,
+                       setup=env.refresh)
+    elif benchmark == "render_show_warm":
+        env.get(biggest_show)
+        return measure(lambda: env.get(biggest_show), repeat)
+    elif benchmark == "render_all_cold":
+        return measure(lambda: env.get("/all"), repeat, setup=env.refresh)
+    elif benchmark == "render_all_warm":
+        env.get("/all")
+        return measure(lambda: env.get("/all"), repeat)
+    elif benchmark == "redirect_episode":
+        env.get("/all")
+        paths = env.episode_redirect_paths(REDIRECTS_PER_SAMPLE)
+        return measure(lambda: _get_all(env, paths), repeat,
+                       divide_by=len(paths))
+    elif benchmark == "redirect_article":
+        paths = env.create_article_redirects(REDIRECTS_PER_SAMPLE)
+        return measure(lambda: _get_all(env, paths), repeat,
+                       divide_by=len(paths))
+    elif benchmark == "process_images":
+        return _measure_process_images(env, server, work_dir, repeat)
+    elif benchmark == "process_images_unchanged":
+        return _measure_process_images(env, server, work_dir, repeat,
+                                       unchanged=True)
+    else:
+        raise ValueError("Unknown benchmark {}".format(benchmark))
+
+
+def _get_all(env, paths):
+    for path in paths:
+        env.get(path, expected_status=302)
+
+
+def _measure_process_images(env, server, work_dir, repeat,
+                            unchanged=False) -> list:
+    # Imported here, since process_images is a script with its own set-up
+    import process_images
+
+    image_dir = os.path.join(work_dir, "images")
+    manifest_file = os.path.join(work_dir, "image_manifest.json")
+    manifest = ImageManifest(manifest_file)
+    pairs = [
+        process_images.ShowImagePair(Show(name="Show {}".format(i), id=i),
+                                     LocalImage(url, manifest))
+        for i, url in enumerate(server.image_urls())
+    ]
+    for pair in pairs:
+        pair.show.image = pair.image.original_url
+
+    def clear_images():
+        shutil.rmtree(image_dir, ignore_errors=True)
+        os.makedirs(image_dir)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        manifest.load()
+
+    variants = process_images.get_variants(env.settings)
+
+    def run():
+        process_images.process_images(pairs, True, manifest=manifest,
+                                      variants=variants)
+
+    original_image_directory = LocalImage.image_directory
+    LocalImage.image_directory = image_dir
+    try:
+        if unchanged:
+            clear_images()
+            run()
+            return measure(run, repeat)
+        return measure(run, repeat, setup=clear_images)
+    finally:
+        LocalImage.image_directory = original_image_directory
+
+
+def record_fixtures(settings: dict, num_images: int=6) -> Fixtures:
+    """Record fixtures by rendering all feeds using the real upstream sources.
+
+    Args:
+        settings: Application settings, pointing to the real upstream sources.
+        num_images: Number of show logos to record.
+
+    Returns:
+        The recorded fixtures.
+    """
+    source_urls = get_source_urls(settings)
+    fixtures = Fixtures(description="recorded {}".format(
+        datetime.date.today().isoformat()
+    ))
+    session = RecordingSession(fixtures, source_urls)
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = BenchmarkEnvironment(settings, work_dir, session)
+        env.refresh()
+        slugs = env.all_show_slugs()
+        for slug in slugs:
+            logger.info("Recording %s", slug)
+            env.client.get("/" + slug)
+        env.get("/all")
+
+        image_pipeline = env.get_global('processors')['show'][
+            'image_processing']
+        prepare_processors_for_batch(image_pipeline)
+        images = []
+        for show in env.get_global('show_source').get_all_shows():
+            show = run_show_pipeline(show, image_pipeline)
+            if show.image and show.image not in images:
+                images.append(show.image)
+        for url in images[:num_images]:
+            logger.info("Recording %s", url)
+            session.get(url)
+    session.close()
+    return fixtures
+
+
+def create_report(results: list, fixtures_description: str,
+                  repeat: int) -> dict:
+    return {
+        "commit": _current_commit(),
+        "python": platform.python_version(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "fixtures": fixtures_description,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare_reports(baseline: dict, current: dict) -> str:
+    """Create a human-readable comparison of the medians in two reports."""
+    baseline_medians = {(r['benchmark'], r['scale']): r['median']
+                        for r in baseline['results']}
+    lines = ["{:<20}{:>6}{:>14}{:>14}{:>9}".format(
+        "benchmark", "scale", "baseline", "current", "ratio"
+    )]
+    for result in current['results']:
+        key = (result['benchmark'], result['scale'])
+        old = baseline_medians.get(key)
+        ratio = "{:.2f}".format(result['median'] / old) if old else "-"
+        lines.append("{:<20}{:>6}{:>14}{:>14.6f}{:>9}".format(
+            result['benchmark'],
+            "{}x".format(result['scale']),
+            "{:.6f}".format(old) if old is not None else "-",
+            result['median'],
+            ratio
+        ))
+    lines.append("(baseline: {}, current: {})".format(
+        baseline.get('commit'), current.get('commit')
+    ))
+    return "\n".join(lines)
+
+
+def _current_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=PROJECT_ROOT,
+            stderr=subprocess.DEVNULL,
+        ).decode("ASCII").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
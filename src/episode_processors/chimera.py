@@ -7,6 +7,7 @@ from markdown import Markdown
 from cached_property import threaded_cached_property as cached_property
 
 from episode_processors import SkipEpisode, EpisodeProcessor
+from utils.metrics import UPSTREAM_FETCH_SECONDS, CACHE_REQUESTS
 
 
 logger = logging.getLogger(__name__)
@@ -27,25 +28,30 @@ class Chimera(EpisodeProcessor):
             return []
         with self._episode_list_locks.setdefault(chimera_id, RLock()):
             try:
-                return self._episodes_by_chimera_id[chimera_id]
+                episodes = self._episodes_by_chimera_id[chimera_id]
+                CACHE_REQUESTS.labels("chimera_episodes", "hit").inc()
+                return episodes
             except KeyError:
+                CACHE_REQUESTS.labels("chimera_episodes", "miss").inc()
                 self._episodes_by_chimera_id[chimera_id] = self._fetch_episodes(chimera_id)
                 return self._episodes_by_chimera_id[chimera_id]
 
     @cached_property
     def _shows_by_digas_id(self):
-        r = self.requests.get(self.settings['api'] + "/shows/", params={"format": "json"})
-        r.raise_for_status()
-        shows = r.json()
+        with UPSTREAM_FETCH_SECONDS.labels("chimera/shows").time():
+            r = self.requests.get(self.settings['api'] + "/shows/", params={"format": "json"})
+            r.raise_for_status()
+            shows = r.json()
         return {show['showID']: show['id'] for show in shows}
 
     def _fetch_episodes(self, chimera_id):
-        r = self.requests.get(
-            self.settings['api'] + "/episodes/" + str(chimera_id) + "/",
-            params={"format": "json"}
-        )
-        r.raise_for_status()
-        episodes = r.json()
+        with UPSTREAM_FETCH_SECONDS.labels("chimera/episodes").time():
+            r = self.requests.get(
+                self.settings['api'] + "/episodes/" + str(chimera_id) + "/",
+                params={"format": "json"}
+            )
+            r.raise_for_status()
+            episodes = r.json()
         return {episode['podcast_url']: episode for episode in episodes}
 
     def accepts(self, episode) -> bool:
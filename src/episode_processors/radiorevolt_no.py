@@ -2,6 +2,7 @@ import rfc3339
 from cached_property import threaded_cached_property as cached_property
 
 from episode_processors import EpisodeProcessor
+from utils.metrics import UPSTREAM_FETCH_SECONDS
 
 
 class RadioRevolt_no(EpisodeProcessor):
@@ -16,6 +17,10 @@ class RadioRevolt_no(EpisodeProcessor):
                 episode['podcastUrl']}
 
     def _fetch_episodes(self):
+        with UPSTREAM_FETCH_SECONDS.labels("radiorevolt_no/episodes").time():
+            return self._do_fetch_episodes()
+
+    def _do_fetch_episodes(self):
         r = self.requests.get(
             self.settings['API_URL'],
             params={"query": """
@@ -0,0 +1,119 @@
+import argparse
+import logging
+import os.path
+import shlex
+import subprocess
+import sys
+
+from flask import Flask
+
+from feed_utils.no_such_show_error import NoSuchShowError
+from feed_utils.populate import prepare_pipelines_for_batch
+from init_globals import init_globals, close_globals
+from utils import set_up_logger
+from utils.project_path import PROJECT_ROOT
+from utils.settings_loader import load_settings
+from views.redirects import register_episode_redirect, \
+    register_article_redirect
+from views.web_feed import register_feed_routes, ALLOWED_PIPELINES, \
+    DEFAULT_PIPELINE
+from web_utils.static_feeds import StaticFeedExporter, feed_redirects
+
+logger = logging.getLogger("export_feeds")
+
+
+def parse_cli_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Render every feed and write them to files Nginx can "
+                    "serve without asking the application, together with a "
+                    "map file with the redirects from old show names. Feeds "
+                    "which no longer exist are removed, and Nginx is only "
+                    "reloaded when the redirects have changed."
+    )
+    parser.add_argument("-q", "--quiet", help="Don't generate output.",
+                        action="store_true")
+    parser.add_argument("--no-reload", action="store_true",
+                        help="Don't run the reload command, even if the "
+                             "redirects have changed.")
+    return parser.parse_args()
+
+
+def create_app(settings: dict, get_global) -> Flask:
+    # Like app.py, but only with the routes needed to render the feeds (the
+    # redirector needs the redirect routes to create URLs)
+    app = Flask("app", root_path=os.path.join(PROJECT_ROOT, "src"))
+    register_feed_routes(app, settings, get_global)
+    register_episode_redirect(app, settings, get_global)
+    register_article_redirect(app, settings, get_global)
+    return app
+
+
+def main():
+    args = parse_cli_arguments()
+    set_up_logger.set_up_logger()
+    if args.quiet:
+        set_up_logger.quiet()
+    else:
+        logger.addHandler(set_up_logger.mainStreamHandler)
+
+    settings = load_settings()
+    export_settings = settings['static_feeds']
+    globals = {}
+    init_globals(globals, settings, globals.get)
+    try:
+        prepare_pipelines_for_batch(globals['processors']['show'])
+        prepare_pipelines_for_batch(globals['processors']['episode'])
+        app = create_app(settings, globals.get)
+        exporter = StaticFeedExporter(
+            app.test_client(),
+            settings['web']['base_url'],
+            export_settings['directory'],
+            export_settings['redirects_file'],
+        )
+        pipelines = [None if pipeline == DEFAULT_PIPELINE else pipeline
+                     for pipeline in sorted(ALLOWED_PIPELINES)]
+        paged = bool(settings['feed']['page_size'])
+
+        url_service = globals['url_service']
+        for show in globals['show_source'].get_all_shows():
+            try:
+                _, slug = url_service.get_canonical_slug_for_slug(
+                    url_service.sluggify(show.name)
+                )
+            except NoSuchShowError:
+                logger.warning("Skipping %s, which has no slug", show.name)
+                continue
+            for pipeline in pipelines:
+                exporter.export_show(slug, pipeline, paged)
+        exporter.export_feed("/all")
+
+        redirects_changed = exporter.export_redirects(feed_redirects(
+            url_service.slug_list_factory.get_all_slugs(),
+            settings['all_episodes_show_aliases'],
+            pipelines,
+        ))
+        num_removed = exporter.prune()
+    finally:
+        close_globals(globals)
+
+    logger.info("Exported %d feeds to %s, %d files changed and %d removed",
+                exporter.num_exported, exporter.directory,
+                exporter.num_changed, num_removed)
+
+    reload_command = settings['redirector']['nginx_map']['reload_command']
+    if redirects_changed and reload_command and not args.no_reload:
+        logger.info("Running %s", reload_command)
+        result = subprocess.run(shlex.split(reload_command))
+        if result.returncode:
+            logger.error("%s failed with exit code %d", reload_command,
+                         result.returncode)
+            sys.exit(result.returncode)
+
+    if exporter.failed:
+        logger.error("Could not render %d feeds: %s", len(exporter.failed),
+                     ", ".join(exporter.failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
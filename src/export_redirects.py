@@ -0,0 +1,73 @@
+import argparse
+import logging
+import shlex
+import subprocess
+import sys
+
+from utils import set_up_logger
+from utils.settings_loader import load_settings
+from web_utils.redirect_map import RedirectMapExporter
+from web_utils.redirector import Redirector
+
+logger = logging.getLogger("export_redirects")
+
+
+def parse_cli_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export the episode and article redirects to map files "
+                    "Nginx can include, so Nginx can answer them without "
+                    "asking the application. Only redirects added since the "
+                    "last run are exported, and Nginx is only reloaded when "
+                    "something was added."
+    )
+    parser.add_argument("-q", "--quiet", help="Don't generate output.",
+                        action="store_true")
+    parser.add_argument("-f", "--full", action="store_true",
+                        help="Write the map files from scratch.")
+    parser.add_argument("--no-reload", action="store_true",
+                        help="Don't run the reload command, even if "
+                             "redirects were added.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli_arguments()
+    set_up_logger.set_up_logger()
+    if args.quiet:
+        set_up_logger.quiet()
+    else:
+        logger.addHandler(set_up_logger.mainStreamHandler)
+
+    settings = load_settings()
+    map_settings = settings['redirector']['nginx_map']
+    # Only the database is used, not the URL generation
+    redirector = Redirector(
+        settings['redirector']['db_file'], None, None, None, None
+    )
+    redirector.init_db()
+    exporter = RedirectMapExporter(
+        redirector,
+        {
+            "sound": map_settings['sound_file'],
+            "article": map_settings['article_file'],
+        },
+        map_settings['state_file'],
+    )
+
+    added = exporter.export(args.full)
+    for table, num_added in sorted(added.items()):
+        logger.info("Added %d redirects to %s", num_added,
+                    exporter.map_files[table])
+
+    reload_command = map_settings['reload_command']
+    if any(added.values()) and reload_command and not args.no_reload:
+        logger.info("Running %s", reload_command)
+        result = subprocess.run(shlex.split(reload_command))
+        if result.returncode:
+            logger.error("%s failed with exit code %d", reload_command,
+                         result.returncode)
+            sys.exit(result.returncode)
+
+
+if __name__ == '__main__':
+    main()
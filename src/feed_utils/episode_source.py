@@ -1,4 +1,5 @@
 import datetime
+import heapq
 import threading
 
 import pytz
@@ -8,6 +9,53 @@ from podgen import Media, Person, htmlencode
 from feed_utils.episode import Episode
 from feed_utils.no_episodes_error import NoEpisodesError
 from utils.linkify import linkify
+from utils.metrics import UPSTREAM_FETCH_SECONDS, CACHE_REQUESTS
+
+TIMEZONE = pytz.timezone("Europe/Oslo")
+"""Timezone of the publication date and time given by the REST API."""
+
+
+def _publication_key(episode_dict) -> tuple:
+    """Key which sorts episode dictionaries by when they were published."""
+    return int(episode_dict['dato']), episode_dict['time']
+
+
+def select_most_recent(episode_dicts, limit: int=None, max_age: float=None,
+                       now: datetime.datetime=None) -> list:
+    """Find the most recently published episodes, without creating Episode
+    objects for the others.
+
+    Args:
+        episode_dicts: Iterable of episode dictionaries from the REST API.
+        limit: Maximum number of episodes to include. All are included when
+            not given.
+        max_age: Only include episodes published less than this many days ago.
+            Episodes of any age are included when not given.
+        now: The time max_age is counted from. Defaults to the current time.
+
+    Returns:
+        List of the selected episode dictionaries, with the most recent first.
+    """
+    if max_age is not None:
+        now = now or datetime.datetime.now(TIMEZONE)
+        cutoff = now.astimezone(TIMEZONE) - datetime.timedelta(days=max_age)
+        cutoff_key = (
+            int(cutoff.strftime("%Y%m%d")),
+            cutoff.hour * 3600 + cutoff.minute * 60 + cutoff.second,
+        )
+        episode_dicts = (e for e in episode_dicts
+                         if _publication_key(e) > cutoff_key)
+    if limit is None:
+        return sorted(episode_dicts, key=_publication_key, reverse=True)
+    return heapq.nlargest(limit, episode_dicts, key=_publication_key)
+
+
+def archive_page_count(num_episodes: int, page_size: int) -> int:
+    """Number of archive pages for a feed with the given number of episodes.
+
+    The last page_size or more episodes are left for the current page.
+    """
+    return max(0, num_episodes // page_size - 1)
 
 
 class EpisodeSource:
@@ -40,9 +88,10 @@ class EpisodeSource:
 
     def _fetch_all_episodes(self) -> list:
         """Fetches a list with all the episodes in the database, regardless of show."""
-        episode_list = self.requests.get(
-            url=self.api_url + "/lyd/podcast/"
-        ).json()
+        with UPSTREAM_FETCH_SECONDS.labels("rest_api/lyd").time():
+            episode_list = self.requests.get(
+                url=self.api_url + "/lyd/podcast/"
+            ).json()
         return episode_list
 
     def populate_all_episodes_list(self):
@@ -53,9 +102,10 @@ class EpisodeSource:
 
     def _fetch_episodes_for(self, show_id: int) -> list:
         """Returns a list with all the episodes in the database for the given show ID."""
-        episode_list = self.requests.get(
-            url=self.api_url + "/lyd/podcast/" + str(show_id)
-        ).json()
+        with UPSTREAM_FETCH_SECONDS.labels("rest_api/lyd_show").time():
+            episode_list = self.requests.get(
+                url=self.api_url + "/lyd/podcast/" + str(show_id)
+            ).json()
         return episode_list
 
     def _get_episode_data(self, show):
@@ -77,21 +127,90 @@ class EpisodeSource:
         else:
             return episodes
 
-    def episode_list(self, show):
-        """List of Episode objects for the given show."""
+    def _get_cached_episode_data(self, show):
         if show.id not in self.episodes_by_show:
+            CACHE_REQUESTS.labels("episodes_by_show", "miss").inc()
             self.episodes_by_show[show.id] = self._get_episode_data(show)
+        else:
+            CACHE_REQUESTS.labels("episodes_by_show", "hit").inc()
+        return self.episodes_by_show[show.id]
+
+    def episode_list(self, show, limit: int=None):
+        """List of Episode objects for the given show.
+
+        Args:
+            show: The Show to get episodes for.
+            limit: Maximum number of episodes to include, the most recent ones.
+                The episodes are in the order given by the REST API when not
+                given, otherwise the most recent come first.
+        """
+        episode_dicts = self._get_cached_episode_data(show)
+        if limit is not None:
+            episode_dicts = select_most_recent(episode_dicts, limit)
         # We don't save the Episode objects, this way changes done during
         # episode processing do not carry over to the next processing.
         return [self.episode(show, episode_dict)
-                for episode_dict in self.episodes_by_show[show.id]]
+                for episode_dict in episode_dicts]
+
+    def episode_page(self, show, page_size: int, page: int=None) \
+            -> (list, int):
+        """List of Episode objects on one page of the show's feed.
+
+        Episodes are split into archive pages of page_size episodes each,
+        starting with the oldest, so an archive page stays the same when new
+        episodes are published. The current page has the episodes which are
+        not archived yet, which are between page_size and 2 * page_size - 1
+        (unless there are fewer episodes in total).
+
+        Args:
+            show: The Show to get episodes for.
+            page_size: Number of episodes on each archive page.
+            page: Number of the archive page to get, starting with 1 for the
+                oldest. The current page is returned when not given.
+
+        Returns:
+            Tuple of the list of Episode objects with the most recent first,
+            and the number of archive pages.
+
+        Raises:
+            IndexError: When there is no archive page with the given number.
+            NoEpisodesError: When the show has no episodes at all.
+        """
+        episode_dicts = sorted(
+            self._get_cached_episode_data(show),
+            key=lambda e: (_publication_key(e), e['id'])
+        )
+        num_archive_pages = archive_page_count(len(episode_dicts), page_size)
+        if page is None:
+            selected = episode_dicts[num_archive_pages * page_size:]
+        elif 1 <= page <= num_archive_pages:
+            selected = episode_dicts[(page - 1) * page_size:page * page_size]
+        else:
+            raise IndexError(page)
+        return [self.episode(show, episode_dict)
+                for episode_dict in reversed(selected)], num_archive_pages
 
-    def get_all_episodes_list(self, show_source):
-        """List of Episode objects, from all shows."""
+    def get_all_episodes_list(self, show_source, limit: int=None,
+                              max_age: float=None):
+        """List of Episode objects, from all shows.
+
+        The episodes are in the order given by the REST API when neither limit
+        nor max_age is given, otherwise the most recent come first. Episodes
+        are selected before they are processed, so fewer may end up in the
+        feed if some are skipped.
+
+        Args:
+            show_source: ShowSource used to find the show of each episode.
+            limit: Maximum number of episodes to include, the most recent ones.
+            max_age: Only include episodes published less than this many days
+                ago.
+        """
         self.populate_all_episodes_list()
 
         episodes = self.all_episodes
         episodes = filter(lambda e: e['program_defnr'] != 0, episodes)
+        if limit is not None or max_age is not None:
+            episodes = select_most_recent(episodes, limit, max_age)
         # Create tuple out of iterator, so it can be used twice
         episodes = tuple(episodes)
 
@@ -116,9 +235,8 @@ class EpisodeSource:
         publication_datetime_naive = \
             publication_date + datetime.timedelta(seconds=episode_dict['time'])
         # And associate a timezone with that datetime
-        timezone = pytz.timezone("Europe/Oslo")
         publication_datetime_aware = \
-            timezone.localize(publication_datetime_naive)
+            TIMEZONE.localize(publication_datetime_naive)
 
         # Create our episode object
         return Episode(
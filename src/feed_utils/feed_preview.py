@@ -0,0 +1,50 @@
+import threading
+
+from lxml import etree
+
+from utils.project_path import project_path
+
+CONTENT_TYPE = "text/html; charset=utf-8"
+"""Content type of the previews."""
+
+
+class FeedPreview:
+    """Turns feeds into the web page browsers make of them with style.xsl.
+
+    Browsers which open a feed run the stylesheet on the whole feed every
+    time, which is slow for feeds with many episodes, especially on phones.
+    Applying it once on the server lets the page be cached like the feed.
+    """
+    def __init__(self, stylesheet_file: str="src/static/style.xsl"):
+        """Create new instance of FeedPreview.
+
+        Args:
+            stylesheet_file: Path to the XSLT stylesheet. Either absolute or
+                relative to the repository root folder.
+        """
+        self.stylesheet_file = project_path(stylesheet_file)
+        self._transform = etree.XSLT(etree.parse(self.stylesheet_file))
+        self._lock = threading.Lock()
+        """Lock ensuring the stylesheet is only applied by one thread at a
+        time, since XSLT objects should not be used concurrently."""
+
+    def render(self, feed: bytes) -> str:
+        """Apply the stylesheet to the feed.
+
+        Args:
+            feed: The RSS feed, encoded as UTF-8.
+
+        Returns:
+            The HTML page.
+        """
+        document = etree.fromstring(feed)
+        with self._lock:
+            result = self._transform(document)
+        html = str(result)
+        # The stylesheet writes <!DOCTYPE html> itself, since browsers ignore
+        # the doctype from xsl:output. Only keep that one
+        first_line, _, rest = html.partition("\n")
+        if first_line.upper().startswith("<!DOCTYPE") and \
+                rest.upper().startswith("<!DOCTYPE"):
+            html = rest
+        return html
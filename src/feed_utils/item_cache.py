@@ -0,0 +1,116 @@
+import re
+import threading
+from collections import OrderedDict
+
+from lxml import etree
+
+from utils.metrics import CACHE_REQUESTS
+
+
+NAMESPACE_DECLARATION_PATTERN = re.compile(r' xmlns:([\w.-]+)="([^"]*)"')
+"""Pattern matching a namespace declaration in a start tag."""
+
+
+def episode_fields(episode) -> tuple:
+    """Get the fields of the episode which end up in its <item> element.
+
+    Two episodes with the same fields are rendered identically.
+    """
+    media = episode.media
+    return (
+        episode.id,
+        episode.title,
+        episode.link,
+        episode.summary,
+        episode.long_summary,
+        tuple((author.name, author.email) for author in episode.authors),
+        (media.url, media.size, media.type, media.duration) if media else None,
+        episode.publication_date,
+        episode.withhold_from_itunes,
+        episode.image,
+        episode.explicit,
+        episode.is_closed_captioned,
+        episode.position,
+        episode.subtitle,
+    )
+
+
+class ItemCache:
+    """Cache of the <item> elements of feeds, serialized as text.
+
+    Turning episodes into XML is repeated for every feed they are in, every
+    time the feed is rendered, even though old episodes rarely change. The
+    items are cached using their fields as key, so an episode is rendered again
+    only when something about it has changed.
+
+    The cache is carried over from one generation of data sources to the next.
+    The least recently used items are forgotten when there are too many.
+    """
+    def __init__(self, max_items: int=20000):
+        """Create new instance of ItemCache.
+
+        Args:
+            max_items: Maximum number of items to keep.
+        """
+        self.max_items = max_items
+        self._items = OrderedDict()
+        """Serialized items, with the key from _key as key."""
+        self._lock = threading.Lock()
+        self._hits = CACHE_REQUESTS.labels("feed_items", "hit")
+        self._misses = CACHE_REQUESTS.labels("feed_items", "miss")
+
+    def get_item(self, episode, nsmap: dict, pretty_print: bool=True) -> str:
+        """Get the <item> element for the episode, as text.
+
+        Args:
+            episode: The Episode to get the <item> for.
+            nsmap: Namespaces declared on the root of the feed, which are not
+                repeated on the item.
+            pretty_print: Whether to indent the item like it is when the whole
+                feed is pretty printed.
+
+        Returns:
+            The serialized <item> element, without trailing whitespace.
+        """
+        key = (episode.id, hash(episode_fields(episode)), pretty_print)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        if item is not None:
+            self._hits.inc()
+            return item
+
+        self._misses.inc()
+        item = self._serialize(episode, nsmap, pretty_print)
+        with self._lock:
+            self._items[key] = item
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return item
+
+    @staticmethod
+    def _serialize(episode, nsmap: dict, pretty_print: bool) -> str:
+        # Place the item where it would be in the feed, so the namespace
+        # prefixes of the feed are used. The whole tree is serialized, so the
+        # item is indented like it is in the feed
+        root = etree.Element("rss", nsmap=nsmap)
+        channel = etree.SubElement(root, "channel")
+        channel.append(episode.rss_entry())
+        document = etree.tostring(root, encoding="unicode",
+                                  pretty_print=pretty_print)
+        item = document[document.index("<item"):
+                        document.rindex("</item>") + len("</item>")]
+
+        # The namespaces are already declared on the root of the feed
+        start_tag_end = item.index(">")
+
+        def remove_declared(match):
+            if nsmap.get(match.group(1)) == match.group(2):
+                return ""
+            return match.group(0)
+
+        start_tag = NAMESPACE_DECLARATION_PATTERN.sub(
+            remove_declared, item[:start_tag_end]
+        )
+        return start_tag + item[start_tag_end:]
@@ -0,0 +1,73 @@
+import json
+
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+"""Version of the JSON Feed specification the feeds follow."""
+
+CONTENT_TYPE = "application/feed+json"
+"""Content type of JSON Feed documents."""
+
+
+def render_json_feed(show, hub_url: str=None) -> str:
+    """Create a JSON Feed document for the show and its episodes.
+
+    The same fields are used as in the RSS feed, but the document is created
+    with the json module instead of podgen and lxml, which is much faster.
+
+    Args:
+        show: The populated Show, with its episodes. Its feed_url is used as
+            the URL of the JSON feed, and its feed_links for the link to the
+            next (older) page.
+        hub_url: URL of the WebSub hub to advertise, or None.
+
+    Returns:
+        The JSON document, without unnecessary whitespace.
+    """
+    feed = _without_empty({
+        "version": JSON_FEED_VERSION,
+        "title": show.name,
+        "home_page_url": show.website,
+        "feed_url": show.feed_url,
+        "next_url": dict(show.feed_links).get("next"),
+        "description": show.description,
+        "icon": show.image,
+        "authors": _authors(show.authors),
+        "language": show.language,
+        "hubs": [{"type": "WebSub", "url": hub_url}] if hub_url else None,
+        "items": [_item(episode) for episode in show.episodes],
+    })
+    return json.dumps(feed, ensure_ascii=False, separators=(",", ":"))
+
+
+def _item(episode) -> dict:
+    media = episode.media
+    return _without_empty({
+        "id": episode.id or (media.url if media else None),
+        "url": episode.link,
+        "title": episode.title,
+        "content_html": episode.long_summary or episode.summary,
+        "summary": episode.subtitle,
+        "image": episode.image,
+        "date_published": episode.publication_date.isoformat()
+        if episode.publication_date else None,
+        "authors": _authors(episode.authors),
+        "attachments": [_without_empty({
+            "url": media.url,
+            "mime_type": media.type,
+            "size_in_bytes": media.size,
+            "duration_in_seconds": media.duration.total_seconds()
+            if media.duration else None,
+        })] if media else None,
+    })
+
+
+def _authors(authors) -> list:
+    return [_without_empty({
+        "name": author.name,
+        "url": "mailto:" + author.email if author.email else None,
+    }) for author in authors or ()] or None
+
+
+def _without_empty(fields: dict) -> dict:
+    # JSON Feed leaves out fields instead of setting them to null
+    return {key: value for key, value in fields.items()
+            if value is not None and value != ""}
@@ -1,8 +1,10 @@
 import logging
 import itertools
+from time import perf_counter
 
 from show_processors import SkipShow
 from episode_processors import SkipEpisode
+from utils.metrics import PROCESSOR_SECONDS
 
 
 logger = logging.getLogger(__name__)
@@ -55,9 +57,9 @@ def run_show_pipeline(
     """
     # Leave original show untouched
     for processor in processor_list:
-        if processor.accepts(show):
+        if _timed_accepts(processor, "show", show):
             try:
-                processor.populate(show)
+                _timed_populate(processor, "show", show)
             except SkipShow as e:
                 if mask_skip_show:
                     logger.debug("Ignoring SkipShow", exc_info=True)
@@ -133,9 +135,9 @@ def _run_episode_pipeline_on_single_episode(
         {"episodename": episode.title, "showname": episode.show.name}
     )
     for processor in processor_list:
-        if processor.accepts(episode):
+        if _timed_accepts(processor, "episode", episode):
             try:
-                processor.populate(episode)
+                _timed_populate(processor, "episode", episode)
             except SkipEpisode:
                 if mask_skip_episode:
                     logger.debug("Ignoring SkipEpisode", exc_info=True)
@@ -143,3 +145,25 @@ def _run_episode_pipeline_on_single_episode(
                     raise
 
     return episode
+
+
+def _timed_accepts(processor, pipeline_type, obj):
+    """Call processor.accepts(obj), recording how long it took."""
+    start = perf_counter()
+    try:
+        return processor.accepts(obj)
+    finally:
+        PROCESSOR_SECONDS.labels(
+            pipeline_type, type(processor).__name__, "accepts"
+        ).observe(perf_counter() - start)
+
+
+def _timed_populate(processor, pipeline_type, obj):
+    """Call processor.populate(obj), recording how long it took."""
+    start = perf_counter()
+    try:
+        processor.populate(obj)
+    finally:
+        PROCESSOR_SECONDS.labels(
+            pipeline_type, type(processor).__name__, "populate"
+        ).observe(perf_counter() - start)
@@ -1,6 +1,17 @@
+import copy
+
+from lxml import etree
 from podgen import Podcast
 
 
+PODCAST_NAMESPACE = "https://podcastindex.org/namespace/1.0"
+"""Namespace of the podcast namespace, used to list image variants."""
+
+ARCHIVE_NAMESPACE = "http://purl.org/syndication/history/1.0"
+"""Namespace of the feed history extension (RFC 5005), used to mark archive
+pages."""
+
+
 class Show(Podcast):
     """
     Data-oriented class for storing information about a show, as well as its
@@ -21,8 +32,98 @@ class Show(Podcast):
         self.progress_i = 0
         self.progress_n = None
 
+        self.image_variants = []
+        """List of (URL, size in pixels) tuples for smaller versions of the
+        image, which clients can choose between."""
+
+        self.feed_links = []
+        """List of (relation, URL) tuples for other pages of this feed, like
+        the next and previous pages (RFC 5005)."""
+
+        self.is_archive = False
+        """Whether this is an archive page, whose episodes do not change (RFC
+        5005)."""
+
+        self.item_cache = None
+        """ItemCache to get the <item> elements from when generating the feed,
+        or None to create them all anew."""
+
         super().__init__(**kwargs)
         self.name = name
         """Name of the show"""
         self.id = id
         """DigAS ID"""
+
+    def __copy__(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        # Copy lists like the episodes and authors (and _nsmap, which is
+        # changed when generating the feed), so changing them in the copy
+        # does not change this show
+        for name, value in self.__dict__.items():
+            if isinstance(value, (list, dict, set)):
+                clone.__dict__[name] = copy.copy(value)
+        return clone
+
+    def rss_str(self, minimize=False, encoding='UTF-8',
+                xml_declaration=True):
+        if self.item_cache is None or not self.episodes:
+            return super().rss_str(minimize, encoding, xml_declaration)
+
+        # Generate the feed without items, and add them from the cache
+        episodes = self.episodes
+        publication_date = self.publication_date
+        if publication_date is None:
+            # Found from the episodes when not set, so do it before they're gone
+            episode_dates = [e.publication_date for e in episodes
+                             if e.publication_date is not None]
+            if episode_dates:
+                self.publication_date = max(episode_dates)
+        try:
+            self.episodes = []
+            feed = super().rss_str(minimize, encoding, xml_declaration)
+        finally:
+            self.episodes = episodes
+            self.publication_date = publication_date
+
+        pretty_print = not minimize
+        items = [self.item_cache.get_item(episode, self._nsmap, pretty_print)
+                 for episode in episodes]
+        channel_end = feed.rindex("</channel>")
+        if pretty_print:
+            # Indent like the other children of <channel>
+            separator = "\n    "
+            return feed[:channel_end] + "  " + separator.join(items) + \
+                "\n  " + feed[channel_end:]
+        return feed[:channel_end] + "".join(items) + feed[channel_end:]
+
+    def _create_rss(self):
+        if self.image_variants:
+            self._nsmap['podcast'] = PODCAST_NAMESPACE
+        if self.is_archive:
+            self._nsmap['fh'] = ARCHIVE_NAMESPACE
+        feed = super()._create_rss()
+        channel = feed.find("channel")
+        # Put the elements before the items, where they are when the items are
+        # added from the item cache
+        first_item = channel.find("item")
+        position = len(channel) if first_item is None \
+            else channel.index(first_item)
+        elements = []
+        if self.image_variants:
+            images = etree.Element('{%s}images' % PODCAST_NAMESPACE)
+            images.attrib['srcset'] = ", ".join(
+                "{} {}w".format(url, size) for url, size in self.image_variants
+            )
+            elements.append(images)
+        if self.is_archive:
+            elements.append(etree.Element('{%s}archive' % ARCHIVE_NAMESPACE))
+        for rel, url in self.feed_links:
+            link = etree.Element('{%s}link' % self._nsmap['atom'])
+            link.attrib['href'] = url
+            link.attrib['rel'] = rel
+            link.attrib['type'] = 'application/rss+xml'
+            elements.append(link)
+        for offset, element in enumerate(elements):
+            channel.insert(position + offset, element)
+        return feed
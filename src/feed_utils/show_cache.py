@@ -0,0 +1,84 @@
+import copy
+import threading
+
+from feed_utils.populate import run_show_pipeline
+from utils.metrics import CACHE_REQUESTS
+
+
+class ShowCache:
+    """Shows populated by the show pipelines, so each pipeline runs only once
+    for each show.
+
+    The show metadata only changes when the data sources are refreshed, so one
+    instance is created for every generation of data sources. Callers get a
+    copy of the cached show, which they are free to change.
+    """
+    def __init__(self, show_source, show_pipelines: dict):
+        """Create new instance of ShowCache.
+
+        Args:
+            show_source: ShowSource to get the shows from.
+            show_pipelines: Dictionary with pipeline name as key and list of
+                show processors as value.
+        """
+        self.show_source = show_source
+        self.show_pipelines = show_pipelines
+        self._shows = dict()
+        """Populated shows, with (DigAS ID, pipeline name, host URL) as key."""
+        self._lock = threading.Lock()
+        self._populate_locks = dict()
+        """Locks with the same keys as _shows, ensuring only one thread runs
+        the show pipeline for each show at a time, so concurrent requests for
+        the same show wait for the first one. Requests for other shows are not
+        held up."""
+
+    def get_show(self, digas_id: int, pipeline: str, host_url: str):
+        """Get the show with the given DigAS ID, populated by the given
+        pipeline.
+
+        Args:
+            digas_id: DigAS ID of the show.
+            pipeline: Name of the show pipeline to populate the show with.
+            host_url: URL of the host the request was made to. Processors like
+                UseLocalImage create absolute URLs, which depend on it. Set to
+                None to populate the show without caching it.
+
+        Returns:
+            Copy of the populated show.
+
+        Raises:
+            KeyError: When there is no show with the given DigAS ID.
+        """
+        if host_url is None:
+            return run_show_pipeline(
+                self.show_source.get_show(digas_id),
+                self.show_pipelines[pipeline]
+            )
+        key = (digas_id, pipeline, host_url)
+        with self._lock:
+            show = self._shows.get(key)
+        if show is None:
+            CACHE_REQUESTS.labels("populated_shows", "miss").inc()
+            show = self._populate(key)
+        else:
+            CACHE_REQUESTS.labels("populated_shows", "hit").inc()
+        return copy.copy(show)
+
+    def _populate(self, key):
+        with self._lock:
+            populate_lock = self._populate_locks.setdefault(
+                key, threading.Lock()
+            )
+        with populate_lock:
+            with self._lock:
+                if key in self._shows:
+                    # Populated while we waited for our turn
+                    return self._shows[key]
+            digas_id, pipeline, _ = key
+            show = run_show_pipeline(
+                self.show_source.get_show(digas_id),
+                self.show_pipelines[pipeline]
+            )
+            with self._lock:
+                self._shows[key] = show
+            return show
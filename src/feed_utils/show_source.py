@@ -4,6 +4,7 @@ import warnings
 import requests
 import requests.auth
 from feed_utils.show import Show
+from utils.metrics import UPSTREAM_FETCH_SECONDS
 from cached_property import threaded_cached_property as cached_property
 
 
@@ -57,13 +58,14 @@ class ShowSource:
         return self._get_all_shows()
 
     def _fetch_all_shows(self):
-        r = self.requests.get(
-            url=self.api_url + "/programmer/list",
-            auth=requests.auth.HTTPDigestAuth(self.username, self.password),
-        )
-        r.raise_for_status()
-        r.encoding = "ISO 8859-1"
-        show_list = r.json()
+        with UPSTREAM_FETCH_SECONDS.labels("rest_api/programmer").time():
+            r = self.requests.get(
+                url=self.api_url + "/programmer/list",
+                auth=requests.auth.HTTPDigestAuth(self.username, self.password),
+            )
+            r.raise_for_status()
+            r.encoding = "ISO 8859-1"
+            show_list = r.json()
         return show_list
 
     def _get_all_shows(self) -> dict:
@@ -1,19 +1,37 @@
 """
 This module binds the stateful data retrievers to their settings.
 """
+import time
+
 import requests
 from flask import url_for
 
 from feed_utils.episode_source import EpisodeSource
+from feed_utils.feed_preview import FeedPreview
 from feed_utils.init_pipelines import create_show_pipelines,\
     create_episode_pipelines
+from feed_utils.item_cache import ItemCache
+from feed_utils.show_cache import ShowCache
 from feed_utils.show_source import ShowSource
 from views.redirects import SOUND_REDIRECT_ENDPOINT, ARTICLE_REDIRECT_ENDPOINT
-from web_utils.redirector import Redirector
+from web_utils.feed_cache import FeedCache
+from web_utils.hit_counter import HitCounter
+from web_utils.image_manifest import ImageManifest
+from web_utils.local_image_index import LocalImageIndex
+from web_utils.redirector import Redirector, RedirectTables
+from web_utils.single_flight import SingleFlight
 from web_utils.url_service import UrlService
+from web_utils.websub import WebSubPublisher
 
 
-def init_globals(new_global_dict: dict, settings: dict, get_global) -> None:
+def init_globals(
+        new_global_dict: dict,
+        settings: dict,
+        get_global,
+        requests_session: requests.Session=None,
+        item_cache: ItemCache=None,
+        redirect_tables: RedirectTables=None
+) -> None:
     """
     Create new instances of all data sources, to refresh our data.
 
@@ -22,33 +40,75 @@ def init_globals(new_global_dict: dict, settings: dict, get_global) -> None:
         settings: The settings for the application.
         get_global: Function which takes a parameter and gives the item with
             that key in new_global_dict in return.
+        requests_session: Object the data sources shall use when making HTTP
+            requests. A new one is created by create_requests when not given.
+        item_cache: Cache of rendered feed items from the previous generation,
+            which is kept since the items do not depend on the generation. A
+            new one is created by create_item_cache when not given.
+        redirect_tables: In-memory copy of the Redirector's tables from the
+            previous generation, which is kept so the tables are only read
+            once. A new one is created when not given.
 
     Returns:
         Nothing, new_global_dict is changed in-place.
     """
-    requests_session = create_requests()
+    requests_session = requests_session or create_requests()
     show_source = create_show_source(requests_session, settings)
     url_service = create_url_service(settings, show_source)
+    image_manifest = create_image_manifest(settings)
+    single_flight = create_single_flight(settings)
+    show_pipelines = create_show_pipelines(
+        requests_session, settings, get_global
+    )
 
     new_globals = {
         "requests": requests_session,
         "show_source": show_source,
         "episode_source": create_episode_source(requests_session, settings),
         "processors": {
-            "show": create_show_pipelines(
-                requests_session, settings, get_global
-            ),
+            "show": show_pipelines,
             "episode": create_episode_pipelines(
                 requests_session, settings, get_global
             ),
         },
+        "show_cache": ShowCache(show_source, show_pipelines),
         "url_service": url_service,
-        "redirector": create_redirector(settings, url_service),
+        "redirector": create_redirector(
+            settings, url_service, redirect_tables
+        ),
+        "single_flight": single_flight,
+        "feed_cache": create_feed_cache(settings, single_flight),
+        "item_cache": item_cache or create_item_cache(settings),
+        "feed_preview": FeedPreview(),
+        "hit_counter": create_hit_counter(settings),
+        "websub": create_websub_publisher(settings, requests_session),
+        "image_manifest": image_manifest,
+        "local_image_index": create_local_image_index(
+            settings, image_manifest
+        ),
     }
 
     new_global_dict.update(new_globals)
 
 
+def close_globals(global_dict: dict, close_requests: bool=True) -> None:
+    """
+    Stop the background work of the data sources created by init_globals, and
+    release their resources.
+
+    Args:
+        global_dict: Dictionary filled by init_globals.
+        close_requests: Whether to close the Requests session. Pass False when
+            it was given to init_globals and is still in use elsewhere.
+    """
+    # Announces the feeds still queued, so it must go before the session
+    global_dict['websub'].close()
+    if close_requests:
+        global_dict['requests'].close()
+    global_dict['hit_counter'].close()
+    global_dict['redirector'].close()
+
+
 def create_requests() -> requests.Session:
     """
     Create and configure an instance of requests.Session.
@@ -127,7 +187,8 @@ def create_episode_source(
 
 def create_redirector(
         settings: dict,
-        url_service: UrlService
+        url_service: UrlService,
+        tables: RedirectTables=None
 ) -> Redirector:
     """
     Return configured instance of Redirector, used to proxy episode downloads
@@ -138,6 +199,8 @@ def create_redirector(
             database file.
         url_service: Instance of UrlService, used to obtain the canonical slug
             for a given show.
+        tables: In-memory copy of the tables from the previous generation, or
+            None to create a new one, which is loaded when first needed.
 
     Returns:
         Configured and initialized instance of Redirector.
@@ -147,8 +210,165 @@ def create_redirector(
         url_service,
         ARTICLE_REDIRECT_ENDPOINT,
         SOUND_REDIRECT_ENDPOINT,
-        url_for
+        url_for,
+        settings['redirector']['flush_interval'],
+        tables,
     )
     # Ensure the database is set up
     redirector.init_db()
+    if redirector.tables.is_loaded:
+        # Add the IDs saved by other processes since the last generation
+        redirector.tables.update_in_background(redirector)
     return redirector
+
+
+def create_single_flight(settings: dict) -> SingleFlight:
+    """
+    Return configured instance of SingleFlight, used to let concurrent requests
+    for the same feed share one rendering of it.
+
+    Worker processes which refresh their data sources within the same period
+    of caching.source_data_ttl seconds share results with each other.
+
+    Args:
+        settings: Application settings, used to find the directory used to
+            coordinate with other worker processes.
+
+    Returns:
+        Configured instance of SingleFlight.
+    """
+    generation = int(time.time() // settings['caching']['source_data_ttl'])
+    return SingleFlight(settings['caching']['single_flight_dir'], generation)
+
+
+def create_feed_cache(settings: dict, single_flight: SingleFlight) \
+        -> FeedCache:
+    """
+    Return configured instance of FeedCache, used to render and compress each
+    feed only once in each generation.
+
+    Args:
+        settings: Application settings, used to find the compression levels.
+        single_flight: Instance of SingleFlight, used to let concurrent
+            requests for the same feed share one rendering of it.
+
+    Returns:
+        Configured instance of FeedCache.
+    """
+    return FeedCache(
+        single_flight,
+        settings['caching']['gzip_level'],
+        settings['caching']['brotli_quality'],
+    )
+
+
+def create_item_cache(settings: dict) -> ItemCache:
+    """
+    Return configured instance of ItemCache, used to avoid turning episodes
+    into XML again when they have not changed.
+
+    Args:
+        settings: Application settings, used to find the maximum number of
+            items to keep.
+
+    Returns:
+        Configured instance of ItemCache.
+    """
+    return ItemCache(settings['caching']['feed_item_cache_size'])
+
+
+def create_hit_counter(settings: dict) -> HitCounter:
+    """
+    Return configured instance of HitCounter, used to count how many times
+    episodes and articles are requested through the redirector.
+
+    Remember to call its close method when replacing it, so the hits counted
+    so far are saved.
+
+    Args:
+        settings: Application settings, used to find the statistics database
+            and how to count.
+
+    Returns:
+        Configured and initialized instance of HitCounter.
+    """
+    stats_settings = settings['stats']
+    hit_counter = HitCounter(
+        stats_settings['db_file'],
+        stats_settings['flush_interval'],
+        stats_settings['split_by_user_agent'],
+        stats_settings['max_retries'],
+    )
+    # Ensure the database is set up
+    hit_counter.init_db()
+    return hit_counter
+
+
+def create_websub_publisher(
+        settings: dict,
+        requests_session: requests.Session
+) -> WebSubPublisher:
+    """
+    Return configured instance of WebSubPublisher, used to notify the WebSub
+    hub when feeds have changed.
+
+    Remember to call its close method when replacing it, so the hub is
+    notified about all changes found so far.
+
+    Args:
+        settings: Application settings, used to find the hub and the database
+            with digests of the feeds.
+        requests_session: Object to use when notifying the hub.
+
+    Returns:
+        Configured and initialized instance of WebSubPublisher.
+    """
+    websub_settings = settings['websub']
+    publisher = WebSubPublisher(
+        websub_settings['db_file'],
+        websub_settings['hub_url'],
+        settings['web']['base_url'],
+        requests_session,
+        websub_settings['timeout'],
+    )
+    # Ensure the database is set up
+    publisher.init_db()
+    return publisher
+
+
+def create_image_manifest(settings: dict) -> ImageManifest:
+    """
+    Return instance of ImageManifest, which knows what local copies have been
+    made of show images.
+
+    Args:
+        settings: Application settings, used to find the manifest file.
+
+    Returns:
+        Instance of ImageManifest, loaded from file.
+    """
+    image_settings = settings['images']
+    return ImageManifest(
+        image_settings['manifest_file'],
+        image_settings['keep_replaced_for']
+    )
+
+
+def create_local_image_index(
+        settings: dict,
+        image_manifest: ImageManifest
+) -> LocalImageIndex:
+    """
+    Return instance of LocalImageIndex, used to find the local copies of show
+    images without checking the filesystem for every request.
+
+    Args:
+        settings: Application settings, used to find which image variants to
+            list in the feeds.
+        image_manifest: ImageManifest of this generation.
+
+    Returns:
+        Instance of LocalImageIndex.
+    """
+    formats = settings['images']['variants']['formats']
+    return LocalImageIndex(image_manifest, formats[0] if formats else None)
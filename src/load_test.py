@@ -0,0 +1,93 @@
+import argparse
+import json
+import logging
+import sys
+
+from benchmarks.access_log import ROUTES, read_log
+from benchmarks.load_test import Replayer, create_report, format_report
+
+logger = logging.getLogger("load_test")
+
+DEFAULT_ACCESS_LOG = "/var/log/nginx/podkast.access.log"
+
+
+def parse_cli_arguments() -> (argparse.ArgumentParser, argparse.Namespace):
+    parser = argparse.ArgumentParser(
+        description="Replay requests from the Nginx access log against a "
+                    "running instance of the application, and report "
+                    "throughput and latency percentiles for each kind of "
+                    "request. Only GET and HEAD requests are replayed, and "
+                    "redirects are not followed.")
+    parser.add_argument("log", nargs="?", default=DEFAULT_ACCESS_LOG,
+                        help="Access log to replay, use - for stdin "
+                             "(default: %(default)s).")
+    parser.add_argument("--target", "-t", default="http://127.0.0.1:5000",
+                        help="Base URL of the instance to send requests to "
+                             "(default: %(default)s).")
+    parser.add_argument("--speedup", "-s", type=float, default=1.0,
+                        help="Send requests this many times faster than they "
+                             "were received. Use 0 to send them as fast as "
+                             "possible (default: %(default)s).")
+    parser.add_argument("--concurrency", "-c", type=int, default=32,
+                        help="Maximum number of requests in flight at a time "
+                             "(default: %(default)s).")
+    parser.add_argument("--host",
+                        help="Use this as the Host header, so the instance "
+                             "generates the same URLs as in production.")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES,
+                        metavar="ROUTE",
+                        help="Only replay requests to these routes. Choices: "
+                             "{}".format(", ".join(ROUTES)))
+    parser.add_argument("--limit", "-n", type=int,
+                        help="Only replay the first N requests.")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Seconds to wait for each response "
+                             "(default: %(default)s).")
+    parser.add_argument("--output", "-o", metavar="FILE",
+                        help="Also write the report as JSON to FILE.")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only print warnings and the results.")
+    return parser, parser.parse_args()
+
+
+def main():
+    parser, args = parse_cli_arguments()
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(message)s",
+        stream=sys.stderr,
+    )
+    if args.speedup < 0:
+        parser.error("--speedup cannot be negative")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    routes = set(args.routes) if args.routes else None
+    if args.log == "-":
+        entries = read_log(sys.stdin, routes=routes)
+    else:
+        with open(args.log, encoding="UTF-8", errors="replace") as log_file:
+            entries = read_log(log_file, routes=routes)
+    if args.limit is not None:
+        entries = entries[:args.limit]
+    if not entries:
+        logger.error("Found no requests to replay in %s", args.log)
+        sys.exit(1)
+
+    log_duration = (entries[-1].time - entries[0].time).total_seconds()
+    logger.info("Replaying %d requests spanning %.0f seconds against %s",
+                len(entries), log_duration, args.target)
+    replayer = Replayer(args.target, args.speedup, args.concurrency,
+                        args.host, args.timeout)
+    results, duration = replayer.replay(entries)
+    report = create_report(results, duration, replayer, log_duration)
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as output_file:
+            json.dump(report, output_file, indent=2)
+            output_file.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,50 @@
 import argparse
 import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import requests
 from clint.textui import progress
 from collections import namedtuple
+from requests.adapters import HTTPAdapter
 
 from feed_utils.no_episodes_error import NoEpisodesError
 from feed_utils.populate import prepare_processors_for_batch, run_show_pipeline
-from init_globals import init_globals
+from init_globals import init_globals, close_globals, create_requests
 from utils import set_up_logger
 from utils.settings_loader import load_settings
+from web_utils.image_manifest import ManifestEntry
 from web_utils.local_image import LocalImage, ImageIsTooSmall
 
 logger = logging.getLogger("process_images")
 
+RESIZE_CONTEXT = multiprocessing.get_context("forkserver")
+"""Used to start the processes resizing images. They are forked from a server
+process which has not started any threads, and has the image code imported
+already."""
+RESIZE_CONTEXT.set_forkserver_preload(["__main__", "web_utils.local_image"])
+
 
 def parse_cli_arguments() -> (argparse.ArgumentParser, argparse.Namespace):
     parser = argparse.ArgumentParser(
         description="Create local copies of all show logos and resize them so they fit iTunes' requirements. "
                     "Note that this script assumes that you're running the webserver on this computer.")
     parser.add_argument("-q", "--quiet", help="Don't generate output.", action="store_true")
-    parser.add_argument("-f", "--force", help="Overwrite existing local copies of the logos.", action="store_true")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Download and process all logos, even those which are unchanged since last time.")
     parser.add_argument("-e", "--require-episodes", action="store_true",
                         help="Exclude shows which have no associated episodes. "
                              "Note that the episode metadata sources aren't invoked, so a show won't be excluded even if its"
                              " only episode is skipped.")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="Number of images to download at the same time (default: %(default)s).")
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(),
+                        help="Number of processes resizing images in parallel (default: number of CPUs, "
+                             "%(default)s).")
+    parser.add_argument("-t", "--timeout", type=float, default=30.0,
+                        help="Seconds to wait for each image to be downloaded or resized (default: %(default)s).")
     return parser, parser.parse_args()
 
 
@@ -38,8 +59,12 @@ def main():
             .addHandler(set_up_logger.mainStreamHandler)
     force = args.force
     require_episodes = args.require_episodes
+    if args.workers < 1 or args.processes < 1:
+        parser.error("--workers and --processes must be at least 1")
 
     settings = load_settings()
+    LocalImage.max_download_size = settings['images']['max_download_size']
+    LocalImage.png_options = dict(settings['images']['png'])
     globals = {}
     init_globals(globals, settings, globals.get)
 
@@ -48,16 +73,35 @@ def main():
             globals['processors']['show']['image_processing']
         )
 
-        shows = get_shows(require_episodes, force, globals)
-        process_images(shows, quiet)
+        shows = get_shows(require_episodes, globals)
+        process_images(shows, quiet, args.workers, args.processes,
+                       args.timeout, globals['image_manifest'], force,
+                       get_variants(settings))
     finally:
-        globals['requests'].close()
+        close_globals(globals)
 
 
 ShowImagePair = namedtuple("ShowImagePair", ["show", "image"])
 
 
-def get_shows(require_episodes, force, globals):
+def get_variants(settings) -> tuple:
+    """Find the (size, format) of each image variant to create."""
+    variant_settings = settings['images']['variants']
+    for image_format in variant_settings['formats']:
+        if image_format not in LocalImage.variant_formats:
+            raise ValueError(
+                "Image format {!r} is not supported, use one of {}".format(
+                    image_format, ", ".join(LocalImage.variant_formats)
+                )
+            )
+    return tuple(
+        (size, image_format)
+        for size in variant_settings['sizes']
+        for image_format in variant_settings['formats']
+    )
+
+
+def get_shows(require_episodes, globals):
     show_source = globals['show_source']
     shows = show_source.get_all_shows()
 
@@ -73,6 +117,8 @@ def get_shows(require_episodes, force, globals):
 
     if require_episodes:
         episode_source = globals['episode_source']
+        # Fetch all episodes in one request, instead of one request per show
+        episode_source.populate_all_episodes_list()
 
         def has_episode(show):
             try:
@@ -85,34 +131,301 @@ def get_shows(require_episodes, force, globals):
     else:
         chosen_shows = shows_w_image
 
-    img_pairs = list(map(lambda s: ShowImagePair(s, LocalImage(s.image)), chosen_shows))
+    # Many shows may use the same image, which only needs to be processed once
+    shows_by_image = dict()
+    for show in chosen_shows:
+        shows_by_image.setdefault(show.image, show)
 
-    if force:
-        shows_to_process = img_pairs
-    else:
-        shows_to_process = list(filter(lambda s: not s.image.local_copy_exists(), img_pairs))
+    manifest = globals['image_manifest']
+    return [ShowImagePair(show, LocalImage(url, manifest))
+            for url, show in shows_by_image.items()]
+
+
+def process_images(show_image_pairs, quiet, workers=8, processes=None,
+                   timeout=30.0, manifest=None, force=False, variants=()):
+    """Create local copies of the given images.
 
-    return list(shows_to_process)
+    Images are downloaded by a pool of threads sharing one session, and
+    resized in separate processes so all CPU cores can be used. A process
+    which takes too long to resize an image is killed, and replaced.
 
+    When a manifest is given, images which are unchanged since last time are
+    skipped, and local copies are named after their content.
 
-def process_images(show_image_pairs, quiet):
+    Args:
+        show_image_pairs: List of ShowImagePair to create local copies for.
+        quiet: Set to True to hide the progress bar.
+        workers: Number of images to download at the same time.
+        processes: Number of processes resizing images. Defaults to the number
+            of CPUs.
+        timeout: Seconds each image may spend being downloaded, and seconds
+            each image may spend being resized.
+        manifest: ImageManifest to consult and update.
+        force: Set to True to process all images, even unchanged ones.
+        variants: Tuple of (size, format) tuples, for each smaller variant of
+            the images to create.
+    """
     num_images = len(show_image_pairs)
 
     if not num_images:
         logger.info("There are no images to process.")
         return
 
-    logger.info("Creating local copies of %s images.", num_images)
+    logger.info("Checking %s images for changes.", num_images)
+
+    session = create_image_session(workers)
+    num_processed = 0
+    num_failed = 0
+    try:
+        results = _create_local_copies(
+            show_image_pairs, session, workers, processes, timeout, manifest,
+            force, variants
+        )
+        for item, processed, error in progress.bar(
+                results, hide=True if quiet else None,
+                expected_size=num_images):
+            show, image = item
+            if error is None:
+                num_processed += processed
+                logger.debug("%(action)s image for %(show)s",
+                             {"action": "Processed" if processed
+                              else "Skipped unchanged",
+                              "show": show.name})
+                continue
+            num_failed += 1
+            logger.error("An error happened while processing the image for "
+                         "%(show)s (image URL: %(url)s).",
+                         {"show": show.name, "url": show.image},
+                         exc_info=error)
+    finally:
+        session.close()
+
+    if manifest is not None:
+        for filename in manifest.prune(LocalImage.image_directory):
+            logger.debug("Removed %(filename)s, which has been replaced",
+                         {"filename": filename})
+        manifest.save()
+
+    logger.info("Processed %s images, %s were unchanged and %s failed.",
+                num_processed, num_images - num_processed - num_failed,
+                num_failed)
+
+
+def create_image_session(workers: int) -> requests.Session:
+    """Create requests session with room for one connection per worker."""
+    session = create_requests()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _download_if_changed(image, session, timeout, manifest, force,
+                         variants):
+    """Download the original image, unless the local copy is up to date.
+
+    Returns:
+        RemoteImage, or None if the existing local copy can be kept.
+    """
+    entry = None
+    if manifest is not None and not force:
+        entry = manifest.get(image.original_url)
+    if entry and (entry.variants != variants or not os.path.exists(
+            os.path.join(LocalImage.image_directory, entry.filename))):
+        # The local copy must be made again, even if the original is unchanged
+        entry = None
+
+    remote = image.download_if_modified(session, timeout, entry)
+    if remote is None:
+        return None
+    if entry and entry.source_hash == LocalImage.hash(remote.data):
+        # Same image, but the server did not support conditional requests
+        manifest.record(image.original_url, entry._replace(
+            etag=remote.etag,
+            last_modified=remote.last_modified,
+        ))
+        return None
+    return remote
+
+
+def _save_local_copy(image, remote, processed, manifest, variants):
+    """Save the processed image and its variants, and record them in the
+    manifest."""
+    if manifest is None:
+        filename = image.filename
+    else:
+        output_hash = LocalImage.hash(processed.data)
+        filename = image.content_filename(output_hash)
+
+    files = {filename: processed.data}
+    for (size, image_format), data in processed.variants.items():
+        files[LocalImage.variant_filename(filename, size, image_format)] = data
+    for variant_filename, data in files.items():
+        if manifest is None or not os.path.exists(
+                os.path.join(LocalImage.image_directory, variant_filename)):
+            image.save(data, variant_filename)
 
-    for item in progress.bar(show_image_pairs, hide=True if quiet else None):
-        show, image = item
-        logger.debug("Processing image for %(show)s", {"show": show.name})
+    if manifest is not None:
+        manifest.record(image.original_url, ManifestEntry(
+            filename=filename,
+            output_hash=output_hash,
+            source_hash=LocalImage.hash(remote.data),
+            etag=remote.etag,
+            last_modified=remote.last_modified,
+            variants=variants,
+        ))
+
+
+def _create_local_copies(show_image_pairs, session, workers, processes,
+                         timeout, manifest, force, variants):
+    """Download, resize and save images concurrently.
+
+    Yields:
+        Tuple of the ShowImagePair, whether a new local copy was made, and the
+        exception raised while processing it (None if successful), in the
+        order they finish.
+    """
+    processes = processes or os.cpu_count() or 1
+    idle_resizers = queue.Queue()
+    for _ in range(processes):
+        idle_resizers.put(_Resizer())
+
+    def resize(data, url):
+        resizer = idle_resizers.get()
+        try:
+            return resizer.resize(data, url, variants, timeout)
+        finally:
+            idle_resizers.put(resizer)
+
+    # Every download and resize has its own time limit, so the threads always
+    # finish and the pools can be shut down
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as downloaders, \
+                ThreadPoolExecutor(max_workers=processes) as resizers:
+            downloads = {
+                downloaders.submit(_download_if_changed, pair.image, session,
+                                   timeout, manifest, force, variants): pair
+                for pair in show_image_pairs
+            }
+            resizes = dict()
+            for future in as_completed(downloads):
+                pair = downloads[future]
+                try:
+                    remote = future.result()
+                except (IOError, requests.RequestException) as e:
+                    yield pair, False, e
+                    continue
+                if remote is None:
+                    yield pair, False, None
+                    continue
+                future = resizers.submit(resize, remote.data,
+                                         pair.image.original_url)
+                resizes[future] = pair, remote
+
+            for future in as_completed(resizes):
+                pair, remote = resizes[future]
+                try:
+                    _save_local_copy(pair.image, remote, future.result(),
+                                     manifest, variants)
+                except (IOError, ImageIsTooSmall, RuntimeError) as e:
+                    yield pair, False, e
+                else:
+                    yield pair, True, None
+    finally:
+        while not idle_resizers.empty():
+            idle_resizers.get().close()
+
+
+class _Resizer:
+    """A process which resizes images with LocalImage.process_data, one at a
+    time. The process is killed if an image takes too long, and a new one is
+    started for the next image."""
+    def __init__(self):
+        self._process = None
+        self._connection = None
+        self._exitcode = None
+
+    def resize(self, data: bytes, url: str, variants, timeout: float):
+        """Resize the image in the process, and return the ProcessedImage.
+
+        Raises:
+            TimeoutError: When the image was not resized within timeout
+                seconds.
+            RuntimeError: When the process died without a result.
+            Whatever LocalImage.process_data raised.
+        """
+        if self._process is None:
+            self._start()
         try:
-            image.create_local_copy()
-        except (IOError, ImageIsTooSmall, RuntimeError):
-            logger.exception("An error happened while processing the image "
-                             "for %(show)s (image URL: %(url)s).",
-                             {"show": show.name, "url": show.image})
+            # The PNG options are passed explicitly, since the class attribute
+            # is not set in the other process
+            self._connection.send(
+                (data, url, variants, LocalImage.png_options)
+            )
+            finished = self._connection.poll(timeout)
+            result = self._connection.recv() if finished else None
+        except (EOFError, OSError):
+            self._kill()
+            raise RuntimeError("The process resizing the image died with exit "
+                               "code {}".format(self._exitcode))
+        except BaseException:
+            self._kill()
+            raise
+        if not finished:
+            self._kill()
+            raise TimeoutError("Resizing did not finish within {:g} seconds"
+                               .format(timeout))
+        processed, error = result
+        if error is not None:
+            raise error
+        return processed
+
+    def close(self):
+        """Stop the process."""
+        if self._process is None:
+            return
+        # The process stops by itself when the connection is closed
+        self._connection.close()
+        self._process.join(1)
+        self._kill()
+
+    def _kill(self):
+        if self._process is None:
+            return
+        self._connection.close()
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join()
+        self._exitcode = self._process.exitcode
+        self._process = None
+        self._connection = None
+
+    def _start(self):
+        self._connection, child_connection = RESIZE_CONTEXT.Pipe()
+        self._process = RESIZE_CONTEXT.Process(
+            target=_run_resizer,
+            args=(child_connection,),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+
+
+def _run_resizer(connection):
+    # Runs in the process started by _Resizer
+    while True:
+        try:
+            data, url, variants, png_options = connection.recv()
+        except EOFError:
+            return
+        try:
+            processed = LocalImage.process_data(data, url, variants,
+                                                png_options)
+        except Exception as e:
+            connection.send((None, e))
+        else:
+            connection.send((processed, None))
+
 
 if __name__ == '__main__':
     main()
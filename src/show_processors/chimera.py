@@ -1,6 +1,7 @@
 from cached_property import threaded_cached_property as cached_property
 
 from show_processors import ShowProcessor
+from utils.metrics import UPSTREAM_FETCH_SECONDS
 
 ORIG_IMAGE_PREFIX = "http://dusken.no/media/thumbs/uploads/images/"
 ORIG_IMAGE_SUFFIX = ".170x170_q85_crop_upscale.jpg"
@@ -15,9 +16,10 @@ class Chimera(ShowProcessor):
 
     @cached_property
     def shows(self):
-        r = self.requests.get(self.settings['api'] + "/shows/", params={"format": "json"})
-        r.raise_for_status()
-        json = r.json()
+        with UPSTREAM_FETCH_SECONDS.labels("chimera/shows").time():
+            r = self.requests.get(self.settings['api'] + "/shows/", params={"format": "json"})
+            r.raise_for_status()
+            json = r.json()
         return {show['showID']: show for show in json}
 
     def accepts(self, show) -> bool:
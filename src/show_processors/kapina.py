@@ -1,6 +1,7 @@
 from cached_property import threaded_cached_property as cached_property
 
 from show_processors import ShowProcessor
+from utils.metrics import UPSTREAM_FETCH_SECONDS
 
 
 class Kapina(ShowProcessor):
@@ -41,6 +42,10 @@ class Kapina(ShowProcessor):
         return {show['name'].lower(): show for show in show_list}
 
     def _fetch_shows(self):
+        with UPSTREAM_FETCH_SECONDS.labels("kapina/shows").time():
+            return self._do_fetch_shows()
+
+    def _do_fetch_shows(self):
         r = self.requests.get(
             self.settings['api'],
             params={"query": """
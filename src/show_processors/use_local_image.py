@@ -1,15 +1,21 @@
 from show_processors import ShowProcessor
-from web_utils.local_image import LocalImage
 
 
 class UseLocalImage(ShowProcessor):
     """
     Processor which puts LocalImage to use by changing the image URL.
 
+    Local copies are looked up in the LocalImageIndex of the current generation
+    of data sources, so no files are checked while serving feeds. Smaller
+    variants of the image are made available through show.image_variants.
+
     Settings: (none)
     """
     def accepts(self, show) -> bool:
         return super().accepts(show) and show.image
 
     def populate(self, show) -> None:
-        show.image = LocalImage(show.image).get_image_url()
+        index = self.get_global('local_image_index')
+        original_url = show.image
+        show.image = index.get_image_url(original_url)
+        show.image_variants = index.get_variant_urls(original_url)
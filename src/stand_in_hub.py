@@ -0,0 +1,34 @@
+import argparse
+import logging
+import sys
+
+from benchmarks.stand_ins import StandInHub
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cli_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run a stand-in for a WebSub hub, which prints the feeds "
+                    "it is told have changed. Set websub.hub_url in the "
+                    "settings to the URL it prints."
+    )
+    parser.add_argument("--port", "-p", default=8900, type=int,
+                        help="Port to listen on (default: %(default)s).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli_arguments()
+    logging.basicConfig(level=logging.INFO, format="%(message)s",
+                        stream=sys.stderr)
+    hub = StandInHub(args.port)
+    logger.info("Listening at %s", hub.hub_url)
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 <?xml version="1.0" encoding="UTF-8"?>
 <xsl:stylesheet id="stylesheet" version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
-                xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+                xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"
+                xmlns:podcast="https://podcastindex.org/namespace/1.0" xmlns:atom="http://www.w3.org/2005/Atom">
     <xsl:output method="html" doctype-system="html" encoding="UTF-8" indent="yes" />
     <xsl:template match="/">
         <xsl:text disable-output-escaping='yes'>&lt;!DOCTYPE html&gt;</xsl:text>
@@ -183,7 +184,12 @@
                     </div>
                 </div>
                 <div class="limited">
-                    <img class="podcast-image"> <xsl:attribute name="src"> <xsl:value-of select="rss/channel/itunes:image/@href"/> </xsl:attribute> </img>
+                    <img class="podcast-image"> <xsl:attribute name="src"> <xsl:value-of select="rss/channel/itunes:image/@href"/> </xsl:attribute>
+                        <xsl:if test="rss/channel/podcast:images/@srcset">
+                            <xsl:attribute name="srcset"> <xsl:value-of select="rss/channel/podcast:images/@srcset"/> </xsl:attribute>
+                            <xsl:attribute name="sizes">(min-width: 24em) 300px, 100vw</xsl:attribute>
+                        </xsl:if>
+                    </img>
                     <h1 class="heading"><a> <xsl:attribute name="href"><xsl:value-of select="rss/channel/link"/></xsl:attribute><xsl:value-of select="rss/channel/title"/></a></h1>
                     <p><xsl:value-of select="rss/channel/description"/></p>
                     <div class="episodes">
@@ -218,6 +224,14 @@
                                 </li>
                             </xsl:for-each>
                         </ul>
+                        <p>
+                            <xsl:if test="rss/channel/atom:link[@rel='previous']">
+                                <a> <xsl:attribute name="href"> <xsl:value-of select="rss/channel/atom:link[@rel='previous']/@href"/> </xsl:attribute>Nyere episoder</a>&#160;
+                            </xsl:if>
+                            <xsl:if test="rss/channel/atom:link[@rel='next']">
+                                <a> <xsl:attribute name="href"> <xsl:value-of select="rss/channel/atom:link[@rel='next']/@href"/> </xsl:attribute>Eldre episoder</a>
+                            </xsl:if>
+                        </p>
                     </div>
                 </div>
 
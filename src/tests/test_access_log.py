@@ -0,0 +1,102 @@
+import datetime
+import logging
+
+import pytest
+
+from benchmarks.access_log import classify_path, parse_line, read_log
+
+COMBINED = '203.0.113.7 - - [06/Jan/2020:12:00:{:02d} +0100] ' \
+           '"{} {} HTTP/1.1" 200 1234 "-" "Podkastspiller/1.0"'
+MAIN = COMBINED + ' "198.51.100.1"'
+
+
+def test_parse_combined_line():
+    entry = parse_line(COMBINED.format(5, "GET", "/testshow?fmt=rss"))
+    assert entry.time == datetime.datetime(
+        2020, 1, 6, 12, 0, 5,
+        tzinfo=datetime.timezone(datetime.timedelta(hours=1))
+    )
+    assert entry.method == "GET"
+    assert entry.path == "/testshow?fmt=rss"
+    assert entry.status == 200
+    assert entry.user_agent == "Podkastspiller/1.0"
+    assert entry.route == "feed"
+
+
+def test_parse_main_line():
+    entry = parse_line(MAIN.format(5, "HEAD", "/all"))
+    assert entry.method == "HEAD"
+    assert entry.route == "all"
+    assert entry.user_agent == "Podkastspiller/1.0"
+
+
+def test_parse_line_without_referer_and_user_agent():
+    entry = parse_line('203.0.113.7 - - [06/Jan/2020:12:00:05 +0100] '
+                       '"GET /all HTTP/1.0" 304 -')
+    assert entry.status == 304
+    assert entry.user_agent is None
+
+
+def test_parse_escaped_user_agent():
+    entry = parse_line(COMBINED.replace("Podkastspiller/1.0",
+                                        'Spiller \\"beta\\"')
+                       .format(5, "GET", "/all"))
+    assert entry.user_agent == 'Spiller \\"beta\\"'
+
+
+@pytest.mark.parametrize("line", [
+    "Not a log line",
+    # Invalid time
+    COMBINED.replace("Jan", "Foo").format(5, "GET", "/all"),
+    # Bad request, which Nginx logs without method and path
+    '203.0.113.7 - - [06/Jan/2020:12:00:05 +0100] "-" 400 0 "-" "-"',
+])
+def test_unrecognized_lines(line):
+    assert parse_line(line) is None
+
+
+def test_read_log(caplog):
+    lines = [
+        COMBINED.format(6, "GET", "/testshow"),
+        COMBINED.format(5, "GET", "/all"),
+        "\n",
+        COMBINED.format(5, "POST", "/api/id/"),
+        COMBINED.format(5, "HEAD", "/json/testshow"),
+        "Not a log line",
+    ]
+
+    with caplog.at_level(logging.WARNING):
+        entries = read_log(lines)
+    # Sorted by time, keeping the order within the same second
+    assert [e.path for e in entries] == ["/all", "/json/testshow",
+                                         "/testshow"]
+    assert "Skipped 1 lines" in caplog.text
+
+    entries = read_log(lines, routes={"all", "feed"})
+    assert [e.path for e in entries] == ["/all", "/testshow"]
+    entries = read_log(lines, methods={"POST"})
+    assert [e.path for e in entries] == ["/api/id/"]
+
+
+@pytest.mark.parametrize("path,route", [
+    ("/testshow", "feed"),
+    ("/testshow?fmt=rss", "feed"),
+    ("/web/testshow", "special_feed"),
+    ("/ukjent/testshow", "other"),
+    ("/testshow/archive/2", "archive_feed"),
+    ("/web/testshow/archive/2", "archive_feed"),
+    ("/json/testshow/archive/2", "archive_feed"),
+    ("/ukjent/testshow/archive/2", "other"),
+    ("/testshow/archive/siste", "other"),
+    ("/json/testshow", "json_feed"),
+    ("/json/all", "json_feed"),
+    ("/all", "all"),
+    ("/episode/testshow/1/tittel", "episode"),
+    ("/artikkel/testshow/1", "artikkel"),
+    ("/api/id/episode/", "api"),
+    ("/static/style.xsl", "static"),
+    ("/metrics", "metrics"),
+    ("/", "other"),
+])
+def test_classify_path(path, route):
+    assert classify_path(path) == route
@@ -0,0 +1,147 @@
+import datetime
+
+import pytest
+
+from feed_utils.episode_source import EpisodeSource, TIMEZONE, \
+    select_most_recent, archive_page_count
+
+NOW = TIMEZONE.localize(datetime.datetime(2020, 1, 10, 12))
+
+
+def episode_dict(id, dato, time=12 * 3600, show=1):
+    return {
+        "id": id,
+        "dato": dato,
+        "time": time,
+        "program_defnr": show,
+        "url": "http://example.org/{}.mp3".format(id),
+        "filesize": 1000,
+        "duration": 1800,
+        "deprecated_url": None,
+        "title": "Episode {}".format(id),
+        "comment": "Om episode {}".format(id),
+        "author": None,
+    }
+
+
+class FakeShow:
+    id = 1
+
+
+class FakeShowSource:
+    def get_show(self, show_id):
+        return show_id
+
+
+def create_episode_source(episode_dicts):
+    episode_source = EpisodeSource(None, "http://example.org/api")
+    # Pretend the list of all episodes has been fetched already
+    episode_source.all_episodes = episode_dicts
+    return episode_source
+
+
+def test_most_recent_first():
+    episode_dicts = [
+        episode_dict(1, 20200101),
+        episode_dict(2, 20200103, 8 * 3600),
+        episode_dict(3, 20200102),
+        episode_dict(4, 20200103, 9 * 3600),
+    ]
+    assert [e["id"] for e in select_most_recent(episode_dicts)] == \
+        [4, 2, 3, 1]
+    assert [e["id"] for e in select_most_recent(episode_dicts, 2)] == [4, 2]
+    assert select_most_recent(episode_dicts, 0) == []
+
+
+def test_max_age_cutoff():
+    episode_dicts = [
+        # Exactly one day old, which is not less than one day
+        episode_dict(1, 20200109, 12 * 3600),
+        episode_dict(2, 20200109, 12 * 3600 + 1),
+        episode_dict(3, 20200110, 6 * 3600),
+        episode_dict(4, 20200108, 23 * 3600),
+    ]
+    selected = select_most_recent(episode_dicts, max_age=1, now=NOW)
+    assert [e["id"] for e in selected] == [3, 2]
+
+    selected = select_most_recent(episode_dicts, 1, max_age=1, now=NOW)
+    assert [e["id"] for e in selected] == [3]
+
+
+def test_max_age_uses_local_time():
+    # Published at 11:30 in Oslo, which is 10:30 in UTC
+    episode_dicts = [episode_dict(1, 20200109, 11 * 3600 + 30 * 60)]
+    # Same point in time as NOW, which is 11:00 in UTC
+    now = NOW.astimezone(datetime.timezone.utc)
+    assert select_most_recent(episode_dicts, max_age=1, now=now) == []
+
+
+def test_all_episodes_limit():
+    episode_source = create_episode_source([
+        episode_dict(1, 20200101, show=1),
+        episode_dict(2, 20200103, show=0),
+        episode_dict(3, 20200102, show=2),
+        episode_dict(4, 20200104, show=1),
+    ])
+
+    episodes = episode_source.get_all_episodes_list(FakeShowSource(), 2)
+    assert [e.media.url for e in episodes] == [
+        "http://example.org/4.mp3",
+        "http://example.org/3.mp3",
+    ]
+    assert [e.show for e in episodes] == [1, 2]
+
+
+def test_all_episodes_without_limit_keep_their_order():
+    episode_source = create_episode_source([
+        episode_dict(1, 20200101),
+        episode_dict(2, 20200103, show=0),
+        episode_dict(3, 20200102),
+    ])
+
+    episodes = episode_source.get_all_episodes_list(FakeShowSource())
+    assert [e.media.url for e in episodes] == [
+        "http://example.org/1.mp3",
+        "http://example.org/3.mp3",
+    ]
+
+
+def test_all_episodes_max_age():
+    today = datetime.datetime.now(TIMEZONE)
+    long_ago = today - datetime.timedelta(days=30)
+    episode_source = create_episode_source([
+        episode_dict(1, int(long_ago.strftime("%Y%m%d"))),
+        episode_dict(2, int(today.strftime("%Y%m%d")), 0),
+    ])
+
+    episodes = episode_source.get_all_episodes_list(FakeShowSource(),
+                                                    max_age=7)
+    assert [e.media.url for e in episodes] == ["http://example.org/2.mp3"]
+
+
+def test_archive_page_count():
+    assert archive_page_count(0, 10) == 0
+    assert archive_page_count(19, 10) == 0
+    # The current page keeps between page_size and 2 * page_size - 1
+    assert archive_page_count(20, 10) == 1
+    assert archive_page_count(29, 10) == 1
+    assert archive_page_count(30, 10) == 2
+
+
+def test_episode_page():
+    episode_source = create_episode_source([
+        episode_dict(i, 20200101 + i) for i in range(7)
+    ])
+
+    episodes, num_archive_pages = episode_source.episode_page(FakeShow(), 3)
+    assert num_archive_pages == 1
+    assert [e.media.url for e in episodes] == [
+        "http://example.org/{}.mp3".format(i) for i in (6, 5, 4, 3)
+    ]
+    episodes, _ = episode_source.episode_page(FakeShow(), 3, 1)
+    assert [e.media.url for e in episodes] == [
+        "http://example.org/{}.mp3".format(i) for i in (2, 1, 0)
+    ]
+    for page in (0, 2):
+        with pytest.raises(IndexError):
+            episode_source.episode_page(FakeShow(), 3, page)
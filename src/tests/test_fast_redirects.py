@@ -0,0 +1,62 @@
+import os.path
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from views.fast_redirects import RedirectFastPath
+from web_utils.redirector import Redirector
+
+OLD_URL = "http://example.org/old.mp3"
+
+
+@pytest.fixture
+def redirector():
+    directory = tempfile.mkdtemp()
+    redirector = Redirector(os.path.join(directory, "redirector.db"),
+                            None, None, None, None, flush_interval=60)
+    redirector.init_db()
+    with sqlite3.connect(redirector.db_file) as c:
+        c.execute("INSERT INTO sound (original, proxy) VALUES (?, ?)",
+                  (OLD_URL, "old"))
+    redirector.tables.update(redirector)
+    yield redirector
+    redirector.close()
+    shutil.rmtree(directory)
+
+
+class FakeHitCounter:
+    def __init__(self):
+        self.hits = []
+
+    def count(self, kind, proxy, user_agent=None):
+        self.hits.append((kind, proxy))
+
+
+def test_fast_path_redirects_from_loaded_tables(redirector):
+    hit_counter = FakeHitCounter()
+    passed_on = []
+
+    def wsgi_app(environ, start_response):
+        passed_on.append(environ['PATH_INFO'])
+        return Response("Flask")(environ, start_response)
+
+    app = RedirectFastPath(wsgi_app, {
+        "redirector": redirector,
+        "hit_counter": hit_counter,
+    }.get)
+    client = Client(app, Response)
+
+    response = client.get("/episode/show/old/old.mp3")
+    assert response.status_code == 302
+    assert response.headers["Location"] == OLD_URL
+    assert hit_counter.hits == [("episode", "old")]
+    assert passed_on == []
+
+    client.get("/episode/show/unknown/unknown.mp3")
+    client.get("/episode/show/old/old.mp3?foo=bar")
+    assert passed_on == ["/episode/show/unknown/unknown.mp3",
+                         "/episode/show/old/old.mp3"]
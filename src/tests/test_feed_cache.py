@@ -0,0 +1,158 @@
+import datetime
+import gzip
+
+import pytest
+import pytz
+from flask import Flask
+
+from views.web_feed import _prepare_feed_response
+from web_utils.feed_cache import FeedCache
+from web_utils.single_flight import SingleFlight
+
+LAST_UPDATED = pytz.timezone("Europe/Oslo").localize(
+    datetime.datetime(2020, 1, 1, 12, 30, 15, 500)
+)
+
+
+def create_feed_cache():
+    return FeedCache(SingleFlight(), brotli_quality=None)
+
+
+def test_compressed():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    assert feed.get_body() == b"<rss/>"
+    assert gzip.decompress(feed.get_body("gzip")) == b"<rss/>"
+
+
+def test_compressed_identically_every_time():
+    # Workers and generations must agree on the compressed bytes, since the
+    # entity tags and the exported files depend on them
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    same_feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    assert feed.get_body("gzip") == same_feed.get_body("gzip")
+
+
+def test_brotli_preferred():
+    brotli = pytest.importorskip("brotli")
+    feed = FeedCache(SingleFlight()).create("<rss/>", 600, LAST_UPDATED)
+    assert brotli.decompress(feed.get_body("br")) == b"<rss/>"
+
+    resp = respond(feed, {"Accept-Encoding": "gzip, deflate, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    resp = respond(feed, {"Accept-Encoding": "gzip, br;q=0"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    # Like Nginx, which only sees which codings are listed
+    resp = respond(feed, {"Accept-Encoding": "gzip;q=1.0, br;q=0.5"})
+    assert resp.headers["Content-Encoding"] == "br"
+
+
+def test_not_compressed_unless_accepted():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    for headers in (None, {"Accept-Encoding": "identity"},
+                    {"Accept-Encoding": "gzip;q=0"},
+                    {"Accept-Encoding": "*"}):
+        resp = respond(feed, headers)
+        assert "Content-Encoding" not in resp.headers
+        assert resp.get_data() == b"<rss/>"
+        assert "Accept-Encoding" in resp.vary
+
+
+def test_etag_from_contents():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    # Like in another worker process or generation
+    same_feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    other_feed = create_feed_cache().create("<rss></rss>", 600, LAST_UPDATED)
+    assert feed.get_etag() == same_feed.get_etag()
+    assert feed.get_etag("gzip") == same_feed.get_etag("gzip")
+    assert feed.get_etag() != other_feed.get_etag()
+    assert feed.get_etag() != feed.get_etag("gzip")
+
+
+def test_last_modified_from_contents():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    assert feed.last_modified == datetime.datetime(
+        2020, 1, 1, 11, 30, 15, tzinfo=datetime.timezone.utc
+    )
+
+
+def test_rendered_once():
+    feed_cache = create_feed_cache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return feed_cache.create("<rss/>", 600, LAST_UPDATED)
+    feed = feed_cache.get("show", render)
+    assert feed_cache.get("show", render) is feed
+    assert len(renders) == 1
+
+
+def test_cached_before_call_ends():
+    single_flight = SingleFlight()
+    feed_cache = FeedCache(single_flight, brotli_quality=None)
+    do = single_flight.do
+    found_during_call = []
+
+    def not_rendered_again():
+        raise AssertionError("Rendered twice")
+
+    def checking_do(key, func, on_result=None):
+        def check(result):
+            on_result(result)
+            # Like a request arriving just before the call ends
+            found_during_call.append(feed_cache.get(key, not_rendered_again))
+        return do(key, func, check)
+    single_flight.do = checking_do
+
+    feed = feed_cache.get("show", lambda: feed_cache.create(
+        "<rss/>", 600, LAST_UPDATED
+    ))
+    assert found_during_call == [feed]
+
+
+def respond(feed, headers=None, method="GET"):
+    app = Flask(__name__)
+    with app.test_request_context(method=method, headers=headers):
+        return _prepare_feed_response(feed)
+
+
+def test_response():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    resp = respond(feed, {"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.get_data() == feed.get_body("gzip")
+    assert resp.get_etag() == (feed.get_etag("gzip"), False)
+    assert resp.headers["Last-Modified"] == "Wed, 01 Jan 2020 11:30:15 GMT"
+    assert resp.cache_control.max_age == 600
+    assert "Accept-Encoding" in resp.vary
+
+
+def test_not_modified():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    etag = '"{}"'.format(feed.get_etag())
+    assert respond(feed, {"If-None-Match": etag}).status_code == 304
+    resp = respond(feed, {
+        "If-Modified-Since": "Wed, 01 Jan 2020 11:30:15 GMT",
+    })
+    assert resp.status_code == 304
+
+
+def test_modified():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    other_feed = create_feed_cache().create("<rss></rss>", 600, LAST_UPDATED)
+    etag = '"{}"'.format(other_feed.get_etag())
+    resp = respond(feed, {"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_data() == b"<rss/>"
+    # The entity tag of the uncompressed feed does not match the gzipped one
+    etag = '"{}"'.format(feed.get_etag())
+    resp = respond(feed, {"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+
+
+def test_head():
+    feed = create_feed_cache().create("<rss/>", 600, LAST_UPDATED)
+    resp = respond(feed, method="HEAD")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Length"] == str(len(b"<rss/>"))
@@ -0,0 +1,60 @@
+import datetime
+
+import pytz
+from flask import Flask
+
+from feed_utils.feed_preview import FeedPreview, CONTENT_TYPE
+from feed_utils.show import Show
+from views.web_feed import _respond_with_feed, DEFAULT_FORMAT
+from web_utils.feed_cache import FeedCache
+from web_utils.single_flight import SingleFlight
+
+LAST_UPDATED = datetime.datetime(2020, 1, 1, 12, tzinfo=pytz.utc)
+
+
+def create_feed():
+    show = Show(
+        name="Testshow & venner",
+        id=1,
+        description="Et program om testing",
+        website="http://example.org/testshow",
+        explicit=False,
+    )
+    show.last_updated = LAST_UPDATED
+    return show.rss_str()
+
+
+def test_render():
+    html = FeedPreview().render(create_feed().encode("UTF-8"))
+    assert html.upper().startswith("<!DOCTYPE HTML>")
+    assert html.upper().count("<!DOCTYPE") == 1
+    assert "<title>Testshow &amp; venner fra Radio Revolt</title>" in html
+
+
+def respond(feed_cache, feed, headers):
+    app = Flask(__name__)
+    with app.test_request_context(headers=headers):
+        return _respond_with_feed(feed, ("show",), DEFAULT_FORMAT, feed_cache,
+                                  FeedPreview())
+
+
+def test_preview_for_browsers():
+    feed_cache = FeedCache(SingleFlight(), brotli_quality=None)
+    feed = feed_cache.create(create_feed(), 600, LAST_UPDATED)
+
+    resp = respond(feed_cache, feed, {
+        "Accept": "text/html,application/xhtml+xml,*/*;q=0.8",
+    })
+    assert resp.headers["Content-Type"] == CONTENT_TYPE
+    assert b"Testshow &amp; venner" in resp.get_data()
+    assert resp.last_modified == LAST_UPDATED
+    assert resp.cache_control.max_age == 600
+    assert "Accept" in resp.vary
+    # Rendered once, like the feed
+    preview = feed_cache.get(("show", "preview"), None)
+    assert resp.get_data() == preview.get_body()
+
+    resp = respond(feed_cache, feed, {"Accept": "*/*"})
+    assert resp.headers["Content-Type"] == feed.content_type
+    assert resp.get_data() == feed.get_body()
+    assert "Accept" in resp.vary
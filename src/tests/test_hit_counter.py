@@ -0,0 +1,88 @@
+import os.path
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+
+from web_utils.hit_counter import HitCounter, classify_user_agent
+
+
+@pytest.fixture
+def db_file():
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, "stats.db")
+    shutil.rmtree(directory)
+
+
+def create_hit_counter(db_file, **kwargs):
+    hit_counter = HitCounter(db_file, flush_interval=60, **kwargs)
+    hit_counter.init_db()
+    return hit_counter
+
+
+def test_classify_user_agent():
+    assert classify_user_agent("Spotify/8.5.0 iOS") == "spotify"
+    assert classify_user_agent("AppleCoreMedia/1.0.0") == "apple_podcasts"
+    assert classify_user_agent("Googlebot/2.1") == "bot"
+    assert classify_user_agent("Mozilla/5.0 (X11; Linux x86_64)") == "browser"
+    assert classify_user_agent("curl/7.58.0") == "other"
+    assert classify_user_agent(None) == "other"
+
+
+def test_hits_are_saved_on_flush(db_file):
+    hit_counter = create_hit_counter(db_file)
+    hit_counter.count("episode", "abc", "Spotify/8.5.0")
+    hit_counter.count("episode", "abc", "Spotify/8.5.0")
+    hit_counter.count("episode", "abc", "Mozilla/5.0")
+    hit_counter.count("article", "def")
+    assert hit_counter.get_stats("episode", "abc")["total"] == 0
+
+    hit_counter.flush()
+    stats = hit_counter.get_stats("episode", "abc")
+    assert stats["total"] == 3
+    assert stats["by_user_agent"] == {"spotify": 2, "browser": 1}
+    assert hit_counter.get_totals("article") == {"def": 1}
+    hit_counter.close()
+
+
+def test_hits_are_added_to_saved_hits(db_file):
+    hit_counter = create_hit_counter(db_file, split_by_user_agent=False)
+    hit_counter.count("episode", "abc", "Spotify/8.5.0")
+    hit_counter.flush()
+    hit_counter.count("episode", "abc", "Mozilla/5.0")
+    hit_counter.count("episode", "abc")
+    hit_counter.close()
+
+    stats = hit_counter.get_stats("episode", "abc")
+    assert stats["total"] == 3
+    assert stats["by_user_agent"] == {"all": 3}
+
+
+def test_failed_hits_are_retried(db_file):
+    hit_counter = create_hit_counter(db_file)
+    hit_counter.count("episode", "abc")
+    with sqlite3.connect(db_file) as c:
+        c.execute("ALTER TABLE hits RENAME TO hits_away")
+    hit_counter.flush()
+
+    with sqlite3.connect(db_file) as c:
+        c.execute("ALTER TABLE hits_away RENAME TO hits")
+    hit_counter.count("episode", "abc")
+    hit_counter.close()
+    assert hit_counter.get_stats("episode", "abc")["total"] == 2
+
+
+def test_failed_hits_are_dropped_after_max_retries(db_file):
+    hit_counter = create_hit_counter(db_file, max_retries=2)
+    hit_counter.count("episode", "abc")
+    with sqlite3.connect(db_file) as c:
+        c.execute("ALTER TABLE hits RENAME TO hits_away")
+    for _ in range(3):
+        hit_counter.flush()
+
+    with sqlite3.connect(db_file) as c:
+        c.execute("ALTER TABLE hits_away RENAME TO hits")
+    hit_counter.count("episode", "abc")
+    hit_counter.close()
+    assert hit_counter.get_stats("episode", "abc")["total"] == 1
@@ -0,0 +1,125 @@
+import os
+import os.path
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from web_utils.image_manifest import ImageManifest, ManifestEntry
+
+URL = "http://example.org/logo.jpg"
+
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def create_entry(filename, variants=()):
+    return ManifestEntry(
+        filename=filename,
+        output_hash="output",
+        source_hash="source",
+        etag='"etag"',
+        last_modified=None,
+        variants=variants,
+    )
+
+
+def create_files(directory, *filenames):
+    for filename in filenames:
+        open(os.path.join(directory, filename), "wb").close()
+
+
+def test_entry_without_variants():
+    entry = ManifestEntry("logo-1.png", "output", "source", None, None)
+    assert entry.variants == ()
+
+
+def test_saved_and_loaded(directory):
+    manifest_file = os.path.join(directory, "manifest", "images.json")
+    manifest = ImageManifest(manifest_file)
+    entry = create_entry("logo-1.png", ((300, "webp"),))
+    manifest.record(URL, entry)
+    manifest.save()
+
+    manifest = ImageManifest(manifest_file)
+    assert manifest.get(URL) == entry
+    assert manifest.items() == [(URL, entry)]
+    assert manifest.get("http://example.org/other.jpg") is None
+
+
+def test_broken_file_is_ignored(directory):
+    manifest_file = os.path.join(directory, "images.json")
+    with open(manifest_file, "w") as f:
+        f.write("{")
+
+    assert ImageManifest(manifest_file).items() == []
+
+
+def test_replaced_files_are_kept_for_a_while(directory, clock):
+    manifest = ImageManifest(os.path.join(directory, "images.json"),
+                             keep_replaced_for=3600)
+    create_files(directory, "logo-1.png", "logo-1-300.webp", "logo-2.png")
+    manifest.record(URL, create_entry("logo-1.png", ((300, "webp"),)))
+    manifest.record(URL, create_entry("logo-2.png"))
+
+    clock[0] += 3599
+    assert manifest.prune(directory) == []
+    clock[0] += 1
+    assert sorted(manifest.prune(directory)) == \
+        ["logo-1-300.webp", "logo-1.png"]
+    assert os.listdir(directory) == ["logo-2.png"]
+    # Removed from the list of replaced files
+    clock[0] += 3600
+    assert manifest.prune(directory) == []
+
+
+def test_files_in_use_are_not_pruned(directory, clock):
+    manifest = ImageManifest(os.path.join(directory, "images.json"),
+                             keep_replaced_for=0)
+    other_url = "http://example.org/other.jpg"
+    create_files(directory, "logo-1.png", "logo-2.png")
+    manifest.record(URL, create_entry("logo-1.png"))
+    manifest.record(other_url, create_entry("logo-1.png"))
+    # Still used by other_url
+    manifest.record(URL, create_entry("logo-2.png"))
+    assert manifest.prune(directory) == []
+
+    manifest.record(other_url, create_entry("logo-2.png"))
+    assert manifest.prune(directory) == ["logo-1.png"]
+
+
+def test_file_taken_back_into_use_is_not_pruned(directory, clock):
+    manifest = ImageManifest(os.path.join(directory, "images.json"),
+                             keep_replaced_for=0)
+    create_files(directory, "logo-1.png", "logo-2.png")
+    manifest.record(URL, create_entry("logo-1.png"))
+    manifest.record(URL, create_entry("logo-2.png"))
+    # The original was changed back
+    manifest.record(URL, create_entry("logo-1.png"))
+
+    assert manifest.prune(directory) == ["logo-2.png"]
+    assert os.listdir(directory) == ["logo-1.png"]
+
+
+def test_replaced_files_survive_saving(directory, clock):
+    manifest_file = os.path.join(directory, "images.json")
+    manifest = ImageManifest(manifest_file, keep_replaced_for=0)
+    create_files(directory, "logo-1.png", "logo-2.png")
+    manifest.record(URL, create_entry("logo-1.png"))
+    manifest.record(URL, create_entry("logo-2.png"))
+    manifest.save()
+
+    manifest = ImageManifest(manifest_file, keep_replaced_for=0)
+    assert manifest.prune(directory) == ["logo-1.png"]
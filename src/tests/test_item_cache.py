@@ -0,0 +1,78 @@
+import datetime
+
+import podgen
+import pytz
+
+from feed_utils.episode import Episode
+from feed_utils.item_cache import ItemCache
+from feed_utils.show import Show
+
+
+def create_show():
+    show = Show(
+        name="Testshow",
+        id=1,
+        description="Et program om testing",
+        website="http://example.org/testshow",
+        explicit=False,
+        image="http://example.org/testshow.jpg",
+        authors=[podgen.Person("Radio Revolt", "post@example.org")],
+    )
+    show.image_variants = [("http://example.org/testshow-300.jpg", 300)]
+    show.feed_links = [("next", "http://example.org/testshow/archive/1")]
+    show.is_archive = True
+    for i in range(3):
+        show.episodes.append(Episode(
+            show=show,
+            id="http://example.org/episode/{}".format(i),
+            title="Episode {} & <mer>".format(i),
+            summary="<p>Om episode {}</p>".format(i),
+            long_summary="<p>Mye mer om episode {}</p>".format(i),
+            link="http://example.org/episode/{}".format(i),
+            media=podgen.Media(
+                "http://example.org/episode/{}.mp3".format(i),
+                1000 + i,
+                duration=datetime.timedelta(minutes=30 + i),
+            ),
+            publication_date=datetime.datetime(
+                2020, 1, 1 + i, 12, tzinfo=pytz.utc
+            ),
+            authors=[podgen.Person("Programleder {}".format(i))],
+        ))
+    show.last_updated = datetime.datetime(2020, 1, 5, tzinfo=pytz.utc)
+    return show
+
+
+def render(item_cache, minimize):
+    show = create_show()
+    show.item_cache = item_cache
+    return show.rss_str(minimize=minimize)
+
+
+def test_same_as_podgen():
+    for minimize in (False, True):
+        assert render(ItemCache(), minimize) == render(None, minimize)
+
+
+def test_same_as_podgen_from_cache():
+    item_cache = ItemCache()
+    for minimize in (False, True):
+        render(item_cache, minimize)
+        assert render(item_cache, minimize) == render(None, minimize)
+
+
+def test_changed_episode_rendered_again():
+    item_cache = ItemCache()
+    render(item_cache, False)
+    show = create_show()
+    show.item_cache = item_cache
+    show.episodes[0].title = "Ny tittel"
+    feed = show.rss_str()
+    assert "<title>Ny tittel</title>" in feed
+    assert "Episode 0 &amp;" not in feed
+
+
+def test_least_recently_used_forgotten():
+    item_cache = ItemCache(max_items=2)
+    render(item_cache, False)
+    assert len(item_cache._items) == 2
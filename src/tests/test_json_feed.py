@@ -0,0 +1,95 @@
+import datetime
+import json
+
+import podgen
+import pytz
+
+from feed_utils.episode import Episode
+from feed_utils.json_feed import render_json_feed, JSON_FEED_VERSION
+from feed_utils.show import Show
+
+
+def create_show():
+    show = Show(
+        name="Testshow",
+        id=1,
+        description="Et program om testing",
+        website="http://example.org/testshow",
+        explicit=False,
+        image="http://example.org/testshow.jpg",
+        authors=[podgen.Person("Radio Revolt", "post@example.org")],
+        language="no",
+    )
+    show.feed_url = "http://example.org/testshow.json"
+    show.feed_links = [("next", "http://example.org/testshow/archive/1.json")]
+    show.episodes.append(Episode(
+        show=show,
+        id="http://example.org/episode/1",
+        title="Episode 1 & \"mer\"",
+        subtitle="Kort om episoden",
+        summary="<p>Om episoden</p>",
+        long_summary="<p>Mye mer om episoden</p>",
+        link="http://example.org/episode/1",
+        media=podgen.Media(
+            "http://example.org/episode/1.mp3",
+            1000,
+            duration=datetime.timedelta(minutes=30),
+        ),
+        publication_date=datetime.datetime(2020, 1, 1, 12, tzinfo=pytz.utc),
+        authors=[podgen.Person("Programleder")],
+    ))
+    show.episodes.append(Episode(show=show, title="Uten lyd"))
+    return show
+
+
+def test_json_feed():
+    feed = json.loads(render_json_feed(create_show(),
+                                       "http://hub.example.org/"))
+    items = feed.pop("items")
+    assert feed == {
+        "version": JSON_FEED_VERSION,
+        "title": "Testshow",
+        "home_page_url": "http://example.org/testshow",
+        "feed_url": "http://example.org/testshow.json",
+        "next_url": "http://example.org/testshow/archive/1.json",
+        "description": "Et program om testing",
+        "icon": "http://example.org/testshow.jpg",
+        "authors": [{"name": "Radio Revolt",
+                     "url": "mailto:post@example.org"}],
+        "language": "no",
+        "hubs": [{"type": "WebSub", "url": "http://hub.example.org/"}],
+    }
+    assert items[0] == {
+        "id": "http://example.org/episode/1",
+        "url": "http://example.org/episode/1",
+        "title": "Episode 1 & \"mer\"",
+        "content_html": "<p>Mye mer om episoden</p>",
+        "summary": "Kort om episoden",
+        "date_published": "2020-01-01T12:00:00+00:00",
+        "authors": [{"name": "Programleder"}],
+        "attachments": [{
+            "url": "http://example.org/episode/1.mp3",
+            "mime_type": "audio/mpeg",
+            "size_in_bytes": 1000,
+            "duration_in_seconds": 1800.0,
+        }],
+    }
+
+
+def test_empty_fields_left_out():
+    show = create_show()
+    show.feed_links = []
+    feed = json.loads(render_json_feed(show))
+    assert "next_url" not in feed
+    assert "hubs" not in feed
+    # No ID, link or sound, so only the title is left
+    assert feed["items"][1] == {"title": "Uten lyd"}
+
+
+def test_compact():
+    show = create_show()
+    show.name = "Testshow på norsk"
+    document = render_json_feed(show)
+    assert document == json.dumps(json.loads(document), ensure_ascii=False,
+                                  separators=(",", ":"))
+    assert "Testshow på norsk" in document
@@ -0,0 +1,213 @@
+import io
+import time
+
+import pytest
+import requests
+from PIL import Image, JpegImagePlugin
+
+from web_utils.local_image import LocalImage, ImageIsTooLarge
+
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def small_sizes(monkeypatch):
+    # Keep the images small, so the tests are fast
+    monkeypatch.setattr(LocalImage, "min_image_size", 100)
+    monkeypatch.setattr(LocalImage, "max_image_size", 300)
+
+
+def encode(image, image_format, **options):
+    with io.BytesIO() as image_file:
+        image.save(image_file, image_format, **options)
+        return image_file.getvalue()
+
+
+def process(data):
+    return Image.open(io.BytesIO(LocalImage.process_data(data).data))
+
+
+class FakeResponse:
+    def __init__(self, data, headers=None, chunk_size=100):
+        self.headers = headers or dict()
+        self.chunks = [data[i:i + chunk_size]
+                       for i in range(0, len(data), chunk_size)]
+        self.chunks_read = 0
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.chunks_read += 1
+            yield chunk
+
+
+def record_calls(monkeypatch, cls, name):
+    calls = []
+    method = getattr(cls, name)
+
+    def recording_method(self, *args, **kwargs):
+        calls.append(args)
+        return method(self, *args, **kwargs)
+    monkeypatch.setattr(cls, name, recording_method)
+    return calls
+
+
+def test_large_jpeg_is_decoded_at_reduced_size(monkeypatch):
+    draft_calls = record_calls(monkeypatch, JpegImagePlugin.JpegImageFile,
+                               "draft")
+    data = encode(Image.new("RGB", (1200, 1200), RED), "jpeg")
+
+    image = process(data)
+    assert draft_calls == [("RGB", (290, 290))]
+    assert image.size == (290, 290)
+    assert image.getpixel((145, 145))[0] > 250
+
+
+def test_small_jpeg_is_not_decoded_at_reduced_size(monkeypatch):
+    draft_calls = record_calls(monkeypatch, JpegImagePlugin.JpegImageFile,
+                               "draft")
+    data = encode(Image.new("RGB", (200, 200), RED), "jpeg")
+
+    assert process(data).size == (200, 200)
+    assert draft_calls == []
+
+
+def test_large_reduction_starts_with_box_filter(monkeypatch):
+    resize_calls = record_calls(monkeypatch, Image.Image, "resize")
+    image = Image.new("RGB", (1000, 1000), RED)
+
+    resized = LocalImage._create_resized_image(image, 100, 100)
+    assert resize_calls == [((334, 334), Image.BOX),
+                            ((100, 100), Image.LANCZOS)]
+    assert resized.size == (100, 100)
+    assert resized.getpixel((50, 50)) == RED
+
+
+def test_small_reduction_uses_lanczos_only(monkeypatch):
+    resize_calls = record_calls(monkeypatch, Image.Image, "resize")
+    image = Image.new("RGB", (500, 500), RED)
+
+    LocalImage._create_resized_image(image, 290, 290)
+    assert resize_calls == [((290, 290), Image.LANCZOS)]
+
+
+def test_transparent_parts_are_made_white():
+    original = Image.new("RGBA", (200, 100), (0, 0, 0, 0))
+    original.paste(RED + (255,), (50, 25, 150, 75))
+
+    image = process(encode(original, "png"))
+    assert image.mode == "RGB"
+    assert image.size == (200, 200)
+    assert image.getpixel((0, 0)) == WHITE
+    assert image.getpixel((20, 100)) == WHITE
+    assert image.getpixel((100, 100)) == RED
+
+
+def test_palette_with_transparency_is_made_white():
+    original = Image.new("P", (120, 120), 0)
+    original.putpalette([0, 0, 0] + list(RED) + [0] * 762)
+    original.paste(1, (0, 0, 60, 120))
+
+    image = process(encode(original, "png", transparency=0))
+    assert image.mode == "RGB"
+    assert image.getpixel((30, 60)) == RED
+    assert image.getpixel((90, 60)) == WHITE
+
+
+@pytest.mark.parametrize("mode,color", [
+    ("RGB", RED),
+    ("L", 76),
+    ("P", 1),
+])
+def test_image_without_alpha_is_put_on_white_square(mode, color):
+    original = Image.new(mode, (100, 200), color)
+    if mode == "P":
+        original.putpalette([0, 0, 0] + list(RED) + [0] * 762)
+
+    image = process(encode(original, "png"))
+    assert image.mode == "RGB"
+    assert image.size == (200, 200)
+    assert image.getpixel((0, 100)) == WHITE
+    assert image.getpixel((100, 100)) == original.convert("RGB") \
+        .getpixel((50, 100))
+
+
+def test_variants():
+    data = encode(Image.new("RGBA", (200, 200), RED + (255,)), "png")
+
+    processed = LocalImage.process_data(data, variants=[
+        (100, "png"), (100, "jpeg"), (50, "webp"), (400, "png"),
+    ])
+    # Larger than the full-size image, so left out
+    assert sorted(processed.variants) == [
+        (50, "webp"), (100, "jpeg"), (100, "png"),
+    ]
+    for (size, image_format), variant_data in processed.variants.items():
+        variant = Image.open(io.BytesIO(variant_data))
+        assert variant.format == image_format.upper()
+        assert variant.size == (size, size)
+        assert variant.mode == "RGB"
+
+
+def test_variants_are_scaled_from_the_smallest_larger_image(monkeypatch):
+    resize_calls = record_calls(monkeypatch, Image.Image, "resize")
+    image = Image.new("RGB", (300, 300), RED)
+
+    LocalImage._create_variants(image, [(50, "png"), (200, "jpeg"),
+                                        (200, "png"), (300, "png")])
+    assert [args[0] for args in resize_calls] == [(200, 200), (50, 50)]
+    # The 50 pixel variant is made out of the 200 pixel one, without the
+    # BOX filter which would be used when starting from 300 pixels
+    assert [args[1] for args in resize_calls] == [Image.LANCZOS] * 2
+
+
+def test_variant_filename():
+    assert LocalImage.variant_filename("logo-0123.png", 300, "webp") == \
+        "logo-0123-300.webp"
+    assert LocalImage.variant_filename("logo-0123.png", 600, "jpeg") == \
+        "logo-0123-600.jpg"
+
+
+def test_read_capped():
+    data = encode(Image.new("RGB", (200, 200), RED), "png")
+    response = FakeResponse(data)
+
+    assert LocalImage("http://example.org/logo.png")._read_capped(response) \
+        == data
+
+
+def test_read_capped_trusts_content_length(monkeypatch):
+    monkeypatch.setattr(LocalImage, "max_download_size", 1000)
+    response = FakeResponse(b"x" * 100, {"Content-Length": "1001"})
+
+    with pytest.raises(ImageIsTooLarge):
+        LocalImage("http://example.org/logo.png")._read_capped(response)
+    assert response.chunks_read == 0
+
+
+def test_read_capped_stops_at_the_limit(monkeypatch):
+    monkeypatch.setattr(LocalImage, "max_download_size", 1000)
+    response = FakeResponse(b"x" * 2000)
+
+    with pytest.raises(ImageIsTooLarge):
+        LocalImage("http://example.org/logo.png")._read_capped(response)
+    assert response.chunks_read == 11
+
+
+def test_read_capped_checks_dimensions_early():
+    # Too wide and too low to ever fit
+    data = encode(Image.new("RGB", (400, 10), RED), "png")
+    response = FakeResponse(data + b"\0" * 1000)
+
+    with pytest.raises(ImageIsTooLarge):
+        LocalImage("http://example.org/logo.png")._read_capped(response)
+    assert response.chunks_read == 1
+
+
+def test_read_capped_gives_up_after_deadline():
+    response = FakeResponse(b"x" * 1000)
+
+    with pytest.raises(requests.Timeout):
+        LocalImage("http://example.org/logo.png")._read_capped(
+            response, time.monotonic() - 1
+        )
@@ -0,0 +1,131 @@
+import os
+import os.path
+import shutil
+import tempfile
+
+import pytest
+from flask import Flask
+
+from web_utils.image_manifest import ManifestEntry
+from web_utils.local_image_index import LocalImageIndex
+
+URL = "http://example.org/logo.jpg"
+
+
+class FakeManifest:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def items(self):
+        return list(self.entries.items())
+
+
+@pytest.fixture
+def image_directory():
+    directory = tempfile.mkdtemp()
+    image_directory = os.path.join(directory, "images")
+    os.mkdir(image_directory)
+    yield image_directory
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.test_request_context(base_url="http://podcast.example.org/"):
+        yield app
+
+
+def create_files(directory, *filenames):
+    for filename in filenames:
+        open(os.path.join(directory, filename), "wb").close()
+
+
+def create_index(image_directory, entries=None, feed_variant_format="webp"):
+    return LocalImageIndex(FakeManifest(entries or dict()),
+                           feed_variant_format, image_directory)
+
+
+def test_local_copy_from_manifest(image_directory, app):
+    create_files(image_directory, "logo-0123.png", "logo.png")
+    index = create_index(image_directory, {
+        URL: ManifestEntry("logo-0123.png", "output", "source", None, None),
+    })
+
+    assert index.filename(URL) == "logo-0123.png"
+    assert index.get_image_url(URL) == \
+        "http://podcast.example.org/static/images/logo-0123.png"
+
+
+def test_legacy_local_copy(image_directory, app):
+    create_files(image_directory, "logo med mellomrom.png")
+    index = create_index(image_directory)
+    url = "http://example.org/logo%20med%20mellomrom.jpg"
+
+    assert index.filename(url) == "logo med mellomrom.png"
+    assert index.get_image_url(url) == "http://podcast.example.org/static/" \
+                                       "images/logo%20med%20mellomrom.png"
+
+
+def test_missing_local_copy(image_directory, app):
+    create_files(image_directory, "logo.png")
+    index = create_index(image_directory, {
+        # Recorded, but removed since
+        URL: ManifestEntry("logo-0123.png", "output", "source", None, None),
+    })
+
+    assert index.filename(URL) is None
+    assert index.get_image_url(URL) == URL
+    assert index.get_image_url("http://example.org/other.jpg") == \
+        "http://example.org/other.jpg"
+
+
+def test_missing_image_directory(image_directory, app):
+    index = create_index(os.path.join(image_directory, "missing"))
+    assert index.get_image_url(URL) == URL
+
+
+def test_image_directory_is_listed_once(image_directory, app, monkeypatch):
+    create_files(image_directory, "logo.png")
+    listdir = os.listdir
+    listed = []
+
+    def counting_listdir(path):
+        listed.append(path)
+        return listdir(path)
+    monkeypatch.setattr(os, "listdir", counting_listdir)
+    index = create_index(image_directory)
+
+    for _ in range(2):
+        index.get_image_url(URL)
+        index.get_image_url("http://example.org/other.jpg")
+    assert listed == [image_directory]
+
+
+def test_variant_urls(image_directory, app):
+    create_files(image_directory, "logo-0123.png", "logo-0123-300.webp",
+                 "logo-0123-600.webp", "logo-0123-300.jpg")
+    index = create_index(image_directory, {
+        URL: ManifestEntry(
+            "logo-0123.png", "output", "source", None, None,
+            ((300, "webp"), (300, "jpeg"), (600, "webp"), (1200, "webp")),
+        ),
+    })
+
+    # Only existing variants in the format used in feeds, largest first
+    prefix = "http://podcast.example.org/static/images/"
+    assert index.get_variant_urls(URL) == [
+        (prefix + "logo-0123-600.webp", 600),
+        (prefix + "logo-0123-300.webp", 300),
+    ]
+    assert index.get_variant_urls("http://example.org/other.jpg") == []
+
+
+def test_no_variants_without_local_copy(image_directory, app):
+    create_files(image_directory, "logo-0123-300.webp")
+    index = create_index(image_directory, {
+        URL: ManifestEntry("logo-0123.png", "output", "source", None, None,
+                           ((300, "webp"),)),
+    })
+
+    assert index.get_variant_urls(URL) == []
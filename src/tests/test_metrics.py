@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from utils.metrics import Counter, Histogram, Registry, _Metric
+
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+
+def create_metrics():
+    registry = Registry()
+    counter = Counter("test_requests_total", "Requests.", ("result",),
+                      registry=registry)
+    histogram = Histogram("test_seconds", "Durations.", buckets=(0.1, 1.0),
+                          registry=registry)
+    return registry, counter, histogram
+
+
+def observe_in_child(directory):
+    registry, counter, histogram = create_metrics()
+    registry.share_between_processes(directory, 60)
+    counter.labels("hit").inc(2)
+    counter.labels("miss").inc()
+    histogram.observe(0.5)
+    registry.flush()
+
+
+def test_metrics_must_create_children():
+    class Incomplete(_Metric):
+        type_name = "untyped"
+
+    with pytest.raises(TypeError):
+        Incomplete("test_incomplete", "Incomplete.", registry=Registry())
+
+
+def test_render_without_shared_folder():
+    registry, counter, histogram = create_metrics()
+    counter.labels("hit").inc()
+    histogram.observe(0.05)
+    histogram.observe(2)
+
+    lines = registry.render().splitlines()
+    assert 'test_requests_total{result="hit"} 1.0' in lines
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'test_seconds_count 2' in lines
+    assert not any("worker" in line for line in lines)
+
+
+def test_metrics_are_added_up_across_processes(directory):
+    context = multiprocessing.get_context("spawn")
+    for _ in range(2):
+        process = context.Process(target=observe_in_child,
+                                  args=(directory,))
+        process.start()
+        process.join(30)
+        assert process.exitcode == 0
+
+    registry, counter, histogram = create_metrics()
+    registry.share_between_processes(directory, 60)
+    counter.labels("hit").inc()
+    histogram.observe(0.05)
+
+    lines = registry.render().splitlines()
+    assert 'test_requests_total{result="hit"} 5.0' in lines
+    assert 'test_requests_total{result="miss"} 2.0' in lines
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1.0"} 3' in lines
+    assert 'test_seconds_sum 1.05' in lines
+    assert 'test_seconds_count 3' in lines
+    # One file per process
+    assert len(os.listdir(directory)) == 3
+
+
+def test_clear_removes_earlier_runs(directory):
+    registry, counter, _ = create_metrics()
+    registry.share_between_processes(directory, 60)
+    counter.labels("hit").inc()
+    registry.flush()
+
+    registry, counter, _ = create_metrics()
+    registry.share_between_processes(directory, 60, clear=True)
+    lines = registry.render().splitlines()
+    assert not any(line.startswith("test_requests_total{") for line in lines)
+
+
+def test_forked_process_does_not_count_inherited_values(directory,
+                                                        monkeypatch):
+    registry, counter, histogram = create_metrics()
+    hits = counter.labels("hit")
+    registry.share_between_processes(directory, 60)
+    # Observed before the fork, like the request app.py makes on import
+    hits.inc()
+    histogram.observe(0.5)
+    registry.flush()
+
+    parent_pid = os.getpid()
+    monkeypatch.setattr(os, "getpid", lambda: parent_pid + 1)
+    registry.start_flushing()
+    # The child fetched before the fork still works
+    hits.inc()
+
+    lines = registry.render().splitlines()
+    assert 'test_requests_total{result="hit"} 2.0' in lines
+    assert 'test_seconds_count 1' in lines
+    assert len(os.listdir(directory)) == 2
@@ -0,0 +1,133 @@
+import json
+import os.path
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+
+from web_utils.redirect_map import RedirectMapExporter
+from web_utils.redirector import Redirector
+
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def redirector(directory):
+    redirector = Redirector(
+        os.path.join(directory, "redirector.db"), None, None, None, None
+    )
+    redirector.init_db()
+    return redirector
+
+
+def add_rows(redirector, table, rows):
+    with sqlite3.connect(redirector.db_file) as c:
+        c.executemany(
+            "INSERT INTO {} (original, proxy) VALUES (?, ?)".format(table),
+            rows
+        )
+
+
+def create_exporter(redirector, directory):
+    return RedirectMapExporter(redirector, {
+        "sound": os.path.join(directory, "maps", "sound.map"),
+        "article": os.path.join(directory, "maps", "article.map"),
+    }, os.path.join(directory, "state.json"))
+
+
+def read(path):
+    with open(path, encoding="UTF-8") as f:
+        return f.read()
+
+
+def test_format_entry():
+    assert RedirectMapExporter.format_entry(
+        "id1", "http://example.org/1.mp3"
+    ) == '"id1" "http://example.org/1.mp3";\n'
+    # Non-ASCII characters are percent-encoded
+    assert RedirectMapExporter.format_entry(
+        "id2", "http://example.org/blåbær.mp3"
+    ) == '"id2" "http://example.org/bl%C3%A5b%C3%A6r.mp3";\n'
+    # So are characters which would end the value
+    assert RedirectMapExporter.format_entry(
+        "id3", 'http://example.org/"{ }".mp3'
+    ) == '"id3" "http://example.org/%22%7B%20%7D%22.mp3";\n'
+
+
+@pytest.mark.parametrize("proxy,original", [
+    ("id1", "http://example.org/$uri.mp3"),
+    ("id1", "http://example.org/a;b.mp3"),
+    ("id1", "http://example.org/it's.mp3"),
+    ("id 1", "http://example.org/1.mp3"),
+])
+def test_unsafe_entries_are_left_to_the_application(proxy, original):
+    assert RedirectMapExporter.format_entry(proxy, original) is None
+
+
+def test_only_new_rows_are_exported(redirector, directory):
+    exporter = create_exporter(redirector, directory)
+    add_rows(redirector, "sound", [
+        ("http://example.org/0.mp3", "id0"),
+        ("http://example.org/$1.mp3", "id1"),
+    ])
+
+    assert exporter.export() == {"sound": 1, "article": 0}
+    sound_map = exporter.map_files["sound"]
+    assert read(sound_map) == '"id0" "http://example.org/0.mp3";\n'
+    with open(exporter.state_file) as state_file:
+        assert json.load(state_file) == {"sound": 2, "article": 0}
+
+    mtime = os.path.getmtime(sound_map)
+    assert exporter.export() == {"sound": 0, "article": 0}
+    assert os.path.getmtime(sound_map) == mtime
+
+    add_rows(redirector, "sound", [("http://example.org/2.mp3", "id2")])
+    add_rows(redirector, "article", [("http://example.org/a", "a0")])
+    assert exporter.export() == {"sound": 1, "article": 1}
+    assert read(sound_map) == '"id0" "http://example.org/0.mp3";\n' \
+                              '"id2" "http://example.org/2.mp3";\n'
+    assert read(exporter.map_files["article"]) == \
+        '"a0" "http://example.org/a";\n'
+
+
+def test_full_export_starts_over(redirector, directory):
+    exporter = create_exporter(redirector, directory)
+    add_rows(redirector, "sound", [("http://example.org/0.mp3", "id0")])
+    exporter.export()
+
+    assert exporter.export(full=True) == {"sound": 1, "article": 0}
+    assert read(exporter.map_files["sound"]) == \
+        '"id0" "http://example.org/0.mp3";\n'
+
+
+def test_replaced_database_is_exported_again(redirector, directory):
+    exporter = create_exporter(redirector, directory)
+    with open(exporter.state_file, "w") as state_file:
+        # Further than the database has come
+        json.dump({"sound": 10, "article": 10}, state_file)
+    os.makedirs(os.path.dirname(exporter.map_files["sound"]))
+    with open(exporter.map_files["sound"], "w") as map_file:
+        map_file.write('"old" "http://example.org/old.mp3";\n')
+    add_rows(redirector, "sound", [("http://example.org/0.mp3", "id0")])
+
+    assert exporter.export() == {"sound": 1, "article": 0}
+    assert read(exporter.map_files["sound"]) == \
+        '"id0" "http://example.org/0.mp3";\n'
+
+
+def test_broken_state_file_exports_everything(redirector, directory):
+    exporter = create_exporter(redirector, directory)
+    add_rows(redirector, "sound", [("http://example.org/0.mp3", "id0")])
+    exporter.export()
+    with open(exporter.state_file, "w") as state_file:
+        state_file.write("{")
+
+    assert exporter.export() == {"sound": 1, "article": 0}
+    assert read(exporter.map_files["sound"]) == \
+        '"id0" "http://example.org/0.mp3";\n'
@@ -0,0 +1,78 @@
+import os.path
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+
+from web_utils.redirector import Redirector
+
+OLD_URL = "http://example.org/old.mp3"
+NEW_URL = "http://example.org/new.mp3"
+
+
+@pytest.fixture
+def redirector():
+    directory = tempfile.mkdtemp()
+    redirector = Redirector(os.path.join(directory, "redirector.db"),
+                            None, None, None, None, flush_interval=60)
+    redirector.init_db()
+    with sqlite3.connect(redirector.db_file) as c:
+        c.execute("INSERT INTO sound (original, proxy) VALUES (?, ?)",
+                  (OLD_URL, "old"))
+    yield redirector
+    redirector.close()
+    shutil.rmtree(directory)
+
+
+def test_tables_are_loaded_in_the_background(redirector):
+    assert not redirector.tables.is_loaded
+    # Found in the database while the tables are loading
+    assert redirector.get_proxy("sound", OLD_URL) == "old"
+    redirector.tables._thread.join(5)
+    assert redirector.tables.is_loaded
+    assert redirector.get_cached_original("sound", "old") == OLD_URL
+
+
+def test_proxy_is_looked_up_in_loaded_tables(redirector):
+    redirector.tables.update(redirector)
+    assert redirector.get_proxy("sound", OLD_URL) == "old"
+    assert redirector.get_cached_original("sound", "old") == OLD_URL
+
+
+def test_new_proxy_is_saved_on_flush(redirector):
+    redirector.tables.update(redirector)
+    proxy = redirector.get_proxy("sound", NEW_URL)
+    assert proxy == redirector.get_proxy("sound", NEW_URL)
+    assert redirector.get_cached_original("sound", proxy) == NEW_URL
+    # Not saved yet, but this process can still redirect it
+    assert proxy not in redirector.get_all_sound()
+    assert redirector.get_original_sound(proxy) == NEW_URL
+
+    redirector.flush()
+    assert redirector.get_all_sound() == {"old": OLD_URL, proxy: NEW_URL}
+
+
+def test_tables_are_kept_between_generations(redirector):
+    redirector.tables.update(redirector)
+    next_redirector = Redirector(redirector.db_file, None, None, None, None,
+                                 flush_interval=60, tables=redirector.tables)
+    # Saved by another process
+    with sqlite3.connect(redirector.db_file) as c:
+        c.execute("INSERT INTO sound (original, proxy) VALUES (?, ?)",
+                  (NEW_URL, "new"))
+    assert next_redirector.get_cached_original("sound", "new") is None
+
+    # Only the new row is read
+    rows_read = []
+    iter_all = next_redirector.iter_all
+
+    def counting_iter_all(table, after=0, *args, **kwargs):
+        for row in iter_all(table, after, *args, **kwargs):
+            rows_read.append(row)
+            yield row
+    next_redirector.iter_all = counting_iter_all
+    next_redirector.tables.update(next_redirector)
+    assert [proxy for _, proxy, _ in rows_read] == ["new"]
+    assert next_redirector.get_cached_original("sound", "new") == NEW_URL
+    next_redirector.close()
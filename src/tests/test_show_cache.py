@@ -0,0 +1,96 @@
+import copy
+import threading
+
+import podgen
+
+from feed_utils.show import Show
+from feed_utils.show_cache import ShowCache
+from show_processors import ShowProcessor
+
+
+class FakeShowSource:
+    def get_show(self, digas_id):
+        return Show(name="Show {}".format(digas_id), id=digas_id)
+
+
+class CountingProcessor(ShowProcessor):
+    def __init__(self, started=None, release=None):
+        super().__init__(dict(), set(), None, None)
+        self.started = started
+        self.release = release
+        self.populated = []
+
+    def accepts(self, show) -> bool:
+        return True
+
+    def populate(self, show) -> None:
+        self.populated.append(show.id)
+        if self.started is not None and show.id == 1:
+            self.started.set()
+            self.release.wait(5)
+        show.authors.append(podgen.Person("Radio Revolt"))
+        show.image_variants = [("http://example.org/show-300.jpg", 300)]
+
+
+def test_copy_does_not_share_lists():
+    show = Show(name="Show", id=1)
+    show.feed_links = [("next", "http://example.org/show/archive/1")]
+    clone = copy.copy(show)
+    clone.episodes.append("episode")
+    clone.authors.append(podgen.Person("Radio Revolt"))
+    clone.feed_links.append(("prev", "http://example.org/show"))
+
+    assert show.episodes == []
+    assert show.authors == []
+    assert show.feed_links == [("next", "http://example.org/show/archive/1")]
+
+
+def test_shows_are_populated_once():
+    processor = CountingProcessor()
+    show_cache = ShowCache(FakeShowSource(), {"default": [processor]})
+
+    first = show_cache.get_show(1, "default", "http://example.org/")
+    first.authors.append(podgen.Person("Someone else"))
+    first.image_variants.append(("http://example.org/show-600.jpg", 600))
+    second = show_cache.get_show(1, "default", "http://example.org/")
+
+    assert processor.populated == [1]
+    assert len(second.authors) == 1
+    assert second.image_variants == [("http://example.org/show-300.jpg", 300)]
+
+
+def test_shows_are_not_cached_without_host_url():
+    processor = CountingProcessor()
+    show_cache = ShowCache(FakeShowSource(), {"default": [processor]})
+
+    show_cache.get_show(1, "default", None)
+    show_cache.get_show(1, "default", None)
+
+    assert processor.populated == [1, 1]
+
+
+def test_slow_show_does_not_hold_up_other_shows():
+    started = threading.Event()
+    release = threading.Event()
+    processor = CountingProcessor(started, release)
+    show_cache = ShowCache(FakeShowSource(), {"default": [processor]})
+    results = []
+
+    def get_slow_show():
+        results.append(show_cache.get_show(1, "default",
+                                           "http://example.org/"))
+
+    threads = [threading.Thread(target=get_slow_show) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        assert started.wait(5)
+        other_show = show_cache.get_show(2, "default", "http://example.org/")
+        assert other_show.id == 2
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+    assert len(results) == 3
+    assert sorted(processor.populated) == [1, 2]
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from web_utils.single_flight import SingleFlight
+
+
+def start(func, *args):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func(*args)))
+    thread.start()
+    return thread, results
+
+
+def blocking_func(result):
+    """Function which signals when it has started, and returns result once
+    released."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        assert release.wait(5)
+        return result
+    return func, started, release
+
+
+def test_threads_share_result():
+    single_flight = SingleFlight()
+    func, started, release = blocking_func("first")
+    leader, leader_results = start(single_flight.do, "key", func)
+    assert started.wait(5)
+    waiter, waiter_results = start(single_flight.do, "key", lambda: "second")
+    time.sleep(0.1)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert leader_results == ["first"]
+    assert waiter_results == ["first"]
+    # Nothing is kept once the computation is done
+    assert single_flight.do("key", lambda: "third") == "third"
+
+
+def test_exception_shared():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        assert release.wait(5)
+        raise ValueError("Could not render")
+    leader = threading.Thread(
+        target=lambda: pytest.raises(ValueError, single_flight.do, "key", func)
+    )
+    leader.start()
+    assert started.wait(5)
+    errors = []
+
+    def wait():
+        try:
+            single_flight.do("key", lambda: "second")
+        except ValueError as e:
+            errors.append(e)
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert len(errors) == 1
+
+
+def test_result_handled_before_call_ends():
+    single_flight = SingleFlight()
+    in_flight = []
+
+    def on_result(result):
+        in_flight.append(("feed" in single_flight._calls, result))
+    assert single_flight.do("feed", lambda: 42, on_result) == 42
+    assert in_flight == [(True, 42)]
+    assert "feed" not in single_flight._calls
+
+
+def test_processes_share_result(tmpdir):
+    # Each instance has its own lock files open, just like separate processes
+    leader = SingleFlight(str(tmpdir), 10)
+    waiters = [SingleFlight(str(tmpdir), 10) for _ in range(3)]
+    func, started, release = blocking_func("first")
+    leader_thread, leader_results = start(leader.do, "key", func)
+    assert started.wait(5)
+    waiter_threads = [start(waiter.do, "key", lambda: "second")
+                      for waiter in waiters]
+    time.sleep(0.2)
+    release.set()
+    leader_thread.join()
+    for thread, results in waiter_threads:
+        thread.join()
+        assert results == ["first"]
+    assert leader_results == ["first"]
+    # The last process to read the result removed it
+    assert not [name for name in os.listdir(str(tmpdir))
+                if name.endswith(".result")]
+
+
+def test_generations_not_shared(tmpdir):
+    leader = SingleFlight(str(tmpdir), 10)
+    waiter = SingleFlight(str(tmpdir), 11)
+    func, started, release = blocking_func("first")
+    leader_thread, _ = start(leader.do, "key", func)
+    assert started.wait(5)
+    try:
+        # Does not wait for the other generation
+        assert waiter.do("key", lambda: "second") == "second"
+    finally:
+        release.set()
+        leader_thread.join()
+
+
+def test_result_not_kept_without_waiters(tmpdir):
+    first = SingleFlight(str(tmpdir), 10)
+    second = SingleFlight(str(tmpdir), 10)
+    assert first.do("key", lambda: "first") == "first"
+    assert not [name for name in os.listdir(str(tmpdir))
+                if name.endswith(".result")]
+    assert second.do("key", lambda: "second") == "second"
+
+
+def test_stale_result_not_used(tmpdir):
+    first = SingleFlight(str(tmpdir), 10)
+    second = SingleFlight(str(tmpdir), 10)
+    # Like a result left behind by a process which died while waiting
+    result_path = os.path.join(str(tmpdir), "10-{}.result".format(
+        hashlib.md5(repr("key").encode("UTF-8")).hexdigest()
+    ))
+    first._write_result(result_path, "first")
+    os.utime(result_path, (0, 0))
+    assert second.do("key", lambda: "second") == "second"
+
+
+def test_old_generations_removed(tmpdir):
+    file_names = [
+        "8-abc.lock", "8-abc.waiting", "8-abc.result", "8-def.tmp",
+        "9-abc.lock", "9-abc.result",
+        "10-abc.lock",
+        "abc.lock",
+        "README",
+    ]
+    for file_name in file_names:
+        tmpdir.join(file_name).write("")
+    SingleFlight(str(tmpdir), 10)
+    assert sorted(os.listdir(str(tmpdir))) == \
+        ["10-abc.lock", "9-abc.lock", "9-abc.result", "README"]
@@ -0,0 +1,148 @@
+import gzip
+import os.path
+
+from flask import Flask, request, make_response
+
+from web_utils.static_feeds import StaticFeedExporter, feed_path, \
+    feed_redirects
+
+
+def create_client(feeds: dict):
+    """Client for an application serving the given feeds, with the path as
+    key and the body as value."""
+    app = Flask(__name__)
+
+    @app.route("/<path:path>")
+    def serve(path):
+        body = feeds.get("/" + path)
+        if body is None:
+            return "Not found", 404
+        if request.accept_mimetypes.best == "text/html":
+            body = "<html>{}</html>".format(body)
+        body = body.encode("UTF-8")
+        coding = None
+        if "gzip" in request.accept_encodings:
+            body = gzip.compress(body, mtime=0)
+            coding = "gzip"
+        resp = make_response(body)
+        if coding:
+            resp.headers["Content-Encoding"] = coding
+        return resp
+    return app.test_client()
+
+
+def create_exporter(tmpdir, feeds):
+    return StaticFeedExporter(
+        create_client(feeds),
+        "http://example.org/",
+        str(tmpdir.join("feeds")),
+        str(tmpdir.join("nginx", "feed_redirects.map")),
+    )
+
+
+def test_feed_path():
+    assert feed_path("show") == "/show"
+    assert feed_path("show", "spotify") == "/spotify/show"
+    assert feed_path("show", "spotify", 2) == "/spotify/show/archive/2"
+    assert feed_path("show", None, 1) == "/show/archive/1"
+
+
+def test_feed_redirects():
+    slugs = {"show": "show", "old_show": "show", "other": "other"}
+    redirects = feed_redirects(slugs, ["alle"], [None, "spotify"])
+    assert redirects == {
+        "/old_show": "/show",
+        "/spotify/old_show": "/spotify/show",
+        "/alle": "/all",
+        "/spotify/alle": "/all",
+    }
+
+
+def test_export_redirects(tmpdir):
+    exporter = create_exporter(tmpdir, {})
+    redirects = {
+        "/old_show": "/show",
+        "/spotify/old_show": "/spotify/show",
+        '/bad"name': "/show",
+    }
+    assert exporter.export_redirects(redirects)
+    with open(exporter.redirects_file, encoding="UTF-8") as map_file:
+        assert map_file.read() == (
+            '"/old_show" "/show";\n'
+            '"/spotify/old_show" "/spotify/show";\n'
+        )
+    # Nothing to reload when the redirects are unchanged
+    assert not exporter.export_redirects(redirects)
+    redirects["/older_show"] = "/show"
+    assert exporter.export_redirects(redirects)
+
+
+def test_export_feed(tmpdir):
+    exporter = create_exporter(tmpdir, {"/show": "<rss/>"})
+    assert exporter.export_feed("/show")
+    assert not exporter.export_feed("/missing")
+    feed_directory = os.path.join(exporter.directory, "show")
+    with open(os.path.join(feed_directory, "feed.xml"), "rb") as feed_file:
+        assert feed_file.read() == b"<rss/>"
+    with open(os.path.join(feed_directory, "feed.html"), "rb") as feed_file:
+        assert feed_file.read() == b"<html><rss/></html>"
+    with gzip.open(os.path.join(feed_directory, "feed.xml.gz")) as feed_file:
+        assert feed_file.read() == b"<rss/>"
+    # Not written, since the application did not use Brotli
+    assert not os.path.exists(os.path.join(feed_directory, "feed.xml.br"))
+    assert exporter.num_exported == 1
+    assert exporter.num_changed == 4
+
+
+def test_unchanged_feeds_not_written(tmpdir):
+    feeds = {"/show": "<rss/>"}
+    create_exporter(tmpdir, feeds).export_feed("/show")
+    feed_file = os.path.join(str(tmpdir), "feeds", "show", "feed.xml")
+    os.utime(feed_file, (0, 0))
+
+    exporter = create_exporter(tmpdir, feeds)
+    exporter.export_feed("/show")
+    assert exporter.num_changed == 0
+    assert os.path.getmtime(feed_file) == 0
+
+    feeds["/show"] = "<rss></rss>"
+    exporter = create_exporter(tmpdir, feeds)
+    exporter.export_feed("/show")
+    assert exporter.num_changed == 4
+    assert os.path.getmtime(feed_file) != 0
+
+
+def test_export_show_with_archive_pages(tmpdir):
+    feeds = {
+        "/show": "<rss/>",
+        "/show/archive/1": "<rss>1</rss>",
+        "/show/archive/2": "<rss>2</rss>",
+    }
+    exporter = create_exporter(tmpdir, feeds)
+    exporter.export_show("show", paged=True)
+    assert exporter.num_exported == 3
+    exporter.export_show("show", "spotify", paged=True)
+    assert exporter.num_exported == 3
+
+
+def test_prune(tmpdir):
+    feeds = {"/show": "<rss/>", "/old_show": "<rss/>"}
+    create_exporter(tmpdir, feeds).export_feed("/show")
+    create_exporter(tmpdir, feeds).export_feed("/old_show")
+
+    exporter = create_exporter(tmpdir, feeds)
+    exporter.export_feed("/show")
+    assert exporter.prune() == 4
+    assert os.listdir(exporter.directory) == ["show"]
+
+
+def test_failed_feed_kept(tmpdir):
+    exporter = create_exporter(tmpdir, {"/show": "<rss/>"})
+    exporter.export_feed("/show")
+
+    exporter = create_exporter(tmpdir, {"/show": "<rss/>"})
+    exporter.client.application.view_functions["serve"] = \
+        lambda path: ("Error", 500)
+    assert exporter.export_feed("/show")
+    assert exporter.failed == ["/show"]
+    assert exporter.prune() == 0
@@ -0,0 +1,85 @@
+import json
+import os.path
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+from flask import Flask
+
+from views.web_api import register_api_routes
+from web_utils.redirector import Redirector
+
+
+class CountingRedirector(Redirector):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_queries = 0
+
+    def iter_all(self, *args, **kwargs):
+        self.num_queries += 1
+        return super().iter_all(*args, **kwargs)
+
+
+@pytest.fixture
+def redirector():
+    directory = tempfile.mkdtemp()
+    redirector = CountingRedirector(
+        os.path.join(directory, "redirector.db"), None, None, None, None
+    )
+    redirector.init_db()
+    with sqlite3.connect(redirector.db_file) as c:
+        c.executemany(
+            "INSERT INTO sound (original, proxy) VALUES (?, ?)",
+            [("http://example.org/{}.mp3".format(i), "id{}".format(i))
+             for i in range(5)]
+        )
+    yield redirector
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def client(redirector):
+    app = Flask(__name__)
+    register_api_routes(app, {"web": {"api_page_size": 2}}, {
+        "redirector": redirector,
+    }.get)
+    return app.test_client()
+
+
+def get_json(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return json.loads(response.get_data(as_text=True))
+
+
+def test_pages_link_to_the_next_page(client, redirector):
+    page = get_json(client, "/api/id/episode/")
+    assert page["items"] == {
+        "id0": "http://example.org/0.mp3",
+        "id1": "http://example.org/1.mp3",
+    }
+    assert page["last"] == 2
+    assert page["next"] == "http://localhost/api/id/episode/after/2"
+    assert redirector.num_queries == 1
+
+    page = get_json(client, "/api/id/episode/after/4")
+    assert page["items"] == {"id4": "http://example.org/4.mp3"}
+    assert page["last"] == 5
+    assert page["next"] is None
+
+
+def test_page_after_the_last(client):
+    page = get_json(client, "/api/id/episode/after/5")
+    assert page == {"items": {}, "last": None, "next": None}
+
+
+def test_unchanged_page_is_not_sent_again(client):
+    etag = client.get("/api/id/episode/").headers["ETag"]
+    response = client.get("/api/id/episode/",
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_unknown_kind(client):
+    assert client.get("/api/id/something/").status_code == 404
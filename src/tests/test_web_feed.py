@@ -0,0 +1,83 @@
+import datetime
+
+import pytz
+from flask import Flask
+
+from feed_utils.episode import Episode
+from feed_utils.item_cache import ItemCache
+from feed_utils.show import Show
+from utils.settings_loader import load_settings
+from views.web_feed import _last_updated, NO_EPISODES_LAST_UPDATED, \
+    _cached_host_url, _render_show_feed, register_feed_routes, JSON_FORMAT, \
+    DEFAULT_FORMAT
+
+HUB_URL = "https://hub.example.org/"
+
+
+def create_show(*publication_dates):
+    show = Show(name="Testshow", id=1)
+    for i, publication_date in enumerate(publication_dates):
+        show.episodes.append(Episode(
+            show=show,
+            title="Episode {}".format(i),
+            publication_date=publication_date,
+        ))
+    return show
+
+
+def test_last_updated_from_newest_episode():
+    newest = datetime.datetime(2020, 3, 1, tzinfo=pytz.utc)
+    show = create_show(
+        datetime.datetime(2020, 1, 1, tzinfo=pytz.utc),
+        newest,
+        datetime.datetime(2020, 2, 1, tzinfo=pytz.utc),
+    )
+    assert _last_updated(show) == newest
+
+
+def test_last_updated_without_episodes():
+    assert _last_updated(create_show()) == NO_EPISODES_LAST_UPDATED
+    show = create_show()
+    show.publication_date = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+    assert _last_updated(show) == show.publication_date
+
+
+def test_only_base_url_cached():
+    app = Flask(__name__)
+    base_url = "https://podkast.radiorevolt.no/"
+    with app.test_request_context(base_url=base_url):
+        assert _cached_host_url(base_url) == base_url
+    with app.test_request_context(base_url="https://example.org/"):
+        assert _cached_host_url(base_url) is None
+
+
+class FakeShowCache:
+    def get_show(self, digas_id, pipeline, host_url):
+        return Show(name="Testshow", id=digas_id,
+                    description="Et program om testing",
+                    website="http://example.org/testshow", explicit=False)
+
+
+class FakeEpisodeSource:
+    def episode_page(self, show, page_size, page):
+        publication_date = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+        return [Episode(show=show, title="Episode",
+                        publication_date=publication_date)], 1
+
+
+def render_show_feed(page, feed_format):
+    app = Flask(__name__)
+    register_feed_routes(app, load_settings(), {}.get)
+    with app.test_request_context(base_url="http://example.org/"):
+        feed, _, _ = _render_show_feed(
+            1, "web", "web", 960, 10.0, 2592000, None, 20, page, "testshow",
+            None, "http://example.org/", FakeShowCache(), FakeEpisodeSource(),
+            {"episode": {"web": []}}, ItemCache(), HUB_URL, feed_format
+        )
+    return feed
+
+
+def test_hub_only_advertised_by_current_feed():
+    for feed_format in (DEFAULT_FORMAT, JSON_FORMAT):
+        assert HUB_URL in render_show_feed(None, feed_format)
+        assert HUB_URL not in render_show_feed(1, feed_format)
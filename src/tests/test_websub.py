@@ -0,0 +1,140 @@
+import os.path
+import shutil
+import tempfile
+import threading
+
+import pytest
+import requests
+
+from web_utils.websub import WebSubPublisher, content_digest
+
+HUB_URL = "http://hub.example.org/"
+BASE_URL = "http://example.org/"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class FakeSession:
+    def __init__(self):
+        self.status_code = 204
+        self.published = []
+
+    def post(self, url, data, timeout):
+        assert url == HUB_URL
+        self.published.append(data["hub.url"])
+        return FakeResponse(self.status_code)
+
+
+@pytest.fixture
+def db_file():
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, "websub.db")
+    shutil.rmtree(directory)
+
+
+def create_publisher(db_file, session):
+    publisher = WebSubPublisher(db_file, HUB_URL, BASE_URL, session)
+    publisher.init_db()
+    # Pretend the background thread is running, so the queue is only handled
+    # when the test calls flush
+    publisher._thread = threading.current_thread()
+    return publisher
+
+
+def feed(title, last_build_date="Mon, 06 Jan 2020 12:00:00 +0000"):
+    return "<rss><channel><title>{}</title><lastBuildDate>{}" \
+           "</lastBuildDate></channel></rss>".format(title, last_build_date) \
+        .encode("UTF-8")
+
+
+def test_content_digest_ignores_last_build_date():
+    assert content_digest(feed("A")) == \
+        content_digest(feed("A", "Tue, 07 Jan 2020 12:00:00 +0000"))
+    assert content_digest(feed("A")) != content_digest(feed("B"))
+
+
+def test_hub_is_notified_about_changes(db_file):
+    session = FakeSession()
+    publisher = create_publisher(db_file, session)
+    topic = BASE_URL + "show"
+
+    assert publisher.feed_rendered(topic, feed("A"))
+    publisher.flush()
+    # Queued once only, and not announced again after a new lastBuildDate
+    assert not publisher.feed_rendered(
+        topic, feed("A", "Tue, 07 Jan 2020 12:00:00 +0000")
+    )
+    assert publisher.feed_rendered(topic, feed("B"))
+    assert not publisher.feed_rendered(topic, feed("B"))
+    publisher.flush()
+    assert session.published == [topic, topic]
+
+
+def test_rendering_does_not_use_the_database(db_file):
+    session = FakeSession()
+    publisher = create_publisher(db_file, session)
+    publisher.db_file = os.path.join(db_file, "missing", "websub.db")
+    topic = BASE_URL + "show"
+
+    assert publisher.feed_rendered(topic, feed("A"))
+    # The database is only used in flush, which logs the error
+    publisher.flush()
+    assert session.published == []
+    # So the feed is queued again by the next rendering
+    assert publisher.feed_rendered(topic, feed("A"))
+
+
+def test_changes_are_shared_between_publishers(db_file):
+    session = FakeSession()
+    publisher = create_publisher(db_file, session)
+    other_publisher = create_publisher(db_file, session)
+    topic = BASE_URL + "show"
+
+    assert publisher.feed_rendered(topic, feed("A"))
+    publisher.flush()
+    assert other_publisher.feed_rendered(topic, feed("A"))
+    other_publisher.flush()
+    assert session.published == [topic]
+
+
+def test_other_hosts_are_not_announced(db_file):
+    session = FakeSession()
+    publisher = create_publisher(db_file, session)
+
+    assert not publisher.feed_rendered("http://localhost/show", feed("A"))
+    publisher.flush()
+    assert session.published == []
+
+
+def test_failed_notification_is_tried_again(db_file):
+    session = FakeSession()
+    session.status_code = 503
+    publisher = create_publisher(db_file, session)
+    topic = BASE_URL + "show"
+
+    assert publisher.feed_rendered(topic, feed("A"))
+    publisher.flush()
+    session.status_code = 204
+    assert publisher.feed_rendered(topic, feed("A"))
+    publisher.flush()
+    assert session.published == [topic, topic]
+
+
+def test_queued_feeds_are_announced_on_close(db_file):
+    session = FakeSession()
+    publisher = WebSubPublisher(db_file, HUB_URL, BASE_URL, session)
+    publisher.init_db()
+    topic = BASE_URL + "show"
+
+    assert publisher.feed_rendered(topic, feed("A"))
+    publisher.close()
+    assert session.published == [topic]
+    # Left to the publisher of the next generation
+    assert not publisher.feed_rendered(topic, feed("B"))
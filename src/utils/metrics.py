@@ -0,0 +1,434 @@
+"""
+Minimal instrumentation which can be exposed in the Prometheus text format.
+
+Metrics are defined at the bottom of this module, and are used the same way
+loggers are: the module doing the work imports the metric and records its
+observations, while views.metrics exposes everything recorded so far.
+
+Each worker process records its own observations. When the registry is shared
+between processes (see Registry.share_between_processes), every process saves
+its metrics to a file in a shared folder, and the worker which answers the
+scrape adds up the files from all of them.
+"""
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import uuid
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from time import perf_counter, sleep
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "CONTENT_TYPE",
+    "PROCESSOR_SECONDS",
+    "UPSTREAM_FETCH_SECONDS",
+    "REFRESH_SECONDS",
+    "FEED_RENDER_SECONDS",
+    "CACHE_REQUESTS",
+]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text format."""
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+"""Default upper bounds (in seconds) of histogram buckets."""
+
+
+class Registry:
+    """Collection of metrics which are exposed together."""
+    def __init__(self):
+        self.directory = None
+        """Folder the processes save their metrics in, or None when the
+        metrics are not shared between processes."""
+        self.flush_interval = None
+        """Seconds between each time the metrics are saved."""
+        self._metrics = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        """PID of the process which the flushing thread was started in."""
+        self._file = None
+        """File this process saves its metrics in."""
+
+    def register(self, metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def share_between_processes(self, directory: str, flush_interval: float,
+                                clear: bool=False) -> None:
+        """Add up the metrics of all processes which use the same folder.
+
+        Call this before the worker processes are forked. Every process saves
+        its metrics to its own file in directory every flush_interval
+        seconds, and once more when it answers a scrape, which includes the
+        files of all processes. Files of processes which have stopped are
+        kept, so the totals never decrease.
+
+        This process starts saving its metrics right away, so observations
+        made before the fork are only counted in its file. Forked processes
+        start counting from zero, see start_flushing.
+
+        Args:
+            directory: Folder to save the metrics in. Created if it does not
+                exist.
+            flush_interval: Seconds between each time the metrics are saved.
+            clear: Set to True to remove the files from earlier runs of the
+                application, so counting starts anew.
+        """
+        os.makedirs(directory, exist_ok=True)
+        if clear:
+            for path in glob.glob(os.path.join(directory, "*.json")):
+                os.remove(path)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.start_flushing()
+
+    def start_flushing(self) -> None:
+        """Start saving the metrics of this process in the background, if
+        that has not been done already.
+
+        Threads do not survive a fork, so this must be called in each worker
+        process, like at the start of each request. It is cheap when the
+        thread is running already.
+
+        A forked process inherits the values of the process it was forked
+        from, which that process saves in its own file. They are set to zero
+        the first time this is called in the forked process, so they are not
+        counted twice.
+        """
+        if self.directory is None or self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Forked. Other threads of the parent may have held the locks when
+            # it forked, so do not use them
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            for metric in self._metrics:
+                metric.reset_after_fork()
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._file = os.path.join(self.directory, "{}-{}.json".format(
+                self._pid, uuid.uuid4().hex
+            ))
+            threading.Thread(
+                target=self._run,
+                name="MetricsFlusher",
+                daemon=True,
+            ).start()
+
+    def flush(self) -> None:
+        """Save the metrics of this process to its file in the shared
+        folder."""
+        self.start_flushing()
+        with self._lock:
+            metrics = list(self._metrics)
+            path = self._file
+        snapshot = {metric.name: metric.snapshot() for metric in metrics}
+        with self._flush_lock:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".",
+                                             suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as temp_file:
+                    json.dump(snapshot, temp_file)
+                os.replace(temp_path, path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+
+    def render(self) -> str:
+        """Create text with all metrics, in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        if self.directory is None:
+            for metric in metrics:
+                lines.extend(metric.render())
+        else:
+            self.flush()
+            snapshots = self._read_snapshots()
+            for metric in metrics:
+                lines.extend(metric.render(snapshots.get(metric.name, [])))
+        return "\n".join(lines) + "\n"
+
+    def _run(self):
+        while True:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Could not save the metrics")
+
+    def _read_snapshots(self) -> dict:
+        # Metric name as key, list with one snapshot per process as value
+        snapshots = dict()
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                logger.exception("Could not read the metrics in %s", path)
+                continue
+            for name, metric_snapshot in snapshot.items():
+                snapshots.setdefault(name, []).append(metric_snapshot)
+        return snapshots
+
+
+REGISTRY = Registry()
+"""The registry used by default, exposed at /metrics."""
+
+
+class _Metric(metaclass=ABCMeta):
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, label_names=(),
+                 registry: Registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = dict()
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *label_values):
+        """Get the child metric with the given label values, in the same order
+        as label_names.
+
+        Fetch the child once and reuse it in tight loops, to save the lookup.
+        """
+        try:
+            return self._children[label_values]
+        except KeyError:
+            if len(label_values) != len(self.label_names):
+                raise ValueError("{} expects labels {!r}, got {!r}"
+                                 .format(self.name, self.label_names,
+                                         label_values))
+            with self._lock:
+                return self._children.setdefault(
+                    label_values,
+                    self._create_child()
+                )
+
+    @abstractmethod
+    def _create_child(self):
+        """Create the object which records observations for one combination
+        of label values."""
+
+    def reset_after_fork(self) -> None:
+        """Set all values to zero, in a process which has just been forked.
+
+        The children are kept, since callers may have fetched them already.
+        """
+        self._lock = threading.Lock()
+        for child in self._children.values():
+            child.reset_after_fork()
+
+    def snapshot(self) -> list:
+        """Get the values recorded so far, in a form which can be saved as
+        JSON and added up with the values of other processes."""
+        with self._lock:
+            children = list(self._children.items())
+        return [[list(label_values), child.snapshot()]
+                for label_values, child in children]
+
+    def render(self, snapshots=None) -> list:
+        """Create the lines which represent this metric in the Prometheus text
+        format.
+
+        Args:
+            snapshots: Snapshots (see snapshot) to add up and render, or None
+                to render the values recorded by this process.
+        """
+        lines = [
+            "# HELP {} {}".format(self.name, _escape(self.documentation)),
+            "# TYPE {} {}".format(self.name, self.type_name),
+        ]
+        if snapshots is None:
+            with self._lock:
+                children = list(self._children.items())
+        else:
+            totals = dict()
+            for snapshot in snapshots:
+                for label_values, value in snapshot:
+                    label_values = tuple(label_values)
+                    if label_values not in totals:
+                        totals[label_values] = self._create_child()
+                    totals[label_values].add(value)
+            children = list(totals.items())
+        for label_values, child in sorted(children):
+            labels = tuple(zip(self.label_names, label_values))
+            lines.extend(child.render(self.name, labels))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float=1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return self._value
+
+    def add(self, snapshot) -> None:
+        self.inc(snapshot)
+
+    def render(self, name, labels):
+        return ["{}{} {}".format(name, _format_labels(labels),
+                                 _format_value(self._value))]
+
+
+class Counter(_Metric):
+    """Metric which counts how many times something has happened."""
+    type_name = "counter"
+
+    def _create_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float=1.0) -> None:
+        """Increase the counter without labels."""
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * len(upper_bounds)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {"counts": list(self._counts), "sum": self._sum}
+
+    def add(self, snapshot) -> None:
+        with self._lock:
+            for i, count in enumerate(snapshot["counts"]):
+                self._counts[i] += count
+            self._sum += snapshot["sum"]
+
+    @contextmanager
+    def time(self):
+        """Observe the number of seconds spent inside the with block."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def render(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(self._upper_bounds, counts):
+            cumulative += count
+            bucket_labels = labels + (("le", _format_value(upper_bound)),)
+            lines.append("{}_bucket{} {}".format(
+                name, _format_labels(bucket_labels), cumulative
+            ))
+        lines.append("{}_sum{} {}".format(name, _format_labels(labels),
+                                          _format_value(total)))
+        lines.append("{}_count{} {}".format(name, _format_labels(labels),
+                                            cumulative))
+        return lines
+
+
+class Histogram(_Metric):
+    """Metric which tracks the distribution of durations (or other values)."""
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upper_bounds = tuple(sorted(buckets)) + (math.inf,)
+
+    def _create_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        """Observe value for the histogram without labels."""
+        self.labels().observe(value)
+
+    def time(self):
+        """Observe the seconds spent inside the with block, for the histogram
+        without labels."""
+        return self.labels().time()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, _escape(str(value)).replace('"', '\\"'))
+        for name, value in labels
+    ) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+PROCESSOR_SECONDS = Histogram(
+    "podcast_processor_seconds",
+    "Time spent in the accepts and populate methods of processors.",
+    ("type", "processor", "method"),
+)
+UPSTREAM_FETCH_SECONDS = Histogram(
+    "podcast_upstream_fetch_seconds",
+    "Time spent fetching data from upstream sources.",
+    ("source",),
+)
+REFRESH_SECONDS = Histogram(
+    "podcast_refresh_seconds",
+    "Time spent creating new data sources when the old ones went stale.",
+)
+FEED_RENDER_SECONDS = Histogram(
+    "podcast_feed_render_seconds",
+    "Time spent running pipelines and generating the XML for a feed.",
+    ("feed",),
+)
+CACHE_REQUESTS = Counter(
+    "podcast_cache_requests_total",
+    "Lookups in internal caches, by whether they were a hit or a miss.",
+    ("cache", "result"),
+)
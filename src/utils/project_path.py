@@ -0,0 +1,21 @@
+import os.path
+
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+"""The podkast.radiorevolt.no/ folder, which relative paths in the settings
+are relative to."""
+
+
+def project_path(path: str) -> str:
+    """Get absolute path for a path from the settings.
+
+    Args:
+        path: Path which is either absolute, or relative to the root folder of
+            the repository (the podkast.radiorevolt.no/ folder).
+
+    Returns:
+        Absolute version of path.
+    """
+    if os.path.isabs(path):
+        return path
+    return os.path.abspath(os.path.join(PROJECT_ROOT, path))
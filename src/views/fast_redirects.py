@@ -0,0 +1,82 @@
+"""
+Fast path for the episode and article redirects, which answers them before
+they reach Flask.
+
+Redirects are by far the most common requests, and all they need is a lookup
+of the intermediate ID. Requests which cannot be answered from memory are
+passed on to the Flask application, which handles them like before.
+"""
+import re
+
+from flask import Flask
+from werkzeug.utils import redirect
+
+from utils.metrics import CACHE_REQUESTS
+
+EPISODE_PATTERN = re.compile(r"^/episode/[^/]+/([^/]+)/[^/]+$")
+"""Pattern matching the path of /episode/<show>/<episode>/<title>."""
+
+ARTICLE_PATTERN = re.compile(r"^/artikkel/[^/]+/([^/]+)$")
+"""Pattern matching the path of /artikkel/<show>/<article>."""
+
+
+class RedirectFastPath:
+    """WSGI middleware which answers redirects using the Redirector's
+    in-memory copy of its tables, and passes everything else on.
+
+    The copy is loaded in the background the first time it is needed (see
+    RedirectTables), so no request waits for it. Until then, requests are
+    passed on.
+    """
+
+    def __init__(self, wsgi_app, get_global):
+        """
+        Args:
+            wsgi_app: The WSGI application to pass other requests on to.
+            get_global: Function which returns the data source with the given
+                key.
+        """
+        self.wsgi_app = wsgi_app
+        self.get_global = get_global
+        self._hits = CACHE_REQUESTS.labels("redirect_fast_path", "hit")
+        self._misses = CACHE_REQUESTS.labels("redirect_fast_path", "miss")
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ("GET", "HEAD") and \
+                not environ.get('QUERY_STRING'):
+            path = environ.get('PATH_INFO', "")
+            if path.startswith("/episode/"):
+                response = self._redirect(
+                    EPISODE_PATTERN, "sound", "episode", path, environ
+                )
+            elif path.startswith("/artikkel/"):
+                response = self._redirect(
+                    ARTICLE_PATTERN, "article", "article", path, environ
+                )
+            else:
+                response = None
+            if response is not None:
+                return response(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def _redirect(self, pattern, table, kind, path, environ):
+        match = pattern.match(path)
+        if not match:
+            return None
+        proxy = match.group(1)
+        url = self.get_global('redirector').get_cached_original(table, proxy)
+        if url is None:
+            # Added after the copy was made, or not found at all
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        self.get_global('hit_counter').count(
+            kind, proxy, environ.get('HTTP_USER_AGENT')
+        )
+        return redirect(url)
+
+
+def register_fast_redirects(app: Flask, settings, get_global):
+    if not settings['web']['redirect_fast_path']:
+        return
+    app.wsgi_app = RedirectFastPath(app.wsgi_app, get_global)
@@ -0,0 +1,41 @@
+from flask import make_response, Flask
+
+from utils.metrics import REGISTRY, CONTENT_TYPE
+from utils.project_path import project_path
+
+
+def output_metrics(registry):
+    resp = make_response(registry.render())
+    resp.headers['Content-Type'] = CONTENT_TYPE
+    # Never let nginx or anyone else cache this
+    resp.cache_control.no_store = True
+    return resp
+
+
+def register_metrics_route(app: Flask, settings, get_global):
+    metrics_settings = settings['metrics']
+    # The application is created before uWSGI forks the workers, so this
+    # removes the files of the last run only
+    REGISTRY.share_between_processes(
+        project_path(metrics_settings['directory']),
+        metrics_settings['flush_interval'],
+        clear=True,
+    )
+
+    # Register this after any other WSGI middleware, so the requests it
+    # answers are also seen
+    wsgi_app = app.wsgi_app
+
+    def start_flushing_first(environ, start_response):
+        REGISTRY.start_flushing()
+        return wsgi_app(environ, start_response)
+    app.wsgi_app = start_flushing_first
+
+    def do_output_metrics():
+        return output_metrics(REGISTRY)
+
+    app.add_url_rule(
+        "/metrics",
+        "output_metrics",
+        do_output_metrics
+    )
@@ -1,26 +1,28 @@
-from flask import abort, redirect, Flask
+from flask import abort, redirect, request, Flask
 
 
 SOUND_REDIRECT_ENDPOINT = "redirect_episode"
 ARTICLE_REDIRECT_ENDPOINT = "redirect_article"
 
 
-def redirect_episode(show, episode, title, redirector):
+def redirect_episode(show, episode, title, redirector, hit_counter):
     try:
-        url = redirect(redirector.get_original_sound(episode))
+        url = redirector.get_original_sound(episode)
         if not url:
             raise ValueError("No episode with the given ID was found")
-        return url
+        hit_counter.count("episode", episode, request.headers.get("User-Agent"))
+        return redirect(url)
     except ValueError:
         abort(404)
 
 
-def redirect_article(show, article, redirector):
+def redirect_article(show, article, redirector, hit_counter):
     try:
-        url = redirect(redirector.get_original_article(article))
+        url = redirector.get_original_article(article)
         if not url:
             raise ValueError("No article with the given ID was found")
-        return url
+        hit_counter.count("article", article, request.headers.get("User-Agent"))
+        return redirect(url)
     except ValueError:
         abort(404)
 
@@ -28,6 +30,7 @@ def redirect_article(show, article, redirector):
 def register_episode_redirect(app: Flask, settings, get_global):
     def do_redirect_episode(*args, **kwargs):
         kwargs['redirector'] = get_global('redirector')
+        kwargs['hit_counter'] = get_global('hit_counter')
         return redirect_episode(*args, **kwargs)
 
     app.add_url_rule(
@@ -40,6 +43,7 @@ def register_episode_redirect(app: Flask, settings, get_global):
 def register_article_redirect(app: Flask, settings, get_global):
     def do_redirect_article(*args, **kwargs):
         kwargs['redirector'] = get_global('redirector')
+        kwargs['hit_counter'] = get_global('hit_counter')
         return redirect_article(*args, **kwargs)
 
     app.add_url_rule(
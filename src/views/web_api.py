@@ -1,4 +1,6 @@
-from flask import abort, jsonify, Flask
+import json
+
+from flask import abort, jsonify, request, url_for, Flask, Response
 
 from feed_utils.no_such_show_error import NoSuchShowError
 from views.web_feed import url_for_feed
@@ -22,10 +24,113 @@ def api_slug_name(show_name, url_service):
     return url_for_feed(url_service.sluggify(show_name))
 
 
+ID_TABLES = {
+    "episode": "sound",
+    "article": "article",
+}
+"""The Redirector table used for each kind of identifier."""
+
+
 def api_id(redirector):
-    json_dict = {"episode": redirector.get_all_sound(), "article": redirector.get_all_article()}
+    etag = _create_id_etag(redirector, ID_TABLES.values())
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    def generate():
+        yield "{"
+        for i, (kind, table) in enumerate(ID_TABLES.items()):
+            yield "{}{}: ".format(", " if i else "", json.dumps(kind))
+            yield from _generate_id_object(redirector.iter_all(table))
+        yield "}\n"
+
+    return _id_response(generate(), etag)
+
+
+def api_id_page(kind, redirector, page_size, after=0):
+    try:
+        table = ID_TABLES[kind]
+    except KeyError:
+        abort(404)
+    etag = _create_id_etag(redirector, (table,), after)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    # Fetch one row more than the page holds, so we know whether there is a
+    # next page before we start streaming, without querying twice
+    rows = list(redirector.iter_all(table, after, page_size + 1))
+    has_next_page = len(rows) > page_size
+    rows = rows[:page_size]
+    last_rowid = rows[-1][0] if rows else None
+    if has_next_page:
+        next_url = url_for("api_id_page_after", kind=kind, after=last_rowid,
+                           _external=True)
+    else:
+        next_url = None
+
+    def generate():
+        yield '{"items": '
+        yield from _generate_id_object(rows)
+        yield ', "last": {}, "next": {}}}\n'.format(
+            json.dumps(last_rowid), json.dumps(next_url)
+        )
+
+    return _id_response(generate(), etag)
+
+
+def _generate_id_object(rows, chunk_size=500):
+    """Generate a JSON object mapping identifiers to URLs, in chunks."""
+    yield "{"
+    chunk = []
+    separator = ""
+    for _, proxy, original in rows:
+        chunk.append("{}{}: {}".format(
+            separator, json.dumps(proxy), json.dumps(original)
+        ))
+        separator = ", "
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+    yield "}"
+
+
+def _create_id_etag(redirector, tables, after=0) -> str:
+    versions = ["{}-{}".format(*redirector.get_version(table))
+                for table in tables]
+    return "{}-{}".format(after, "-".join(versions))
+
+
+def _id_response(generator, etag) -> Response:
+    resp = Response(generator, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp
+
+
+def _not_modified(etag) -> Response:
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+
+
+STATS_KINDS = ("episode", "article")
+
+
+def api_stats_help():
+    return "<pre>Format:\n" \
+           "/api/stats/&lt;episode or article&gt;/\n" \
+           "/api/stats/&lt;episode or article&gt;/&lt;identifier&gt;</pre>"
+
+
+def api_stats_totals(kind, hit_counter):
+    if kind not in STATS_KINDS:
+        abort(404)
+    return jsonify(hit_counter.get_totals(kind))
 
-    return jsonify(**json_dict)
+
+def api_stats_single(kind, identifier, hit_counter):
+    if kind not in STATS_KINDS:
+        abort(404)
+    return jsonify(hit_counter.get_stats(kind, identifier))
 
 
 def api_help():
@@ -33,7 +138,13 @@ def api_help():
         ("URL from Digas ID:", "/api/url/"),
         ("Predict URL from show name:", "/api/slug/"),
         ("Get JSON list which maps episode or article identifier to URL:",
-         "/api/id/")
+         "/api/id/"),
+        ("Same, one page of episode identifiers at a time:",
+         "/api/id/episode/"),
+        ("Same, one page of article identifiers at a time:",
+         "/api/id/article/"),
+        ("Get number of downloads of episodes or visits to articles:",
+         "/api/stats/"),
     ]
     return "<pre>API for podcast-feed-gen\nFormat:\n" + \
            ("\n".join(["{0:<20}{1}".format(i[0], i[1]) for i in alternatives])) \
@@ -55,6 +166,12 @@ def register_api_routes(app: Flask, settings, get_global):
             return func(*args, **kwargs)
         return func_with_redirector
 
+    def inject_hit_counter(func):
+        def func_with_hit_counter(*args, **kwargs):
+            kwargs['hit_counter'] = get_global('hit_counter')
+            return func(*args, **kwargs)
+        return func_with_hit_counter
+
     # Define which URLs maps to what functions
     app.add_url_rule(
         "/api/url/<show>",
@@ -86,6 +203,43 @@ def register_api_routes(app: Flask, settings, get_global):
         inject_redirector(api_id)
     )
 
+    page_size = settings['web']['api_page_size']
+
+    def do_api_id_page(*args, **kwargs):
+        kwargs['redirector'] = get_global('redirector')
+        kwargs['page_size'] = page_size
+        return api_id_page(*args, **kwargs)
+
+    app.add_url_rule(
+        "/api/id/<kind>/",
+        "api_id_page",
+        do_api_id_page
+    )
+
+    app.add_url_rule(
+        "/api/id/<kind>/after/<int:after>",
+        "api_id_page_after",
+        do_api_id_page
+    )
+
+    app.add_url_rule(
+        "/api/stats/",
+        "api_stats_help",
+        api_stats_help
+    )
+
+    app.add_url_rule(
+        "/api/stats/<kind>/",
+        "api_stats_totals",
+        inject_hit_counter(api_stats_totals)
+    )
+
+    app.add_url_rule(
+        "/api/stats/<kind>/<identifier>",
+        "api_stats_single",
+        inject_hit_counter(api_stats_single)
+    )
+
     app.add_url_rule(
         "/api/",
         "api_help",
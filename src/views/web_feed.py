@@ -1,26 +1,66 @@
-from flask import redirect, url_for, abort, make_response, Flask
+import datetime
 
+from flask import redirect, url_for, abort, make_response, request, Flask
+
+from feed_utils import json_feed
+from feed_utils.feed_preview import CONTENT_TYPE as PREVIEW_CONTENT_TYPE
 from feed_utils.no_episodes_error import NoEpisodesError
 from feed_utils.no_such_show_error import NoSuchShowError
 from feed_utils.populate import run_episode_pipeline, run_show_pipeline
 from feed_utils.show import Show
+from utils.metrics import FEED_RENDER_SECONDS
+
+
+# Formats the feeds are available in, with their content type. JSON feeds are
+# found beneath /json/ and always use the default pipeline
+FEED_FORMATS = {
+    'rss': 'application/xml',
+    'json': json_feed.CONTENT_TYPE,
+}
+DEFAULT_FORMAT = 'rss'
+JSON_FORMAT = 'json'
+
+# Used as lastBuildDate for feeds without episodes
+NO_EPISODES_LAST_UPDATED = datetime.datetime(
+    1970, 1, 1, tzinfo=datetime.timezone.utc
+)
 
 
 def xslt_url():
     return url_for('static', filename="style.xsl")
 
 
-def output_all_feed(all_episodes_settings, all_episodes_ttl, show_source, episode_source, processors):
-    show = Show(id=0, **all_episodes_settings)
-    show = run_show_pipeline(show, processors['show']['all_feed'])
-    episodes = episode_source.get_all_episodes_list(show_source)
-    episodes = run_episode_pipeline(episodes, processors['episode']['web'])
-    show.episodes = episodes
-    return _prepare_feed_response(show, all_episodes_ttl)
+def output_all_feed(all_episodes_settings, all_episodes_ttl, all_episodes_limit, all_episodes_max_age, base_url, show_source, episode_source, processors, feed_cache, item_cache, websub, feed_preview, feed_format=DEFAULT_FORMAT):
+    def render():
+        with FEED_RENDER_SECONDS.labels("all").time():
+            show = Show(id=0, **all_episodes_settings)
+            show = run_show_pipeline(show, processors['show']['all_feed'])
+            episodes = episode_source.get_all_episodes_list(
+                show_source, all_episodes_limit, all_episodes_max_age
+            )
+            episodes = run_episode_pipeline(episodes, processors['episode']['web'])
+            show.episodes = episodes
+            show.feed_url = url_for_all_feed(feed_format)
+            feed = _render_feed(show, item_cache, websub.hub_url, feed_format)
+        rendered_feed = feed_cache.create(
+            feed, all_episodes_ttl, show.last_updated,
+            FEED_FORMATS[feed_format]
+        )
+        websub.feed_rendered(show.feed_url, rendered_feed.body)
+        return rendered_feed
 
+    host_url = _cached_host_url(base_url)
+    key = ("all", feed_format, host_url) if host_url else None
+    feed = feed_cache.get(key, render)
+    return _respond_with_feed(feed, key, feed_format, feed_cache, feed_preview)
 
-def output_feed(show_name, feed_ttl, completed_ttl_factor, alternate_all_episodes_uri, url_service, show_source, episode_source, processors):
-    return output_special_feed(DEFAULT_PIPELINE, show_name, feed_ttl, completed_ttl_factor, alternate_all_episodes_uri, url_service, show_source, episode_source, processors)
+
+def output_feed(show_name, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, alternate_all_episodes_uri, base_url, url_service, show_cache, episode_source, processors, feed_cache, item_cache, websub, feed_preview, page=None):
+    return output_special_feed(DEFAULT_PIPELINE, show_name, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, alternate_all_episodes_uri, base_url, url_service, show_cache, episode_source, processors, feed_cache, item_cache, websub, feed_preview, page)
+
+
+def output_json_feed(show_name, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, alternate_all_episodes_uri, base_url, url_service, show_cache, episode_source, processors, feed_cache, item_cache, websub, feed_preview, page=None):
+    return output_special_feed(DEFAULT_PIPELINE, show_name, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, alternate_all_episodes_uri, base_url, url_service, show_cache, episode_source, processors, feed_cache, item_cache, websub, feed_preview, page, JSON_FORMAT)
 
 
 # Note: when adding pipelines here, you must also change init_pipelines.py so
@@ -32,7 +72,7 @@ ALLOWED_PIPELINES = {
 DEFAULT_PIPELINE = 'web'
 
 
-def output_special_feed(pipeline, show_name, feed_ttl, completed_ttl_factor, alternate_all_episodes_uri, url_service, show_source, episode_source, processors):
+def output_special_feed(pipeline, show_name, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, alternate_all_episodes_uri, base_url, url_service, show_cache, episode_source, processors, feed_cache, item_cache, websub, feed_preview, page=None, feed_format=DEFAULT_FORMAT):
     if pipeline not in ALLOWED_PIPELINES:
         abort(404, 'Pipeline "{}" not recognized'.format(pipeline))
 
@@ -52,54 +92,255 @@ def output_special_feed(pipeline, show_name, feed_ttl, completed_ttl_factor, alt
     except NoSuchShowError:
         # Are we perhaps supposed to redirect to /all?
         if show_name.lower() in (name.lower() for name in alternate_all_episodes_uri):
-            return redirect(url_for("output_all_feed"))
+            return redirect(url_for_all_feed(feed_format))
         else:
             abort(404)
-    show_instance = show_source.get_show(show)
 
     if not show_name == canonical_slug:
-        return redirect(url_for_feed(canonical_slug, pipeline))
+        return redirect(url_for_feed(canonical_slug, pipeline, page, feed_format))
 
-    populated_show = run_show_pipeline(
-        show_instance, processors['show'][show_pipeline]
-    )
+    if page is not None and not page_size:
+        abort(404, 'Feeds are not split into pages')
+
+    host_url = _cached_host_url(base_url)
 
-    is_completed = show_instance.complete
+    def render():
+        with FEED_RENDER_SECONDS.labels(pipeline).time():
+            feed, ttl, last_modified = _render_show_feed(
+                show,
+                show_pipeline,
+                episode_pipeline,
+                feed_ttl,
+                completed_ttl_factor,
+                archive_ttl,
+                episode_limit,
+                page_size,
+                page,
+                canonical_slug,
+                pipeline,
+                host_url,
+                show_cache,
+                episode_source,
+                processors,
+                item_cache,
+                websub.hub_url,
+                feed_format
+            )
+        if feed is None:
+            return None
+        rendered_feed = feed_cache.create(
+            feed, ttl, last_modified, FEED_FORMATS[feed_format]
+        )
+        if page is None:
+            # Archive pages are not announced, they rarely change
+            websub.feed_rendered(
+                url_for_feed(canonical_slug, pipeline, None, feed_format),
+                rendered_feed.body
+            )
+        return rendered_feed
+
+    # Concurrent requests for this feed wait for the first one to render it
+    key = (show, pipeline, page, feed_format, host_url) if host_url else None
+    feed = feed_cache.get(key, render)
+    if feed is None:
+        abort(404, 'No page {} in this feed'.format(page))
+    return _respond_with_feed(feed, key, feed_format, feed_cache, feed_preview)
+
+
+def _render_show_feed(show, show_pipeline, episode_pipeline, feed_ttl, completed_ttl_factor, archive_ttl, episode_limit, page_size, page, slug, pipeline, host_url, show_cache, episode_source, processors, item_cache, hub_url, feed_format):
+    # The show pipeline has only run once for this show in this generation
+    populated_show = show_cache.get_show(show, show_pipeline, host_url)
+
+    is_completed = populated_show.complete
     # VERY IMPORTANT! We don't want Itunes to stop refreshing a show just
     # because it's not running right now, because it might very well return
     # some day. So don't mark any show as completed.
     populated_show.complete = False
 
     try:
-        episodes = episode_source.episode_list(populated_show)
-    except NoEpisodesError:
+        if page_size:
+            episodes, num_archive_pages = episode_source.episode_page(
+                populated_show, page_size, page
+            )
+            populated_show.feed_links = _page_links(
+                slug, pipeline, page, num_archive_pages, feed_format
+            )
+            populated_show.is_archive = page is not None
+        else:
+            episodes = episode_source.episode_list(
+                populated_show, episode_limit
+            )
+    except (NoEpisodesError, IndexError):
+        if page is not None:
+            # Signal that the page does not exist
+            return None, None, None
         episodes = []
     populated_episodes = run_episode_pipeline(
         episodes, processors['episode'][episode_pipeline]
     )
     populated_show.episodes = populated_episodes
+    populated_show.feed_url = url_for_feed(slug, pipeline, page, feed_format)
 
-    if is_completed:
+    if page is not None:
+        ttl = archive_ttl
+    elif is_completed:
         ttl = round(feed_ttl * completed_ttl_factor)
     else:
         ttl = feed_ttl
 
-    return _prepare_feed_response(populated_show, ttl)
+    if page is not None:
+        # Archive pages are not announced to the hub, so do not make
+        # subscribers expect it
+        hub_url = None
+    feed = _render_feed(populated_show, item_cache, hub_url, feed_format)
+    return feed, ttl, populated_show.last_updated
 
 
-def _prepare_feed_response(show, max_age):
+def _render_feed(show, item_cache, hub_url, feed_format=DEFAULT_FORMAT):
+    # podgen uses the current time when last_updated is not set, which would
+    # make the feed differ every time it is rendered
+    if show.last_updated is None:
+        show.last_updated = _last_updated(show)
+    if feed_format == JSON_FORMAT:
+        return json_feed.render_json_feed(show, hub_url)
     show.xslt = xslt_url()
-    feed = show.rss_str()
-    resp = make_response(feed)
-    resp.headers['Content-Type'] = 'application/xml'
-    resp.cache_control.max_age = max_age
-    resp.cache_control.public = True
+    show.item_cache = item_cache
+    # Advertise the WebSub hub (feed_url is the topic)
+    show.pubsubhubbub = hub_url
+    return show.rss_str()
+
+
+def _last_updated(show):
+    """Find when the contents of the feed last changed, using the newest
+    episode."""
+    episode_dates = [episode.publication_date for episode in show.episodes
+                     if episode.publication_date is not None]
+    if episode_dates:
+        return max(episode_dates)
+    return show.publication_date or NO_EPISODES_LAST_UPDATED
+
+
+def _respond_with_feed(feed, key, feed_format, feed_cache, feed_preview):
+    """Create the response with the feed, or with its HTML preview when the
+    client is a browser."""
+    if feed_format != DEFAULT_FORMAT:
+        return _prepare_feed_response(feed)
+    if _wants_html():
+        def render():
+            return feed_cache.create(
+                feed_preview.render(feed.body),
+                feed.max_age,
+                feed.last_modified,
+                PREVIEW_CONTENT_TYPE
+            )
+        # Made once in each generation, like the feed itself
+        feed = feed_cache.get(key + ("preview",) if key else None, render)
+    resp = _prepare_feed_response(feed)
+    # The feed and its preview are served from the same URL
+    resp.vary.add('Accept')
     return resp
 
 
-def url_for_feed(slug, pipeline=None):
-    if not pipeline or pipeline == DEFAULT_PIPELINE:
+def _cached_host_url(base_url):
+    """Get the URL of the host the request was made to, for use in cache keys,
+    or None if feeds for this host must not be cached.
+
+    The links in the feeds depend on the host, so it is part of the keys. Only
+    the host in web.base_url is cached, so requests with made-up Host headers
+    cannot make the caches grow without bounds. Other hosts (like localhost
+    during development) get feeds which are rendered for every request.
+    """
+    host_url = request.host_url
+    return host_url if host_url == base_url else None
+
+
+def _wants_html():
+    # Browsers list text/html explicitly, while podcast apps do not. Nginx
+    # uses the same rule to pick the cache key and the static file
+    return any(mimetype == 'text/html' and quality > 0
+               for mimetype, quality in request.accept_mimetypes)
+
+
+def _accepted_content_coding(feed):
+    # The first content coding the client lists with a quality above zero, in
+    # our order of preference, regardless of the client's order. Nginx uses
+    # the same rule to pick the cache key, so it must not depend on anything
+    # its map can't see (like "*" or relative qualities)
+    accepted = {value.lower() for value, quality in request.accept_encodings
+                if quality > 0}
+    return next((coding for coding in feed.encoded if coding in accepted),
+                None)
+
+
+def _prepare_feed_response(feed):
+    content_coding = _accepted_content_coding(feed)
+    resp = make_response(feed.get_body(content_coding))
+    resp.headers['Content-Type'] = feed.content_type
+    if content_coding:
+        resp.headers['Content-Encoding'] = content_coding
+    resp.vary.add('Accept-Encoding')
+    resp.set_etag(feed.get_etag(content_coding))
+    resp.last_modified = feed.last_modified
+    resp.cache_control.max_age = feed.max_age
+    resp.cache_control.public = True
+    # Answers If-None-Match and If-Modified-Since with 304 Not Modified. The
+    # body is left out of HEAD responses, but Content-Length is kept
+    return resp.make_conditional(request)
+
+
+def _page_links(slug, pipeline, page, num_archive_pages, feed_format=DEFAULT_FORMAT):
+    """Create the links between the pages of a feed (RFC 5005).
+
+    Archive pages are numbered from the oldest, so "next" and "prev-archive"
+    lead to older episodes, while "previous" and "next-archive" lead to newer
+    episodes.
+    """
+    links = []
+    if page is None:
+        older = num_archive_pages or None
+        newer = None
+    else:
+        links.append(("current", url_for_feed(slug, pipeline, None, feed_format)))
+        older = page - 1 or None
+        newer = url_for_feed(slug, pipeline, page + 1, feed_format) \
+            if page < num_archive_pages else None
+        if newer:
+            links.append(("next-archive", newer))
+        links.append(("previous", newer or url_for_feed(slug, pipeline, None, feed_format)))
+    if older:
+        older_url = url_for_feed(slug, pipeline, older, feed_format)
+        links.append(("prev-archive", older_url))
+        links.append(("next", older_url))
+    return links
+
+
+def url_for_feed(slug, pipeline=None, page=None, feed_format=DEFAULT_FORMAT):
+    if feed_format == JSON_FORMAT:
+        if page is not None:
+            return url_for(
+                "output_json_archive_feed",
+                show_name=slug,
+                page=page,
+                _external=True
+            )
+        return url_for("output_json_feed", show_name=slug, _external=True)
+    elif not pipeline or pipeline == DEFAULT_PIPELINE:
+        if page is not None:
+            return url_for(
+                "output_archive_feed",
+                show_name=slug,
+                page=page,
+                _external=True
+            )
         return url_for("output_feed", show_name=slug, _external=True)
+    elif page is not None:
+        return url_for(
+            "output_special_archive_feed",
+            show_name=slug,
+            pipeline=pipeline,
+            page=page,
+            _external=True
+        )
     else:
         return url_for(
             "output_special_feed",
@@ -109,27 +350,57 @@ def url_for_feed(slug, pipeline=None):
         )
 
 
+def url_for_all_feed(feed_format=DEFAULT_FORMAT):
+    if feed_format == JSON_FORMAT:
+        return url_for("output_json_all_feed", _external=True)
+    return url_for("output_all_feed", _external=True)
+
+
 def register_feed_routes(app: Flask, settings, get_global):
     def inject_feed_arguments(func):
         def run_func(*args, **kwargs):
             kwargs['feed_ttl'] = settings['caching']['feed_ttl']
             kwargs['completed_ttl_factor'] = settings['caching']['completed_ttl_factor']
+            kwargs['archive_ttl'] = settings['caching']['archive_ttl']
+            kwargs['episode_limit'] = settings['feed']['show_episodes_limit']
+            kwargs['page_size'] = settings['feed']['page_size']
             kwargs['alternate_all_episodes_uri'] = settings['all_episodes_show_aliases']
+            kwargs['base_url'] = settings['web']['base_url']
             kwargs['url_service'] = get_global('url_service')
-            kwargs['show_source'] = get_global('show_source')
+            kwargs['show_cache'] = get_global('show_cache')
             kwargs['episode_source'] = get_global('episode_source')
             kwargs['processors'] = get_global('processors')
+            kwargs['feed_cache'] = get_global('feed_cache')
+            kwargs['item_cache'] = get_global('item_cache')
+            kwargs['websub'] = get_global('websub')
+            kwargs['feed_preview'] = get_global('feed_preview')
             return func(*args, **kwargs)
         return run_func
     app.add_url_rule("/<show_name>", "output_feed", inject_feed_arguments(output_feed))
     app.add_url_rule("/<pipeline>/<show_name>", "output_special_feed", inject_feed_arguments(output_special_feed))
+    app.add_url_rule("/<show_name>/archive/<int:page>", "output_archive_feed", inject_feed_arguments(output_feed))
+    app.add_url_rule("/<pipeline>/<show_name>/archive/<int:page>", "output_special_archive_feed", inject_feed_arguments(output_special_feed))
+    app.add_url_rule("/json/<show_name>", "output_json_feed", inject_feed_arguments(output_json_feed))
+    app.add_url_rule("/json/<show_name>/archive/<int:page>", "output_json_archive_feed", inject_feed_arguments(output_json_feed))
 
-    def do_output_all_feed():
+    def do_output_all_feed(feed_format=DEFAULT_FORMAT):
         return output_all_feed(
             settings['feed']['metadata_all_episodes'],
             settings['caching']['all_episodes_ttl'],
+            settings['feed']['all_episodes_limit'],
+            settings['feed']['all_episodes_max_age'],
+            settings['web']['base_url'],
             get_global('show_source'),
             get_global('episode_source'),
             get_global('processors'),
+            get_global('feed_cache'),
+            get_global('item_cache'),
+            get_global('websub'),
+            get_global('feed_preview'),
+            feed_format,
         )
+
+    def do_output_json_all_feed():
+        return do_output_all_feed(JSON_FORMAT)
     app.add_url_rule("/all", "output_all_feed", do_output_all_feed)
+    app.add_url_rule("/json/all", "output_json_all_feed", do_output_json_all_feed)
@@ -0,0 +1,144 @@
+import datetime
+import gzip
+import hashlib
+import threading
+
+from utils.metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class RenderedFeed:
+    """A feed which has been rendered, together with compressed versions of
+    it and the metadata used in the response headers.
+
+    HEAD and conditional requests are answered using the metadata, so they
+    only make the feed render when it has not been rendered yet.
+    """
+    def __init__(self, body: bytes, max_age: int, encoded: dict,
+                 last_modified: datetime.datetime,
+                 content_type: str="application/xml"):
+        """Create new instance of RenderedFeed.
+
+        Args:
+            body: The feed, encoded as UTF-8.
+            max_age: Number of seconds clients may cache the feed.
+            encoded: Dictionary with content coding (like "gzip") as key and
+                the body compressed with it as value, in order of preference.
+            last_modified: When the contents of the feed last changed.
+            content_type: Content type of the feed, like application/xml.
+        """
+        self.body = body
+        self.max_age = max_age
+        self.encoded = encoded
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.digest = hashlib.sha1(body).hexdigest()
+        """Identifies the contents of the feed, regardless of compression. The
+        feeds are rendered the same way every time their contents are the same,
+        so the digest is the same in every worker process and generation."""
+
+    def get_body(self, content_coding: str=None) -> bytes:
+        """Get the feed, compressed with the given content coding, or
+        uncompressed if no content coding is given."""
+        if content_coding is None:
+            return self.body
+        return self.encoded[content_coding]
+
+    def get_etag(self, content_coding: str=None) -> str:
+        """Get the entity tag of the feed, compressed with the given content
+        coding. Each content coding has its own entity tag, since the bodies
+        differ."""
+        if content_coding is None:
+            return self.digest
+        return "{}-{}".format(self.digest, content_coding)
+
+
+class FeedCache:
+    """Cache of rendered feeds, so each feed is rendered and compressed once.
+
+    One instance is created for every generation of data sources, since the
+    feeds only change when the data sources are refreshed. Concurrent requests
+    for a feed which is not cached yet wait for the first one to render it,
+    using SingleFlight.
+    """
+    def __init__(self, single_flight, gzip_level: int=9,
+                 brotli_quality: int=9):
+        """Create new instance of FeedCache.
+
+        Args:
+            single_flight: SingleFlight used to let concurrent requests share
+                one rendering of a feed, also across worker processes.
+            gzip_level: Compression level to use for gzip, from 1 to 9.
+            brotli_quality: Quality to use for Brotli, from 0 to 11. Brotli is
+                not used if this is None, or if the brotli module is missing.
+        """
+        self.single_flight = single_flight
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality if brotli else None
+        self._feeds = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        """Get the rendered feed for key, rendering it if necessary.
+
+        Args:
+            key: Hashable object identifying the feed, see SingleFlight.do, or
+                None to render the feed without caching it.
+            render: Function which returns the RenderedFeed (created by
+                create), or None if there is no such feed.
+
+        Returns:
+            The RenderedFeed returned by render, now or earlier.
+        """
+        if key is None:
+            return render()
+        with self._lock:
+            if key in self._feeds:
+                CACHE_REQUESTS.labels("rendered_feeds", "hit").inc()
+                return self._feeds[key]
+        CACHE_REQUESTS.labels("rendered_feeds", "miss").inc()
+
+        def render_unless_cached():
+            # Cached by the previous call for key after we looked
+            with self._lock:
+                if key in self._feeds:
+                    return self._feeds[key]
+            return render()
+
+        def store(feed):
+            with self._lock:
+                self._feeds[key] = feed
+
+        return self.single_flight.do(key, render_unless_cached, store)
+
+    def create(self, feed: str, max_age: int,
+               last_modified: datetime.datetime,
+               content_type: str="application/xml") -> RenderedFeed:
+        """Create a RenderedFeed, compressing the feed with every content
+        coding.
+
+        Args:
+            feed: The rendered feed.
+            max_age: Number of seconds clients may cache the feed.
+            last_modified: When the contents of the feed last changed, like the
+                lastBuildDate of the feed. Must have a timezone.
+            content_type: Content type of the feed.
+
+        Returns:
+            The new RenderedFeed.
+        """
+        body = feed.encode("UTF-8")
+        encoded = dict()
+        if self.brotli_quality is not None:
+            # Smaller than gzip, so preferred
+            encoded["br"] = brotli.compress(body, quality=self.brotli_quality)
+        encoded["gzip"] = gzip.compress(body, self.gzip_level, mtime=0)
+        # HTTP dates are in GMT, without fractions of a second
+        last_modified = last_modified.astimezone(datetime.timezone.utc)\
+            .replace(microsecond=0)
+        return RenderedFeed(body, max_age, encoded, last_modified,
+                            content_type)
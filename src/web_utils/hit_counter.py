@@ -0,0 +1,220 @@
+import collections
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+
+from utils.project_path import project_path
+
+logger = logging.getLogger(__name__)
+
+
+USER_AGENT_CLASSES = (
+    ("bot", re.compile(r"bot|crawl|spider|slurp|facebookexternalhit", re.I)),
+    ("spotify", re.compile(r"spotify", re.I)),
+    ("apple_podcasts", re.compile(r"applecoremedia|itunes|podcasts/|"
+                                  r"applepodcasts", re.I)),
+    ("google_podcasts", re.compile(r"google-?podcast|gsa/", re.I)),
+    ("pocket_casts", re.compile(r"pocket ?casts", re.I)),
+    ("overcast", re.compile(r"overcast", re.I)),
+    ("castbox", re.compile(r"castbox", re.I)),
+    ("podcast_addict", re.compile(r"podcastaddict", re.I)),
+    ("browser", re.compile(r"mozilla|opera", re.I)),
+)
+"""Pairs of user agent class and the pattern which identifies it, in the order
+they are tried."""
+
+
+def classify_user_agent(user_agent: str) -> str:
+    """Find out what kind of client sent a request.
+
+    Args:
+        user_agent: Value of the User-Agent header, or None if there was none.
+
+    Returns:
+        Name of one of the USER_AGENT_CLASSES, or "other" if none matched.
+    """
+    if user_agent:
+        for name, pattern in USER_AGENT_CLASSES:
+            if pattern.search(user_agent):
+                return name
+    return "other"
+
+
+class HitCounter:
+    """Class which counts how many times each episode and article is
+    requested through the Redirector.
+
+    Hits are counted in memory and saved to the database by a background
+    thread every few seconds, so counting adds no latency to the redirect.
+    Every worker process has its own HitCounter, which all add to the totals
+    in the same database. If the database cannot be written to, the hits are
+    kept in memory and tried again, but only for a limited number of times, so
+    they do not pile up while the database is unavailable.
+    """
+    def __init__(
+            self,
+            db_file: str,
+            flush_interval: float=5.0,
+            split_by_user_agent: bool=True,
+            max_retries: int=12
+    ):
+        """Create new instance of HitCounter.
+
+        Args:
+            db_file: Path to the sqlite3 database file to save hits in. Either
+                absolute or relative to the repository root folder.
+            flush_interval: Seconds between each time hits are saved.
+            split_by_user_agent: Whether to count hits separately for each
+                class of user agents (see classify_user_agent).
+            max_retries: Number of times in a row saving the hits may fail
+                before the hits counted so far are dropped.
+        """
+        self.db_file = project_path(db_file)
+        self.flush_interval = flush_interval
+        self.split_by_user_agent = split_by_user_agent
+        self.max_retries = max_retries
+        self._pending = collections.Counter()
+        """Hits not yet saved, with (kind, proxy, day, user agent class) as
+        key."""
+        self._num_failures = 0
+        """Number of times in a row saving the hits has failed."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def init_db(self):
+        """Initialize the database file used by HitCounter. Can be called
+        independently of whether the database is set up already or not."""
+        with sqlite3.connect(self.db_file) as c:
+            c.execute("CREATE TABLE IF NOT EXISTS hits ("
+                      "kind text, "
+                      "proxy text, "
+                      "day text, "
+                      "user_agent text, "
+                      "hits integer NOT NULL, "
+                      "PRIMARY KEY (kind, proxy, day, user_agent))")
+
+    def count(self, kind: str, proxy: str, user_agent: str=None):
+        """Count one hit.
+
+        Args:
+            kind: What was requested, either "episode" or "article".
+            proxy: The intermediate ID used in the redirect URL.
+            user_agent: Value of the request's User-Agent header.
+        """
+        day = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        agent_class = classify_user_agent(user_agent) \
+            if self.split_by_user_agent else "all"
+        with self._lock:
+            self._pending[(kind, proxy, day, agent_class)] += 1
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="HitCounter",
+                    daemon=True,
+                )
+                self._thread.start()
+        if self._closed.is_set():
+            # Counted after close, so no thread will save it for us
+            self.flush()
+
+    def flush(self):
+        """Save all hits counted so far to the database."""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = collections.Counter()
+            if not pending:
+                return
+            try:
+                with sqlite3.connect(self.db_file, timeout=30) as c:
+                    # Both statements run in the same transaction. Upserts
+                    # (ON CONFLICT DO UPDATE) would do it in one, but need
+                    # SQLite 3.24
+                    c.executemany(
+                        "INSERT OR IGNORE INTO hits "
+                        "(kind, proxy, day, user_agent, hits) "
+                        "VALUES (?, ?, ?, ?, 0)",
+                        pending.keys()
+                    )
+                    c.executemany(
+                        "UPDATE hits SET hits = hits + ? "
+                        "WHERE kind=? AND proxy=? AND day=? AND user_agent=?",
+                        [(hits,) + key for key, hits in pending.items()]
+                    )
+            except sqlite3.Error:
+                self._num_failures += 1
+                if self._num_failures > self.max_retries:
+                    logger.exception("Could not save %d hits, giving up",
+                                     sum(pending.values()))
+                    self._num_failures = 0
+                    return
+                logger.exception("Could not save %d hits, will try again",
+                                 sum(pending.values()))
+                with self._lock:
+                    self._pending.update(pending)
+            else:
+                self._num_failures = 0
+
+    def close(self):
+        """Stop the background thread, and save all hits counted so far."""
+        self._closed.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def get_stats(self, kind: str, proxy: str) -> dict:
+        """Get the number of hits for one episode or article.
+
+        Hits which have not been saved yet, are not included.
+
+        Args:
+            kind: Either "episode" or "article".
+            proxy: The intermediate ID used in the redirect URL.
+
+        Returns:
+            Dictionary with the total number of hits, and the number of hits
+            per day and per user agent class.
+        """
+        by_day = collections.Counter()
+        by_user_agent = collections.Counter()
+        with sqlite3.connect(self.db_file) as c:
+            rows = c.execute(
+                "SELECT day, user_agent, hits FROM hits "
+                "WHERE kind=? AND proxy=?",
+                (kind, proxy)
+            )
+            for day, user_agent, hits in rows:
+                by_day[day] += hits
+                by_user_agent[user_agent] += hits
+        return {
+            "total": sum(by_day.values()),
+            "by_day": dict(sorted(by_day.items())),
+            "by_user_agent": dict(by_user_agent.most_common()),
+        }
+
+    def get_totals(self, kind: str) -> dict:
+        """Get the total number of hits for every episode or article.
+
+        Args:
+            kind: Either "episode" or "article".
+
+        Returns:
+            Dictionary with intermediate ID as key and number of hits as value.
+        """
+        with sqlite3.connect(self.db_file) as c:
+            rows = c.execute(
+                "SELECT proxy, SUM(hits) FROM hits WHERE kind=? "
+                "GROUP BY proxy ORDER BY SUM(hits) DESC",
+                (kind,)
+            )
+            return {proxy: hits for proxy, hits in rows}
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import os.path
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from utils.project_path import project_path
+from web_utils.local_image import LocalImage
+
+logger = logging.getLogger(__name__)
+
+
+ManifestEntry = namedtuple("ManifestEntry", [
+    "filename",
+    "output_hash",
+    "source_hash",
+    "etag",
+    "last_modified",
+    "variants",
+], defaults=((),))
+"""What we know about the local copy of one remote image.
+
+Attributes:
+    filename: Name of the local copy, inside the image directory.
+    output_hash: SHA-256 of the local copy, which filename is derived from.
+    source_hash: SHA-256 of the original image the local copy was created from.
+    etag: ETag header sent with the original image, or None.
+    last_modified: Last-Modified header sent with the original image, or None.
+    variants: Tuple of (size, format) tuples, for each variant which was
+        requested when the local copy was made.
+"""
+
+
+def _entry_filenames(entry: ManifestEntry) -> set:
+    """Filenames of the local copy and its variants."""
+    return {entry.filename} | {
+        LocalImage.variant_filename(entry.filename, size, image_format)
+        for size, image_format in entry.variants
+    }
+
+
+class ImageManifest:
+    """Record of which local copies have been made of which remote images.
+
+    The manifest lets process_images.py ask the remote server whether an image
+    has changed, skip processing when the same image is downloaded again, and
+    name each local copy after its content so an updated image gets a new URL.
+
+    The manifest is stored as a JSON file, which is replaced atomically when
+    saved. Only process_images.py should save it, the web application only
+    reads it.
+    """
+    def __init__(self, manifest_file: str, keep_replaced_for: float=86400.0):
+        """Create new instance of ImageManifest, with the contents of the given
+        file (if it exists).
+
+        Args:
+            manifest_file: Path to the JSON file the manifest is stored in.
+                Either absolute or relative to the repository root folder.
+            keep_replaced_for: Seconds to keep a local copy after it has been
+                replaced by a newer one, so feeds cached by clients and Nginx
+                keep working until they expire.
+        """
+        self.manifest_file = project_path(manifest_file)
+        self.keep_replaced_for = keep_replaced_for
+        self._lock = threading.Lock()
+        self._entries = dict()
+        """Dictionary with original URL as key and ManifestEntry as value."""
+        self._replaced = dict()
+        """Dictionary with filename of replaced local copies as key, and the
+        time (since the epoch) they were replaced as value."""
+        self.load()
+
+    def load(self) -> None:
+        """Read the manifest from file, replacing what is in memory."""
+        try:
+            with open(self.manifest_file, encoding="UTF-8") as manifest_file:
+                data = json.load(manifest_file)
+        except FileNotFoundError:
+            data = dict()
+        except ValueError:
+            logger.exception("Could not parse %s, ignoring its contents",
+                             self.manifest_file)
+            data = dict()
+
+        entries = dict()
+        for url, entry in data.get('images', dict()).items():
+            entry['variants'] = tuple(
+                tuple(variant) for variant in entry.get('variants', ())
+            )
+            entries[url] = ManifestEntry(**entry)
+        with self._lock:
+            self._entries = entries
+            self._replaced = dict(data.get('replaced', dict()))
+
+    def save(self) -> None:
+        """Write the manifest to file, atomically replacing the old one."""
+        with self._lock:
+            data = {
+                "images": {
+                    url: entry._asdict()
+                    for url, entry in sorted(self._entries.items())
+                },
+                "replaced": dict(sorted(self._replaced.items())),
+            }
+        directory = os.path.dirname(self.manifest_file)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="UTF-8") as temp_file:
+                json.dump(data, temp_file, indent=2)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.manifest_file)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def get(self, original_url: str):
+        """Get the ManifestEntry for the given image, or None if there is no
+        local copy of it."""
+        with self._lock:
+            return self._entries.get(original_url)
+
+    def items(self) -> list:
+        """List of (original URL, ManifestEntry) tuples for all images."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def record(self, original_url: str, entry: ManifestEntry) -> None:
+        """Save entry as the local copy of the given image.
+
+        If it replaces a local copy with another filename, the old files are
+        scheduled for removal by prune.
+        """
+        with self._lock:
+            old_entry = self._entries.get(original_url)
+            self._entries[original_url] = entry
+            for filename in _entry_filenames(entry):
+                self._replaced.pop(filename, None)
+            if old_entry:
+                now = time.time()
+                referenced = self._referenced_filenames()
+                for filename in _entry_filenames(old_entry) - referenced:
+                    self._replaced[filename] = now
+
+    def prune(self, image_directory: str) -> list:
+        """Remove local copies which were replaced long enough ago.
+
+        Args:
+            image_directory: Directory the local copies are saved in.
+
+        Returns:
+            List of the filenames which were removed.
+        """
+        now = time.time()
+        removed = []
+        with self._lock:
+            referenced = self._referenced_filenames()
+            for filename, replaced_at in list(self._replaced.items()):
+                if filename in referenced:
+                    del self._replaced[filename]
+                    continue
+                if now - replaced_at < self.keep_replaced_for:
+                    continue
+                try:
+                    os.remove(os.path.join(image_directory, filename))
+                except FileNotFoundError:
+                    pass
+                del self._replaced[filename]
+                removed.append(filename)
+        return removed
+
+    def _referenced_filenames(self) -> set:
+        filenames = set()
+        for entry in self._entries.values():
+            filenames |= _entry_filenames(entry)
+        return filenames
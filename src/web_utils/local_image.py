@@ -1,17 +1,18 @@
+import hashlib
 import logging
-import subprocess
+from collections import namedtuple
 from urllib.parse import urlparse, unquote
 import io
 import os.path
 import requests
 import stat
 import tempfile
+import time
 import warnings
 from warnings import warn
 
-from PIL import Image
+from PIL import Image, ImageFile
 from cached_property import threaded_cached_property as cached_property
-from flask import url_for
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -21,9 +22,30 @@ class ImageIsTooSmall(UserWarning):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+
+
+class ImageIsTooLarge(IOError):
+    """Raised when the original image is rejected before it has been downloaded completely."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
 warnings.simplefilter('error', Image.DecompressionBombWarning)
 
 
+RemoteImage = namedtuple("RemoteImage", ["data", "etag", "last_modified"])
+"""An original image as downloaded, with the headers used to check whether it has changed later."""
+
+ProcessedImage = namedtuple("ProcessedImage", ["data", "variants"])
+"""A processed image, with data being the full-size PNG and variants a dictionary with (size, format) as key and the
+contents of that variant as value."""
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    """Check whether image may have transparent pixels."""
+    return image.mode in ("RGBA", "LA", "PA", "RGBa", "La") or \
+        (image.mode == "P" and "transparency" in image.info)
+
+
 class LocalImage:
     image_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static", "images"))
     """Directory in which images are to be saved. Changes must be made before creating any instance of this class."""
@@ -32,13 +54,32 @@ class LocalImage:
     """Minimum width and height in pixels for images."""
     max_image_size = 3000
     """Maximum width and height in pixels for images."""
-
-    def __init__(self, original_url: str):
+    variant_formats = {
+        "png": (".png", "image/png", {"optimize": True}),
+        "jpeg": (".jpg", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+        "webp": (".webp", "image/webp", {"quality": 80, "method": 4}),
+    }
+    """Formats variants can be saved in, with their file extension, MIME type and options for Image.save."""
+    png_options = {"compress_level": 6, "optimize": False}
+    """Options for Image.save used for the full-size PNG images, trading time spent for file size."""
+    max_download_size = 20 * 1024 * 1024
+    """Maximum number of bytes to download for an original image."""
+    download_chunk_size = 64 * 1024
+    """Number of bytes to read at a time when downloading."""
+
+    def __init__(self, original_url: str, manifest=None):
+        """
+        Args:
+            original_url: URL of the remote image.
+            manifest: ImageManifest used to find the local copy of this image. Only the legacy filename is considered
+                when not given.
+        """
         self.original_url = original_url
+        self.manifest = manifest
 
     @cached_property
-    def filename(self) -> str:
-        """The filename of this image; or the filename it should have had if it existed locally."""
+    def stem(self) -> str:
+        """The filename of the original image, without extension."""
         return os.path.splitext(
             os.path.basename(
                 unquote(
@@ -47,71 +88,80 @@ class LocalImage:
                     ).path
                 )
             )
-        )[0] + ".png"
+        )[0]
 
     @cached_property
-    def path(self) -> str:
-        """The absolute path to a local copy of this image; or the path it should have had if it existed locally."""
-        return os.path.abspath(os.path.join(self.image_directory, self.filename))
-
-    def get_image_url(self) -> str:
-        """Get the absolute URL which is to be used for the given original image URL.
-
-            If a local copy exists for this image, the url for that is returned. If it does not, the original url is
-            returned untouched.
-            """
-        if self.local_copy_exists():
-            return self.url_to_local_image
-        else:
-            return self.original_url
+    def filename(self) -> str:
+        """The filename of this image; or the filename it should have had if it existed locally."""
+        entry = self.manifest.get(self.original_url) if self.manifest else None
+        if entry:
+            return entry.filename
+        return self.legacy_filename
 
     @cached_property
-    def url_to_local_image(self) -> str:
-        """Get the absolute URL for a local image with the given filename."""
-        # Assuming the image directory is directly beneath the static folder
-        return url_for("static", filename=os.path.join(os.path.basename(self.image_directory), self.filename),
-                       _external=True)
+    def legacy_filename(self) -> str:
+        """The filename used for local copies made before they were named by their content."""
+        return self.stem + ".png"
 
-    def local_copy_exists(self) -> bool:
-        """Returns true if a local image with the given filename exists."""
-        return os.path.exists(self.path)
+    def content_filename(self, output_hash: str) -> str:
+        """The filename to use for a local copy with the given SHA-256 hash, so a changed image gets a new URL."""
+        return "{}-{}.png".format(self.stem, output_hash[:16])
 
     @classmethod
-    def _process(cls, original_image, new_image, url: str= ""):
-        """Create a properly resized image.
-
-        Args:
-              original_image: File object with the original image.
-              new_image: File object in which the new, resized image is to be written.
-        """
+    def _create_processed_image(cls, original_image, url: str="") -> Image.Image:
+        """Open the original image, resize it and put it on a white background."""
         img = Image.open(original_image)
 
         new_width, new_height = cls._calculate_new_image_size(img, cls.min_image_size, cls.max_image_size, url)
+        if new_width < img.width and img.format == "JPEG":
+            # Let the JPEG decoder scale the image down by a power of two, which is much faster than decoding the full
+            # image. The image is never made smaller than the requested size.
+            img.draft("RGB", (new_width, new_height))
         # Skip resizing if there's no change in size
         new_img = cls._create_resized_image(img, round(new_width), round(new_height)) if (new_width, new_height) != img.size else img
-        new_img = cls._create_white_bg_image(new_img)
-        new_img.save(new_image, "png", optimize=True)
+        return cls._create_white_bg_image(new_img)
 
     @staticmethod
     def _create_resized_image(image: Image.Image, width: int, height: int) -> Image.Image:
         """Return a new copy of image, except it has the given width and height."""
         # While it might look like we could have used Image.thumbnail, it is not appropriate since the image
-        # might need to be upscaled
+        # might need to be upscaled.
+        if image.mode not in ("1", "L", "LA", "RGB", "RGBA"):
+            image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+        # Large reductions are first done with the BOX filter by a whole factor, leaving at least three times the
+        # requested size for LANCZOS. This is much faster than LANCZOS all the way and indistinguishable in the end
+        # result (it is what reducing_gap does in newer versions of Pillow).
+        factor = min(image.width // width, image.height // height) // 3
+        if factor > 1:
+            image = image.resize((-(-image.width // factor), -(-image.height // factor)), Image.BOX)
         return image.resize((width, height), Image.LANCZOS)
 
     @classmethod
     def _create_white_bg_image(cls, image: Image.Image) -> Image.Image:
+        """Put image in the middle of a white, square image.
+
+        Transparent parts of the image are made white. The result has no alpha channel.
+        """
         width, height = image.size
         new_width = max(width, height)
         new_height = new_width
-        white_img = Image.new("RGBA", (new_width, new_height), (255, 255, 255, 255))
+        if not _has_alpha(image):
+            image = image if image.mode == "RGB" else image.convert("RGB")
+            if width == height:
+                # Nothing to do
+                return image
+            white_img = Image.new("RGB", (new_width, new_height), (255, 255, 255))
+            white_img.paste(image, cls._find_middle_coordinates_pip(white_img.size, image.size))
+            return white_img
+
         if not image.mode == "RGBA":
             image = image.convert("RGBA")
+        white_img = Image.new("RGB", (new_width, new_height), (255, 255, 255))
         # Put original (potentially transparent) image over white background
         white_img.paste(
             image,
             cls._find_middle_coordinates_pip(white_img.size, image.size),
-            mask=image
+            mask=image.getchannel("A")
         )
         return white_img
 
@@ -203,30 +253,147 @@ class LocalImage:
 
         return new_width, new_height
 
-    def create_local_copy(self):
-        """Create a local, properly resized copy of this image."""
-        r = requests.get(self.original_url)
-        r.raise_for_status()
-        original_image = io.BytesIO(r.content)
+    @classmethod
+    def process_data(cls, data: bytes, url: str="", variants=(), png_options: dict=None) -> ProcessedImage:
+        """Create a properly resized image out of the given original image, along with smaller variants of it.
+
+        The original is only decoded once. This is CPU bound and does not depend on any instance, so it can be run in
+        another process.
+
+        Args:
+            data: Contents of the original image file.
+            url: URL of the original image, used in warnings.
+            variants: Iterable of (size, format) tuples, for each variant to create. Variants which would be larger
+                than the full-size image are skipped. See variant_formats for available formats.
+            png_options: Options for Image.save used for the full-size PNG image. Defaults to png_options. Pass them
+                explicitly when running in another process, since changes to the class attribute may not carry over.
+
+        Returns:
+            ProcessedImage with the contents of the new, resized PNG image and its variants.
+        """
+        with io.BytesIO(data) as original_image, io.BytesIO() as new_image:
+            img = cls._create_processed_image(original_image, url)
+            img.save(new_image, "png", **(cls.png_options if png_options is None else png_options))
+            return ProcessedImage(new_image.getvalue(), cls._create_variants(img, variants))
+
+    @classmethod
+    def _create_variants(cls, image: Image.Image, variants) -> dict:
+        """Create the given variants of the (square) image."""
+        results = dict()
+        # Scale down from the smallest image made so far which is still large enough, largest variants first
+        scaled = {image.width: image}
+        for size, image_format in sorted(variants, key=lambda v: v[0], reverse=True):
+            if size > image.width:
+                continue
+            if size not in scaled:
+                source = scaled[min(s for s in scaled if s >= size)]
+                scaled[size] = cls._create_resized_image(source, size, size)
+            variant = scaled[size]
+            extension, mime_type, options = cls.variant_formats[image_format]
+            if image_format == "jpeg" and variant.mode != "RGB":
+                variant = variant.convert("RGB")
+            with io.BytesIO() as variant_file:
+                variant.save(variant_file, image_format, **options)
+                results[(size, image_format)] = variant_file.getvalue()
+        return results
+
+    @classmethod
+    def variant_filename(cls, filename: str, size: int, image_format: str) -> str:
+        """The filename of the given variant of the local copy with the given filename."""
+        extension = cls.variant_formats[image_format][0]
+        return "{}-{}{}".format(os.path.splitext(filename)[0], size, extension)
+
+    def download_if_modified(self, session: requests.Session=None, timeout: float=None, entry=None):
+        """Fetch the original image, unless it is unchanged since the local copy was made.
+
+        Args:
+            session: Requests session to use, so connections can be reused across images.
+            timeout: Seconds to wait for the server before giving up, both for each response from the server and for the
+                whole download, so a server sending the image very slowly cannot keep us waiting forever.
+            entry: ManifestEntry describing the existing local copy. The image is downloaded unconditionally when not
+                given.
+
+        Returns:
+            RemoteImage, or None if the server reports that the image is unchanged.
 
-        # Write resized image to temporary file, before moving it to its intended location
-        new_image = None
+        Raises:
+            requests.Timeout: When the server does not answer, or the image is not downloaded in time.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        headers = dict()
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        with (session or requests).get(self.original_url, headers=headers, timeout=timeout, stream=True) as r:
+            if r.status_code == 304:
+                return None
+            r.raise_for_status()
+            data = self._read_capped(r, deadline)
+            return RemoteImage(data, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+    def _read_capped(self, response: requests.Response, deadline: float=None) -> bytes:
+        """Read the body of response, giving up as soon as it is clear the image cannot be used.
+
+        The image's header is parsed as soon as enough of it has arrived, so images with unusable dimensions are
+        rejected without downloading the rest of them. Reading stops with requests.Timeout when time.monotonic()
+        passes deadline.
+        """
+        max_size = self.max_download_size
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise ImageIsTooLarge("{url} is {size} bytes, which is more than the limit of {max} bytes"
+                                  .format(url=self.original_url, size=content_length, max=max_size))
+
+        data = bytearray()
+        parser = ImageFile.Parser()
+        probed = False
+        for chunk in response.iter_content(self.download_chunk_size):
+            if deadline is not None and time.monotonic() > deadline:
+                raise requests.Timeout("{url} was not downloaded in time".format(url=self.original_url))
+            data.extend(chunk)
+            if len(data) > max_size:
+                raise ImageIsTooLarge("{url} is more than the limit of {max} bytes"
+                                      .format(url=self.original_url, max=max_size))
+            if not probed:
+                parser.feed(chunk)
+                if parser.image is not None:
+                    self._check_dimensions(parser.image.size)
+                    probed = True
+        return bytes(data)
+
+    def _check_dimensions(self, size: tuple):
+        """Raise ImageIsTooLarge if an image of the given size should not be processed."""
+        width, height = size
+        if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+            raise ImageIsTooLarge("{url} is {width}x{height}, which has too many pixels to be processed safely"
+                                  .format(url=self.original_url, width=width, height=height))
+        if max(size) > self.max_image_size and min(size) < self.min_image_size:
+            raise ImageIsTooLarge("{url} is {width}x{height}, which is both too small and too big. Try to make it "
+                                  "into a square.".format(url=self.original_url, width=width, height=height))
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        """Hash used to identify the contents of an image file."""
+        return hashlib.sha256(data).hexdigest()
+
+    def save(self, data: bytes, filename: str):
+        """Save data as a local copy of this image, replacing any existing file with the same name.
+
+        Args:
+            data: Contents of the processed image.
+            filename: Name to save the image as, inside the image directory.
+        """
+        path = os.path.join(self.image_directory, filename)
+        # Write to a temporary file in the same directory, so it can be moved to its intended location atomically
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
         try:
-            new_image = tempfile.NamedTemporaryFile("w+b", delete=False)
-            # Write to the temporary file
-            self._process(original_image, new_image, self.original_url)
-            new_image.close()
-            original_image.close()
-            # Overwrite the possibly existing image, as an atomic action
-            subprocess.check_call(["mv", new_image.name, self.path])
-            os.chmod(self.path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH)
+            with os.fdopen(fd, "wb") as new_image:
+                new_image.write(data)
+            os.chmod(temp_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH)
+            # Overwrite the possibly existing image
+            os.replace(temp_path, path)
         except Exception:
-            if new_image:
-                os.remove(new_image.name)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             raise
-
-    def create_local_copy_if_not_exists(self):
-        """Create a local, properly resized copy of this image, if it doesn't exist already."""
-        if not self.local_copy_exists():
-            self.create_local_copy()
-
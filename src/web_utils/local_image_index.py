@@ -0,0 +1,144 @@
+import os
+import threading
+from urllib.parse import quote
+
+from cached_property import threaded_cached_property as cached_property
+from flask import request, url_for
+
+from web_utils.local_image import LocalImage
+
+
+class LocalImageIndex:
+    """In-memory index of the local copies of images, so finding the URL to
+    use for an image does not touch the filesystem.
+
+    The image directory is listed once, the first time the index is used. One
+    instance is created for every generation of data sources, so images
+    processed by process_images.py are picked up at the next refresh.
+    """
+    def __init__(self, manifest, feed_variant_format: str=None,
+                 image_directory: str=None):
+        """Create new instance of LocalImageIndex.
+
+        Args:
+            manifest: ImageManifest, used to find the local copy of images
+                which have been processed since it was introduced.
+            feed_variant_format: Format of the image variants to list in feeds.
+                No variants are listed when not given.
+            image_directory: Directory with the local copies. Defaults to
+                LocalImage.image_directory.
+        """
+        self.manifest = manifest
+        self.feed_variant_format = feed_variant_format
+        self.image_directory = image_directory or LocalImage.image_directory
+        self._variants_by_url = dict()
+        """Cache of lookups, with original URL as key and list of (filename,
+        size) for the variants to list in feeds as value."""
+        self._filename_by_url = dict()
+        """Cache of lookups, with original URL as key and the local copy's
+        filename (or None) as value."""
+        self._prefix_by_host = dict()
+        """Cache of the URL the images are found at, with the host URL of the
+        request as key."""
+        self._lock = threading.Lock()
+
+    @cached_property
+    def _existing_files(self) -> frozenset:
+        try:
+            return frozenset(os.listdir(self.image_directory))
+        except FileNotFoundError:
+            return frozenset()
+
+    @cached_property
+    def _manifest_entries(self) -> dict:
+        return dict(self.manifest.items())
+
+    def filename(self, original_url: str):
+        """Find the filename of the local copy of the given image.
+
+        Returns:
+            Filename inside the image directory, or None if there is no local
+            copy of this image.
+        """
+        try:
+            return self._filename_by_url[original_url]
+        except KeyError:
+            pass
+
+        entry = self._manifest_entries.get(original_url)
+        filename = entry.filename if entry else None
+        if filename is None:
+            # Local copies made before the manifest existed
+            filename = LocalImage(original_url).legacy_filename
+        if filename not in self._existing_files:
+            filename = None
+
+        with self._lock:
+            self._filename_by_url[original_url] = filename
+        return filename
+
+    def get_image_url(self, original_url: str) -> str:
+        """Get the absolute URL which is to be used for the given original
+        image URL.
+
+        Must be called while handling a request. If a local copy exists for
+        this image, the URL for that is returned. If it does not, the original
+        URL is returned untouched.
+        """
+        filename = self.filename(original_url)
+        if filename is None:
+            return original_url
+        return self._url_prefix() + quote(filename)
+
+    def get_variant_urls(self, original_url: str) -> list:
+        """Get the variants of the given image which are to be listed in
+        feeds.
+
+        Must be called while handling a request.
+
+        Returns:
+            List of (absolute URL, size in pixels) tuples, with the largest
+            variant first. Empty if there are no variants of this image.
+        """
+        try:
+            variants = self._variants_by_url[original_url]
+        except KeyError:
+            variants = self._find_variants(original_url)
+            with self._lock:
+                self._variants_by_url[original_url] = variants
+        if not variants:
+            return []
+        prefix = self._url_prefix()
+        return [(prefix + quote(filename), size)
+                for filename, size in variants]
+
+    def _find_variants(self, original_url: str) -> list:
+        entry = self._manifest_entries.get(original_url)
+        if not entry or self.filename(original_url) is None:
+            return []
+        variants = []
+        for size, image_format in entry.variants:
+            if image_format != self.feed_variant_format:
+                continue
+            filename = LocalImage.variant_filename(
+                entry.filename, size, image_format
+            )
+            if filename in self._existing_files:
+                variants.append((filename, size))
+        return sorted(variants, key=lambda v: v[1], reverse=True)
+
+    def _url_prefix(self) -> str:
+        host_url = request.host_url
+        try:
+            return self._prefix_by_host[host_url]
+        except KeyError:
+            pass
+        # Assuming the image directory is directly beneath the static folder
+        prefix = url_for(
+            "static",
+            filename=os.path.basename(self.image_directory) + "/",
+            _external=True
+        )
+        with self._lock:
+            self._prefix_by_host[host_url] = prefix
+        return prefix
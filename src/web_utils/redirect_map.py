@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import os.path
+import re
+import tempfile
+
+from werkzeug.urls import iri_to_uri
+
+from utils.project_path import project_path
+
+logger = logging.getLogger(__name__)
+
+
+UNSAFE_VALUE_PATTERN = re.compile(r'[\s"\'\\$;{}]')
+"""Characters which cannot be written to an Nginx map value as they are.
+Nginx would treat $ as the start of a variable, and the rest would end the
+value or the map. URLs with these are left for the application to redirect."""
+
+
+class RedirectMapExporter:
+    """Export the redirector's tables to files Nginx can use in a map, so
+    Nginx can answer the redirects without asking the application.
+
+    Rows are never changed or removed from the redirector's tables, so only
+    rows added since the last export need to be read. The last rowid written
+    for each table is kept in a state file between runs.
+    """
+    def __init__(self, redirector, map_files: dict, state_file: str):
+        """Create new instance of RedirectMapExporter.
+
+        Args:
+            redirector: Redirector whose tables are exported.
+            map_files: Dictionary with table name ("sound" or "article") as key
+                and path of the map file to write as value. Paths are either
+                absolute or relative to the repository root folder.
+            state_file: Path to the JSON file which remembers how far each map
+                file has come. Either absolute or relative to the repository
+                root folder.
+        """
+        self.redirector = redirector
+        self.map_files = {table: project_path(path)
+                          for table, path in map_files.items()}
+        self.state_file = project_path(state_file)
+
+    def export(self, full: bool=False) -> dict:
+        """Add rows which are new since the last export to the map files.
+
+        Args:
+            full: Write the map files from scratch instead of adding to them.
+
+        Returns:
+            Dictionary with table name as key and number of rows added to its
+            map file as value.
+        """
+        state = self._load_state()
+        added = dict()
+        for table, map_file in self.map_files.items():
+            after = state.get(table, 0)
+            _, max_rowid = self.redirector.get_version(table)
+            if full or not os.path.exists(map_file) or after > max_rowid:
+                # Starting over, or the database has been replaced
+                after = 0
+            added[table], state[table] = self._export_table(
+                table, map_file, after
+            )
+        self._write_atomically(
+            self.state_file,
+            json.dumps(state, indent=2, sort_keys=True).encode("UTF-8")
+        )
+        return added
+
+    def _export_table(self, table: str, map_file: str, after: int) \
+            -> (int, int):
+        lines = []
+        last_rowid = after
+        for rowid, proxy, original in self.redirector.iter_all(table, after):
+            last_rowid = rowid
+            line = self.format_entry(proxy, original)
+            if line is None:
+                logger.debug("Leaving %s %s to the application", table, proxy)
+                continue
+            lines.append(line)
+
+        if after and not lines:
+            # Nothing new, so leave the file (and its mtime) alone
+            return 0, last_rowid
+
+        existing = b""
+        if after:
+            with open(map_file, "rb") as old_file:
+                existing = old_file.read()
+        new = "".join(lines).encode("UTF-8")
+        self._write_atomically(map_file, existing + new)
+        return len(lines), last_rowid
+
+    @staticmethod
+    def format_entry(proxy: str, original: str):
+        """Create the line of the Nginx map which redirects the given
+        intermediate ID to the given URL.
+
+        Returns:
+            The line, ending with a newline, or None if the URL cannot be put
+            in an Nginx map.
+        """
+        value = iri_to_uri(original)
+        if UNSAFE_VALUE_PATTERN.search(value) or \
+                UNSAFE_VALUE_PATTERN.search(proxy):
+            return None
+        return '"{}" "{}";\n'.format(proxy, value)
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_file, encoding="UTF-8") as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return dict()
+        except ValueError:
+            logger.exception("Could not parse %s, exporting everything again",
+                             self.state_file)
+            return dict()
+
+    @staticmethod
+    def _write_atomically(path: str, data: bytes) -> None:
+        # Nginx may read the file at any time, so it must never see it half
+        # written
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
@@ -1,9 +1,103 @@
 import sqlite3
 import hashlib
+import logging
+import threading
+from contextlib import closing
 import base64
 import os.path
 import urllib.parse
 
+logger = logging.getLogger(__name__)
+
+
+TABLES = ("sound", "article")
+"""Names of the tables with intermediate IDs."""
+
+
+class RedirectTables:
+    """In-memory copy of the Redirector's tables, shared by the Redirectors of
+    all generations in a process.
+
+    The tables are loaded by a background thread the first time a Redirector
+    needs them, and later only the rows added since the last time are read,
+    so no request waits for the whole tables to be read. Processes which never
+    create or redirect intermediate IDs never load them.
+    """
+    def __init__(self):
+        self._original_by_proxy = {table: dict() for table in TABLES}
+        """Intermediate ID as key and original URL as value, for each
+        table."""
+        self._proxy_by_original = {table: dict() for table in TABLES}
+        """Original URL as key and intermediate ID as value, for each
+        table."""
+        self._last_rowids = {table: 0 for table in TABLES}
+        """The largest rowid read from each table so far."""
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the tables have been read from the database."""
+        return self._loaded.is_set()
+
+    def get_proxy(self, table: str, original_url: str):
+        """Get the intermediate ID for the original URL, or None if it is not
+        in the copy."""
+        return self._proxy_by_original[table].get(original_url)
+
+    def get_original(self, table: str, proxy: str):
+        """Get the original URL for the intermediate ID, or None if it is not
+        in the copy."""
+        return self._original_by_proxy[table].get(proxy)
+
+    def add(self, table: str, proxy: str, original_url: str) -> None:
+        """Add the pair to the copy, unless one of them is in it already."""
+        with self._lock:
+            self._proxy_by_original[table].setdefault(original_url, proxy)
+            self._original_by_proxy[table].setdefault(proxy, original_url)
+
+    def update_in_background(self, redirector) -> None:
+        """Start reading the rows added since the last update (or all rows,
+        the first time) in a background thread, unless one is running
+        already.
+
+        Args:
+            redirector: Redirector to read the rows with.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._update_logging_errors,
+                args=(redirector,),
+                name="RedirectTables",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def update(self, redirector) -> None:
+        """Read the rows added since the last update, or all rows the first
+        time.
+
+        Args:
+            redirector: Redirector to read the rows with.
+        """
+        with self._update_lock:
+            for table in TABLES:
+                rows = redirector.iter_all(table, self._last_rowids[table])
+                for rowid, proxy, original_url in rows:
+                    self.add(table, proxy, original_url)
+                    self._last_rowids[table] = rowid
+            self._loaded.set()
+
+    def _update_logging_errors(self, redirector):
+        try:
+            self.update(redirector)
+        except sqlite3.Error:
+            logger.exception("Could not read the intermediate IDs")
+
 
 class Redirector:
     """Class responsible for translating between original URLs and our proxy
@@ -15,6 +109,8 @@ class Redirector:
             article_redirect_endpoint,
             sound_redirect_endpoint,
             url_for_func,
+            flush_interval: float=1.0,
+            tables: RedirectTables=None,
     ):
         """Create new instance of Redirector, used for translation between
         original URLs for sounds and articles, and our intermediate URLs. Used
@@ -35,12 +131,26 @@ class Redirector:
                 ID used to look up the episode sound file's original URL;
                 title, the original filename for the episode.
             url_for_func: Flask's url_for function.
+            flush_interval: Seconds between each time new intermediate IDs
+                are saved to the database.
+            tables: In-memory copy of the tables, kept from the previous
+                generation. A new one is created when not given.
         """
         self.db_file = self.create_db_file_path(db_file)
         self.url_service = url_service
         self.article_redirect_endpoint = article_redirect_endpoint
         self.sound_redirect_endpoint = sound_redirect_endpoint
         self.url_for = url_for_func
+        self.flush_interval = flush_interval
+        self.tables = tables or RedirectTables()
+        """In-memory copy of the tables, used instead of the database."""
+        self._pending = {table: dict() for table in TABLES}
+        """New intermediate IDs not yet saved, with table name as key and a
+        dictionary with intermediate ID as key and original URL as value."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
 
     @staticmethod
     def create_db_file_path(db_file):
@@ -62,6 +172,9 @@ class Redirector:
             The URL at which the episode sound file can be found, or None if
             the episode was not recognized.
         """
+        pending = self._get_pending_original("sound", episode)
+        if pending:
+            return pending
         with sqlite3.connect(self.db_file) as c:
             r = c.execute("SELECT original FROM sound WHERE proxy=?", (episode,))
             row = r.fetchone()
@@ -81,6 +194,9 @@ class Redirector:
             The URL at which the article can be found, or None if the article
             was not recognized.
         """
+        pending = self._get_pending_original("article", article)
+        if pending:
+            return pending
         with sqlite3.connect(self.db_file) as c:
             r = c.execute("SELECT original FROM article WHERE proxy=?", (article,))
             row = r.fetchone()
@@ -104,17 +220,8 @@ class Redirector:
             Intermediate URL listeners should use to access this episode's
             sound file.
         """
-        with sqlite3.connect(self.db_file) as c:
-            try:
-                r = c.execute("SELECT proxy FROM sound WHERE original=?", (original_url,))
-                row = r.fetchone()
-                if not row:
-                    raise KeyError(episode.media.url)
-                return self._get_redirect_url_for_sound(episode, row[0])
-            except KeyError:
-                new_uri = self._get_url_hash(original_url)
-                e = c.execute("INSERT INTO sound (original, proxy) VALUES (?, ?)", (original_url, new_uri))
-                return self._get_redirect_url_for_sound(episode, new_uri)
+        proxy = self.get_proxy("sound", original_url)
+        return self._get_redirect_url_for_sound(episode, proxy)
 
     def _get_redirect_url_for_sound(self, episode, identifier):
         """Utility function for obtaining the intermediate URL for an episode,
@@ -147,30 +254,8 @@ class Redirector:
             Intermediate URL listeners should use to acces this episode's
             article.
         """
-        show = episode.show
-        try:
-            with sqlite3.connect(self.db_file) as c:
-                try:
-                    r = c.execute(
-                        "SELECT proxy FROM article WHERE original=?",
-                        (original_url,)
-                    )
-                    row = r.fetchone()
-                    if not row:
-                        raise KeyError(episode.link)
-                    return self._get_redirect_url_for_article(row[0], show)
-                except KeyError:
-                    new_uri = self._get_url_hash(original_url)
-                    e = c.execute(
-                        "INSERT INTO article (original, proxy) VALUES (?, ?)",
-                        (original_url, new_uri)
-                    )
-                    return self._get_redirect_url_for_article(new_uri, show)
-        except sqlite3.IntegrityError:
-            # Either the entry was added by someone else between the SELECT
-            # and the INSERT, or the uuid was duplicate.
-            # Trying again should resolve both issues.
-            return self.get_redirect_article(original_url, episode)
+        proxy = self.get_proxy("article", original_url)
+        return self._get_redirect_url_for_article(proxy, episode.show)
 
     def _get_redirect_url_for_article(self, identifier, show):
         """Utility function for obtaining the intermediate URL for an episode's
@@ -182,6 +267,108 @@ class Redirector:
             _external=True
         )
 
+    def get_proxy(self, table: str, original_url: str) -> str:
+        """Get the intermediate ID for an original URL, creating it if it is
+        new.
+
+        The in-memory copy of both tables is used (see RedirectTables). Until
+        it has been loaded, URLs which are not in it are looked up in the
+        database one by one. New intermediate IDs are saved to the database in
+        the background, see flush.
+
+        Args:
+            table: Either "sound" or "article".
+            original_url: The URL to get an intermediate ID for.
+
+        Returns:
+            The intermediate ID used for the original URL.
+        """
+        proxy = self.tables.get_proxy(table, original_url)
+        if proxy is not None:
+            return proxy
+        if not self.tables.is_loaded:
+            self.tables.update_in_background(self)
+            proxy = self._get_saved_proxy(table, original_url)
+            if proxy is not None:
+                self.tables.add(table, proxy, original_url)
+                return proxy
+
+        # Older rows may use other IDs, but new ones are always the hash
+        proxy = self._get_url_hash(original_url)
+        self.tables.add(table, proxy, original_url)
+        with self._lock:
+            self._pending[table][proxy] = original_url
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="Redirector",
+                    daemon=True,
+                )
+                self._thread.start()
+        if self._closed.is_set():
+            # Created after close, so no thread will save it for us
+            self.flush()
+        return proxy
+
+    def _get_saved_proxy(self, table, original_url):
+        self._check_table(table)
+        with closing(sqlite3.connect(self.db_file)) as c:
+            row = c.execute(
+                "SELECT proxy FROM {} WHERE original=?".format(table),
+                (original_url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _get_pending_original(self, table, proxy):
+        with self._lock:
+            return self._pending[table].get(proxy)
+
+    def flush(self):
+        """Save all new intermediate IDs to the database.
+
+        Other processes cannot redirect the new IDs until they are saved, so
+        this is done every flush_interval seconds by a background thread.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {table: dict() for table in TABLES}
+            if not any(pending.values()):
+                return
+            try:
+                with sqlite3.connect(self.db_file, timeout=30) as c:
+                    for table, rows in pending.items():
+                        # The same URL may have been added by another
+                        # process in the meantime, with the same ID
+                        c.executemany(
+                            "INSERT OR IGNORE INTO {} (original, proxy) "
+                            "VALUES (?, ?)".format(table),
+                            [(original, proxy)
+                             for proxy, original in rows.items()]
+                        )
+            except sqlite3.Error:
+                logger.exception(
+                    "Could not save %d intermediate IDs, will try again",
+                    sum(len(rows) for rows in pending.values())
+                )
+                with self._lock:
+                    for table, rows in pending.items():
+                        for proxy, original in rows.items():
+                            self._pending[table].setdefault(proxy, original)
+
+    def close(self):
+        """Stop the background thread, and save all new intermediate IDs."""
+        self._closed.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
     def _get_url_hash(self, original_url):
         """Generate deterministic intermediate identifier, using the original
         URL."""
@@ -207,6 +394,83 @@ class Redirector:
         """
         return self._get_all("article")
 
+    def get_cached_original(self, table: str, proxy: str):
+        """Look up the original URL for an intermediate ID without querying
+        the database.
+
+        The in-memory copy of both tables is used (see RedirectTables), so
+        rows added by other processes since it was last updated are not
+        found. The first call starts loading it in the background. Use
+        get_original_sound or get_original_article when this returns None.
+
+        Args:
+            table: Either "sound" or "article".
+            proxy: Intermediate ID to look up.
+
+        Returns:
+            The original URL, or None if it was not found in memory.
+        """
+        if not self.tables.is_loaded:
+            self.tables.update_in_background(self)
+        return self.tables.get_original(table, proxy)
+
+    def get_version(self, table: str) -> (int, int):
+        """Get numbers which change whenever rows are added to the table.
+
+        Args:
+            table: Either "sound" or "article".
+
+        Returns:
+            Tuple of the number of rows and the largest rowid in the table.
+        """
+        self._check_table(table)
+        with sqlite3.connect(self.db_file) as c:
+            count, max_rowid = c.execute(
+                "SELECT COUNT(*), MAX(rowid) FROM {}".format(table)
+            ).fetchone()
+        return count, max_rowid or 0
+
+    def iter_all(self, table: str, after: int=0, limit: int=None,
+                 batch_size: int=500):
+        """Iterate over the rows of the table, without loading all of them
+        into memory.
+
+        Rows are ordered by their rowid, so a consumer can continue where it
+        left off by passing the last rowid it saw as after.
+
+        Args:
+            table: Either "sound" or "article".
+            after: Only include rows with a rowid larger than this.
+            limit: Maximum number of rows to include. All rows are included
+                when not given.
+            batch_size: Number of rows to fetch from the database at a time.
+
+        Yields:
+            Tuple of rowid, intermediate ID and original URL.
+        """
+        self._check_table(table)
+        query = "SELECT rowid, proxy, original FROM {} WHERE rowid > ? " \
+                "ORDER BY rowid".format(table)
+        parameters = (after,)
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters += (limit,)
+        # The generator may be abandoned, so make sure the connection is closed
+        with closing(sqlite3.connect(self.db_file)) as c:
+            cursor = c.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    @staticmethod
+    def _check_table(table):
+        # Table names cannot be passed as parameters, so guard against
+        # injection
+        if table not in TABLES:
+            raise ValueError("Unknown table {!r}".format(table))
+
     def _get_all(self, table):
         result = dict()
         with sqlite3.connect(self.db_file) as c:
@@ -0,0 +1,215 @@
+import fcntl
+import hashlib
+import logging
+import os
+import os.path
+import pickle
+import tempfile
+import threading
+import time
+
+from utils.metrics import CACHE_REQUESTS
+from utils.project_path import project_path
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """A computation in progress, which other threads can wait for."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight:
+    """Class which lets only one caller compute a value at a time, while
+    concurrent callers asking for the same key wait for and share its result.
+
+    One instance is created for every generation of data sources, so results
+    are never shared between generations. Worker processes refresh their data
+    sources independently, so across processes, generations are identified by
+    a number which all processes refreshing around the same time agree on.
+    """
+    def __init__(self, lock_dir: str=None, generation: int=0):
+        """Create new instance of SingleFlight.
+
+        Args:
+            lock_dir: Directory used to coordinate with other worker processes,
+                either absolute or relative to the repository root folder.
+                Lock files ensure only one process computes a value, and the
+                result is left there for the processes that waited. Set to None
+                to only coordinate threads in this process.
+            generation: Number identifying the generation of data sources,
+                which only processes using the same generation share results
+                in. Must increase with every generation. Files left behind by
+                generations older than the previous one are removed.
+        """
+        self.lock_dir = project_path(lock_dir) if lock_dir else None
+        self.generation = generation
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._remove_old_files()
+        self._calls = dict()
+        self._calls_lock = threading.Lock()
+
+    def do(self, key, func, on_result=None):
+        """Call func and return its result, unless another caller is already
+        doing so for the same key, in which case we wait for their result.
+
+        Args:
+            key: Hashable object identifying the value func computes, within
+                this generation. Its repr is used to identify the value across
+                processes.
+            func: Function which computes the value when called without
+                arguments. Its result must be picklable if lock_dir is used.
+            on_result: Function which is called with the value, before other
+                callers can start a new call for the same key. Use it to cache
+                the value, so no caller misses both the cache and the call.
+
+        Returns:
+            The value computed by func, either by this or another caller.
+
+        Raises:
+            Whatever func raised, also for callers that waited for it.
+        """
+        with self._calls_lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            CACHE_REQUESTS.labels("single_flight", "hit").inc()
+            logger.debug("Waiting for ongoing computation of %r", key)
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        CACHE_REQUESTS.labels("single_flight", "miss").inc()
+        try:
+            if self.lock_dir:
+                call.result = self._do_across_processes(key, func)
+            else:
+                call.result = func()
+            if on_result is not None:
+                on_result(call.result)
+            return call.result
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._calls_lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_across_processes(self, key, func):
+        """Call func while holding the lock file for key, or use the result
+        of another process if it held the lock when we arrived.
+
+        Processes which may wait for the result hold a shared lock on a second
+        file while doing so. The result is only left behind when some process
+        holds that lock, and the last process to read the result removes it.
+        """
+        name = "{}-{}".format(
+            self.generation,
+            hashlib.md5(repr(key).encode("UTF-8")).hexdigest()
+        )
+        lock_path = os.path.join(self.lock_dir, name + ".lock")
+        waiting_path = os.path.join(self.lock_dir, name + ".waiting")
+        result_path = os.path.join(self.lock_dir, name + ".result")
+
+        arrived_at = time.time()
+        # The locks are released when the files are closed
+        with open(waiting_path, "a") as waiting_file, \
+                open(lock_path, "a") as lock_file:
+            # Announce that we may wait, before checking whether we must
+            fcntl.flock(waiting_file, fcntl.LOCK_SH)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is computing this value right now
+                logger.debug("Waiting for other process computing %r", key)
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                try:
+                    result = self._read_result(result_path, arrived_at)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    # The other process failed, so try ourselves
+                    logger.debug("No result left for %r", key, exc_info=True)
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                else:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    if self._is_last(waiting_file):
+                        self._remove(result_path)
+                    return result
+            fcntl.flock(waiting_file, fcntl.LOCK_UN)
+
+            result = func()
+            if self._is_last(waiting_file):
+                # Nobody is waiting for the result
+                self._remove(result_path)
+                return result
+            try:
+                self._write_result(result_path, result)
+            except (OSError, pickle.PicklingError):
+                logger.warning("Could not share the result for %r with other "
+                               "processes", key, exc_info=True)
+            return result
+
+    @staticmethod
+    def _read_result(result_path: str, newer_than: float):
+        """Load result stored at result_path, if it was stored after
+        newer_than (seconds since the epoch). Raise OSError otherwise."""
+        with open(result_path, "rb") as result_file:
+            if os.fstat(result_file.fileno()).st_mtime < newer_than:
+                raise FileNotFoundError("Result in {} is stale"
+                                        .format(result_path))
+            return pickle.load(result_file)
+
+    @staticmethod
+    def _is_last(waiting_file) -> bool:
+        """Check whether no other process holds a shared lock on
+        waiting_file, letting go of our own shared lock first."""
+        fcntl.flock(waiting_file, fcntl.LOCK_UN)
+        try:
+            fcntl.flock(waiting_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_result(self, result_path: str, result) -> None:
+        """Store result at result_path, as an atomic action."""
+        with tempfile.NamedTemporaryFile(
+                "wb", dir=self.lock_dir, prefix="{}-".format(self.generation),
+                suffix=".tmp", delete=False
+        ) as temp_file:
+            try:
+                pickle.dump(result, temp_file, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                os.remove(temp_file.name)
+                raise
+        os.replace(temp_file.name, result_path)
+
+    def _remove_old_files(self) -> None:
+        """Remove the lock and result files of generations older than the
+        previous one, which no process uses anymore. Results are only left
+        behind if a process died while waiting for them."""
+        for file_name in os.listdir(self.lock_dir):
+            if not file_name.endswith(
+                    (".lock", ".waiting", ".result", ".tmp")
+            ):
+                continue
+            generation, separator, _ = file_name.partition("-")
+            if separator and generation.isdigit() and \
+                    int(generation) >= self.generation - 1:
+                continue
+            self._remove(os.path.join(self.lock_dir, file_name))
@@ -62,6 +62,21 @@ class SlugListFactory:
             return SlugList.from_id(digas_id, conn)
         return self._with_conn_close_on_exception(do_from_id)
 
+    def get_all_slugs(self) -> dict:
+        """Get every slug in the database.
+
+        Returns:
+            Dictionary with slug as key and the canonical slug it points to as
+            value. Canonical slugs point to themselves.
+        """
+        def do_get_all_slugs(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT slug, canonical_slug FROM slug_to_slug;"
+                )
+                return dict(cursor.fetchall())
+        return self._with_connection(do_get_all_slugs)
+
     def create(self, digas_id: int, *slug, last_modified=None, connection=None):
         return SlugList(
             digas_id,
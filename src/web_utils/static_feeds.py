@@ -0,0 +1,262 @@
+import logging
+import os
+import os.path
+import tempfile
+
+from utils.project_path import project_path
+from web_utils.redirect_map import RedirectMapExporter
+
+logger = logging.getLogger(__name__)
+
+
+FEED_FILES = {
+    "feed.xml": "application/xml",
+    "feed.html": "text/html",
+}
+"""Names of the files each feed is written to, with the media type requested
+for each: the feed itself, and the preview shown to browsers. The files are
+put in a folder named after the path of the feed. Feeds cannot be files named
+after their path, since the path of one feed may be the folder of another
+(like /show and /show/archive/1)."""
+
+CONTENT_CODING_SUFFIXES = {
+    "gzip": ".gz",
+    "br": ".br",
+}
+"""Suffix of the file with the compressed feed, for each content coding. These
+are the suffixes Nginx looks for with gzip_static and brotli_static."""
+
+
+def feed_path(slug: str, pipeline: str=None, page: int=None) -> str:
+    """Get the path of the feed for the given show, like url_for_feed in
+    views.web_feed does, but without a request context.
+
+    Args:
+        slug: Canonical slug of the show.
+        pipeline: Name of the pipeline, or None for the default pipeline.
+        page: Number of the archive page, or None for the current feed.
+
+    Returns:
+        The path, starting with a slash.
+    """
+    path = "/{}".format(slug)
+    if pipeline:
+        path = "/{}{}".format(pipeline, path)
+    if page is not None:
+        path = "{}/archive/{}".format(path, page)
+    return path
+
+
+def feed_redirects(slugs: dict, all_episodes_aliases: list,
+                   pipelines: list) -> dict:
+    """Find the redirects the application makes from old slugs to the feeds.
+
+    Args:
+        slugs: Dictionary with slug as key and the canonical slug it points to
+            as value, see SlugListFactory.get_all_slugs.
+        all_episodes_aliases: Show names which redirect to the feed with all
+            episodes.
+        pipelines: Pipelines the feeds are available with, with None for the
+            default pipeline.
+
+    Returns:
+        Dictionary with the path to redirect from as key and the path to
+        redirect to as value.
+    """
+    redirects = dict()
+    for pipeline in pipelines:
+        for slug, canonical_slug in slugs.items():
+            if slug != canonical_slug:
+                redirects[feed_path(slug, pipeline)] = \
+                    feed_path(canonical_slug, pipeline)
+        for alias in all_episodes_aliases:
+            redirects[feed_path(alias, pipeline)] = "/all"
+    return redirects
+
+
+class StaticFeedExporter:
+    """Write the feeds to files, so Nginx can serve them without asking the
+    application.
+
+    The feeds are rendered by the application itself, through a test client,
+    so they are identical to the ones the application serves. Each feed and
+    its HTML preview is written uncompressed, and compressed with every
+    content coding the application uses, next to each other. Files are only
+    replaced when their contents have changed, and always through an atomic
+    rename, so Nginx never serves a half written feed.
+    """
+    def __init__(self, client, base_url: str, directory: str,
+                 redirects_file: str):
+        """Create new instance of StaticFeedExporter.
+
+        Args:
+            client: Flask test client of an application with the feed routes.
+            base_url: URL the feeds are served from, like
+                https://podkast.radiorevolt.no/. Links in the feeds use it.
+            directory: Folder to write the feeds to. Either absolute or
+                relative to the repository root folder.
+            redirects_file: Path to the Nginx map file with redirects to the
+                feeds. Either absolute or relative to the repository root
+                folder.
+        """
+        self.client = client
+        self.base_url = base_url
+        self.directory = project_path(directory)
+        self.redirects_file = project_path(redirects_file)
+        self.num_exported = 0
+        """Number of feeds exported so far."""
+        self.num_changed = 0
+        """Number of files which were written because they had changed."""
+        self.failed = []
+        """Paths of feeds which could not be rendered."""
+        self._kept = set()
+        """Files which belong to this export, and must not be pruned."""
+
+    def export_feed(self, path: str) -> bool:
+        """Render the feed at path and write it to files.
+
+        If the application fails to render the feed, the files from the last
+        export are kept and path is added to failed.
+
+        Args:
+            path: Path of the feed, like /show or /all.
+
+        Returns:
+            True if the feed exists, False if the application answered with
+            something other than a feed (like a 404 or a redirect).
+        """
+        feed_directory = self._feed_directory(path)
+        response = self.client.get(path, base_url=self.base_url)
+        if response.status_code >= 500:
+            logger.error("%s gave status %d, keeping the old files", path,
+                         response.status_code)
+            self.failed.append(path)
+            self._kept.update(os.path.join(feed_directory, file_name)
+                              for file_name in self._file_names())
+            return True
+        if response.status_code != 200:
+            return False
+
+        for file_name, media_type in FEED_FILES.items():
+            feed_file = os.path.join(feed_directory, file_name)
+            response = self.client.get(
+                path,
+                base_url=self.base_url,
+                headers={"Accept": media_type},
+            )
+            self.num_changed += self._write_if_changed(feed_file,
+                                                       response.get_data())
+            for content_coding, suffix in CONTENT_CODING_SUFFIXES.items():
+                response = self.client.get(
+                    path,
+                    base_url=self.base_url,
+                    headers={
+                        "Accept": media_type,
+                        "Accept-Encoding": content_coding,
+                    },
+                )
+                if response.headers.get("Content-Encoding") == \
+                        content_coding:
+                    self.num_changed += self._write_if_changed(
+                        feed_file + suffix, response.get_data()
+                    )
+        self.num_exported += 1
+        return True
+
+    def export_show(self, slug: str, pipeline: str=None,
+                    paged: bool=False) -> None:
+        """Export the feed for the given show, and its archive pages.
+
+        Args:
+            slug: Canonical slug of the show.
+            pipeline: Name of the pipeline, or None for the default pipeline.
+            paged: Whether the feeds are split into pages, so there may be
+                archive pages to export.
+        """
+        if not self.export_feed(feed_path(slug, pipeline)) or not paged:
+            return
+        page = 1
+        while self.export_feed(feed_path(slug, pipeline, page)):
+            page += 1
+
+    def export_redirects(self, redirects: dict) -> bool:
+        """Write the Nginx map file with the given redirects.
+
+        Args:
+            redirects: Dictionary with the path to redirect from as key and
+                the path to redirect to as value.
+
+        Returns:
+            True if the map file was changed, so Nginx must be reloaded.
+        """
+        lines = []
+        for path, target in sorted(redirects.items()):
+            line = RedirectMapExporter.format_entry(path, target)
+            if line is None:
+                logger.debug("Leaving the redirect from %s to the "
+                             "application", path)
+                continue
+            lines.append(line)
+        return self._write_if_changed(self.redirects_file,
+                                      "".join(lines).encode("UTF-8"))
+
+    def prune(self) -> int:
+        """Remove the feeds which were not exported this time, like feeds for
+        shows which have been removed or renamed.
+
+        Returns:
+            Number of files removed.
+        """
+        feed_file_names = set(self._file_names())
+        num_removed = 0
+        for directory, _, file_names in \
+                os.walk(self.directory, topdown=False):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if file_name in feed_file_names and path not in self._kept:
+                    os.remove(path)
+                    num_removed += 1
+            if directory != self.directory and not os.listdir(directory):
+                os.rmdir(directory)
+        return num_removed
+
+    @staticmethod
+    def _file_names():
+        for file_name in FEED_FILES:
+            yield file_name
+            for suffix in CONTENT_CODING_SUFFIXES.values():
+                yield file_name + suffix
+
+    def _feed_directory(self, path: str) -> str:
+        feed_directory = os.path.normpath(
+            os.path.join(self.directory, path.lstrip("/"))
+        )
+        if not feed_directory.startswith(self.directory + os.sep):
+            raise ValueError("The feed at {} would be written outside of {}"
+                             .format(path, self.directory))
+        return feed_directory
+
+    def _write_if_changed(self, path: str, data: bytes) -> bool:
+        self._kept.add(path)
+        try:
+            with open(path, "rb") as old_file:
+                if old_file.read() == data:
+                    # Leave the file (and its mtime, used by Nginx for
+                    # Last-Modified and ETag) alone
+                    return False
+        except FileNotFoundError:
+            pass
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".",
+                                         suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return True
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+
+import requests
+
+from utils.project_path import project_path
+
+logger = logging.getLogger(__name__)
+
+
+LAST_BUILD_DATE_PATTERN = re.compile(rb"<lastBuildDate>[^<]*</lastBuildDate>")
+"""Pattern matching the element with the time the feed was rendered, which
+changes every time even though nothing else has."""
+
+
+def content_digest(body: bytes) -> str:
+    """Get a digest of the contents of the feed, which only changes when
+    something in the feed has changed.
+
+    Args:
+        body: The feed, encoded as UTF-8.
+
+    Returns:
+        Hexadecimal SHA-1 digest of the feed, without its lastBuildDate.
+    """
+    return hashlib.sha1(LAST_BUILD_DATE_PATTERN.sub(b"", body)).hexdigest()
+
+
+class WebSubPublisher:
+    """Class which tells a WebSub hub when feeds have changed, so subscribers
+    can learn about new episodes without polling the feeds.
+
+    Every feed which is rendered is compared with the last version seen, using
+    a digest of its contents kept in a database shared by all worker
+    processes, so only the process which first renders a changed feed notifies
+    the hub. Both the comparison and the notification are done by a background
+    thread, so rendering never waits for the database or the hub.
+    """
+    def __init__(
+            self,
+            db_file: str,
+            hub_url: str,
+            base_url: str,
+            requests_session: requests.Session,
+            timeout: float=10.0
+    ):
+        """Create new instance of WebSubPublisher.
+
+        Args:
+            db_file: Path to the sqlite3 database file to save the digests in.
+                Either absolute or relative to the repository root folder.
+            hub_url: URL of the WebSub hub, or None to not use WebSub.
+            base_url: URL the feeds are served from. Feeds rendered for other
+                hosts (like the request made when the application starts) are
+                not announced.
+            requests_session: Object to use when notifying the hub.
+            timeout: Seconds to wait for the hub to answer.
+        """
+        self.db_file = project_path(db_file)
+        self.hub_url = hub_url
+        self.base_url = base_url
+        self.requests = requests_session
+        self.timeout = timeout
+        self._pending = dict()
+        """Topics which have not been compared with the database yet, with
+        the digest of their new contents as value."""
+        self._queued = dict()
+        """The digest last queued for each topic by this process, so feeds
+        which have not changed are not queued again."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def init_db(self):
+        """Initialize the database file used by WebSubPublisher. Can be called
+        independently of whether the database is set up already or not."""
+        with sqlite3.connect(self.db_file) as c:
+            c.execute("CREATE TABLE IF NOT EXISTS feeds ("
+                      "topic text PRIMARY KEY, "
+                      "digest text NOT NULL)")
+
+    def feed_rendered(self, topic: str, body: bytes) -> bool:
+        """Queue the feed to be compared with the last version seen, so the
+        hub can be notified if it has changed.
+
+        Only the digest is computed here. The database is used by the
+        background thread, so rendering never waits for it.
+
+        Args:
+            topic: URL of the feed.
+            body: The feed which was rendered, encoded as UTF-8.
+
+        Returns:
+            True if the feed was queued, False if it is not announced or this
+            process has queued the same contents already.
+        """
+        if not self.hub_url or not topic.startswith(self.base_url):
+            return False
+        digest = content_digest(body)
+        with self._lock:
+            if self._closed.is_set() or self._queued.get(topic) == digest:
+                # After close, the publisher of the next generation takes
+                # care of the feed
+                return False
+            self._queued[topic] = digest
+            self._pending[topic] = digest
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="WebSubPublisher",
+                    daemon=True,
+                )
+                self._thread.start()
+        self._wake.set()
+        return True
+
+    def flush(self):
+        """Check the feeds queued so far, and notify the hub about the ones
+        which have changed."""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = dict()
+            for topic, digest in pending.items():
+                if not self._has_changed(topic, digest):
+                    continue
+                if not self._publish(topic):
+                    self._forget(topic, digest)
+
+    def close(self):
+        """Stop the background thread, and notify the hub about all feeds
+        which have changed so far."""
+        self._closed.set()
+        self._wake.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+
+    def _has_changed(self, topic: str, digest: str) -> bool:
+        try:
+            with sqlite3.connect(self.db_file, timeout=30) as c:
+                # Both statements run in the same transaction, so only one
+                # process sees the change. Upserts (ON CONFLICT DO UPDATE)
+                # would do it in one, but need SQLite 3.24
+                cursor = c.execute(
+                    "INSERT OR IGNORE INTO feeds (topic, digest) "
+                    "VALUES (?, ?)",
+                    (topic, digest)
+                )
+                if cursor.rowcount <= 0:
+                    cursor = c.execute(
+                        "UPDATE feeds SET digest=? "
+                        "WHERE topic=? AND digest!=?",
+                        (digest, topic, digest)
+                    )
+                return cursor.rowcount > 0
+        except sqlite3.Error:
+            logger.exception("Could not check whether %s has changed", topic)
+            self._unqueue(topic, digest)
+            return False
+
+    def _publish(self, topic: str) -> bool:
+        try:
+            response = self.requests.post(
+                self.hub_url,
+                data={"hub.mode": "publish", "hub.url": topic},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            logger.exception("Could not notify %s that %s has changed",
+                             self.hub_url, topic)
+            return False
+        logger.debug("Notified %s that %s has changed", self.hub_url, topic)
+        return True
+
+    def _unqueue(self, topic: str, digest: str):
+        # Make the next rendering of the feed queue it again
+        with self._lock:
+            if self._queued.get(topic) == digest:
+                del self._queued[topic]
+
+    def _forget(self, topic: str, digest: str):
+        # Make the next rendering of the feed notify the hub again
+        self._unqueue(topic, digest)
+        try:
+            with sqlite3.connect(self.db_file, timeout=30) as c:
+                c.execute("DELETE FROM feeds WHERE topic=? AND digest=?",
+                          (topic, digest))
+        except sqlite3.Error:
+            logger.exception("Could not forget the digest of %s", topic)